@@ -0,0 +1 @@
+"""Benchmarks for the expense tracker. See suite.py for the regression suite."""
@@ -0,0 +1,59 @@
+"""Cleaning up a batch of wrongly imported rows: one delete_expense call and
+commit per row against one delete_many transaction, plus the bulk
+re-categorize and re-date of the same number of rows.
+
+Usage: python benchmarks/bulk_edit.py [--rows N] [--batch N]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.datagen import DataSpec, generate
+from database import Database
+
+
+def setup(path, rows):
+    db = Database(path)
+    (user_id,) = generate(db, DataSpec(users=1, transactions=rows, income_share=0))
+    return db, user_id
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000, help="expenses in the database")
+    parser.add_argument("--batch", type=int, default=5000, help="rows edited at once")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db, user_id = setup(os.path.join(tmp, "rows.db"), args.rows)
+        ids = [row.id for row in db.get_expenses_page(user_id, args.batch)]
+        _, per_row = timed(lambda: [db.delete_expense(row_id, user_id) for row_id in ids])
+        db.close()
+
+        db, user_id = setup(os.path.join(tmp, "batch.db"), args.rows)
+        ids = [row.id for row in db.get_expenses_page(user_id, args.batch)]
+        _, recategorize = timed(lambda: db.recategorize_many("expense", user_id, ids, "Other"))
+        _, redate = timed(lambda: db.redate_many("expense", user_id, ids, "2020-01-01"))
+        deleted, batch = timed(lambda: db.delete_many("expense", user_id, ids))
+        assert len(deleted) == len(ids) and not db.check_aggregates()
+        db.close()
+
+    print(f"{len(ids):,} of {args.rows:,} expenses\n")
+    print(f"delete, one commit per row  {per_row * 1000:9.1f} ms")
+    print(f"delete_many                 {batch * 1000:9.1f} ms  ({per_row / batch:.0f}x faster)")
+    print(f"recategorize_many           {recategorize * 1000:9.1f} ms")
+    print(f"redate_many                 {redate * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Mixed read/write throughput with SQLite's default connection settings
+versus the tuned defaults in connection.py.
+
+Reader threads page through expenses while one writer thread adds and
+deletes rows, each thread on its own connection.
+
+Usage: python benchmarks/connection_tuning.py [--rows N] [--readers N] [--seconds S]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from connection import DEFAULT_PRAGMAS, LEGACY_PRAGMAS
+from database import Database
+
+
+def run(db, readers, seconds):
+    """Run the mixed workload and return (reads/s, writes/s)"""
+    stop = threading.Event()
+    counts = {"reads": 0, "writes": 0}
+    lock = threading.Lock()
+
+    def reader(seed):
+        rng = random.Random(seed)
+        done = 0
+        while not stop.is_set():
+            rows = db.get_expenses_page(rng.randint(1, 10), 50)
+            if rows:
+                db.get_expenses_page(rng.randint(1, 10), 50, (rows[-1][2], rows[-1][0]))
+            done += 1
+        with lock:
+            counts["reads"] += done
+
+    def writer():
+        done = 0
+        while not stop.is_set():
+            expense = db.add_expense(1, "Food", 450, "bench", "2024-06-01")
+            db.delete_expense(expense[0])
+            done += 2
+        with lock:
+            counts["writes"] += done
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    threads.append(threading.Thread(target=writer))
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return counts["reads"] / seconds, counts["writes"] / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, pragmas in (("sqlite defaults", LEGACY_PRAGMAS), ("tuned", DEFAULT_PRAGMAS)):
+            path = os.path.join(tmp, f"{label.replace(' ', '_')}.db")
+            with Database(path, pragmas=pragmas) as db:
+                for user_id in range(1, 11):
+                    db.add_expenses_bulk(user_id, (
+                        ("Food", rng.randint(100, 10000), "row",
+                         f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}")
+                        for _ in range(args.rows // 10)))
+                reads, writes = run(db, args.readers, args.seconds)
+            print(f"{label:<16} {reads:>10,.0f} page reads/s {writes:>9,.0f} writes/s")
+
+
+if __name__ == "__main__":
+    main()
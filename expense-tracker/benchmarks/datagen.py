@@ -0,0 +1,127 @@
+"""Seeded synthetic data for the benchmarks.
+
+The same seed and settings always produce the same database, so timings from
+different checkouts are comparable. Category choice follows a Zipf-like
+distribution and dates lean towards the end of the range, both by an
+adjustable amount, to mimic real ledgers where a few categories and the
+recent months dominate.
+
+Usage: python -m benchmarks.datagen PATH [--users N] [--transactions N] ...
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+
+CATEGORIES = ["Food", "Housing", "Transportation", "Entertainment", "Utilities",
+              "Shopping", "Health", "Education", "Other"]
+SOURCES = ["Salary", "Freelance", "Investment", "Gift", "Bonus", "Refund", "Other"]
+MERCHANTS = ["Amazon", "Walmart", "Target", "Costco", "Starbucks", "Shell", "Uber",
+             "Netflix", "Spotify", "Kroger", "Walgreens", "Home Depot", "Apple", "Delta"]
+WORDS = ["order", "refund", "monthly", "subscription", "groceries", "fuel", "ride",
+         "coffee", "gift", "repair", "ticket", "store", "online", "pickup"]
+
+# A fixed end date rather than today, so a seed means the same data forever
+END_DATE = datetime.date(2025, 1, 1)
+
+
+class DataSpec:
+    """Settings for a generated database"""
+
+    def __init__(self, users=10, transactions=10000, income_share=0.1, days=3 * 365,
+                 category_skew=1.0, date_skew=1.0, seed=42):
+        self.users = users
+        self.transactions = transactions    # per user, expenses and income together
+        self.income_share = income_share
+        self.days = days
+        self.category_skew = category_skew  # 0 is uniform, higher favours the first categories
+        self.date_skew = date_skew          # 0 is uniform, higher favours recent dates
+        self.seed = seed
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+def zipf_weights(count, skew):
+    """Return weights for count choices, 1 / rank ** skew"""
+    return [1 / (rank ** skew) for rank in range(1, count + 1)]
+
+
+def random_dates(rng, count, days, skew):
+    """Return count ISO dates within days before END_DATE, leaning recent with skew"""
+    # u ** (1 + skew) piles up near 0, i.e. near the end date
+    return [(END_DATE - datetime.timedelta(days=1 + int(days * rng.random() ** (1 + skew)))).isoformat()
+            for _ in range(count)]
+
+
+def generate(db, spec):
+    """Add spec.users users with their transactions to db and return their ids"""
+    rng = random.Random(spec.seed)
+    category_weights = zipf_weights(len(CATEGORIES), spec.category_skew)
+    source_weights = zipf_weights(len(SOURCES), spec.category_skew)
+    income_count = int(spec.transactions * spec.income_share)
+    expense_count = spec.transactions - income_count
+
+    user_ids = []
+    for index in range(spec.users):
+        username = f"bench{spec.seed}_{index}"
+        db.add_user(username, "secret")
+        user_id = db.validate_user(username, "secret")
+        user_ids.append(user_id)
+
+        categories = rng.choices(CATEGORIES, category_weights, k=expense_count)
+        dates = random_dates(rng, expense_count, spec.days, spec.date_skew)
+        db.add_expenses_bulk(user_id, (
+            (category, rng.randint(100, 50000),
+             f"{rng.choice(MERCHANTS)} {rng.choice(WORDS)} {rng.choice(WORDS)}", date)
+            for category, date in zip(categories, dates)
+        ))
+
+        sources = rng.choices(SOURCES, source_weights, k=income_count)
+        dates = random_dates(rng, income_count, spec.days, spec.date_skew)
+        db.add_income_bulk(user_id, (
+            (rng.randint(10000, 500000), source, date)
+            for source, date in zip(sources, dates)
+        ))
+    return user_ids
+
+
+def add_spec_arguments(parser):
+    """Add the DataSpec settings as command-line options"""
+    defaults = DataSpec()
+    parser.add_argument("--users", type=int, default=defaults.users)
+    parser.add_argument("--transactions", type=int, default=defaults.transactions,
+                        help="transactions per user")
+    parser.add_argument("--income-share", type=float, default=defaults.income_share)
+    parser.add_argument("--days", type=int, default=defaults.days)
+    parser.add_argument("--category-skew", type=float, default=defaults.category_skew)
+    parser.add_argument("--date-skew", type=float, default=defaults.date_skew)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+
+def spec_from_args(args):
+    return DataSpec(args.users, args.transactions, args.income_share, args.days,
+                    args.category_skew, args.date_skew, args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="database file to create")
+    add_spec_arguments(parser)
+    args = parser.parse_args()
+    if os.path.exists(args.path):
+        sys.exit(f"{args.path} already exists")
+
+    spec = spec_from_args(args)
+    with Database(args.path) as db:
+        user_ids = generate(db, spec)
+    print(f"Created {args.path}: {len(user_ids)} users x {spec.transactions} transactions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Measure the latency of adding and deleting one expense in the Expenses
+list: a full reload of the Treeview versus the incremental TreePager update.
+
+Needs a display for Tk. Usage: python benchmarks/edit_latency.py [--sizes N,N,...]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tkinter as tk
+from tkinter import ttk
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from money import format_cents
+from paging import TreePager
+
+
+def make_item(expense):
+    values = (expense[0], expense[1], expense[2], format_cents(expense[3]), expense[4])
+    return str(expense[0]), values, ()
+
+
+def full_reload(db, tree):
+    """What the Expenses tab did before: clear, fetch everything, restripe"""
+    for item in tree.get_children():
+        tree.delete(item)
+    for expense in db.get_expenses(1):
+        tree.insert("", tk.END, values=make_item(expense)[1])
+    for i, item in enumerate(tree.get_children()):
+        tree.item(item, tags=("evenrow",) if i % 2 == 0 else ("oddrow",))
+
+
+def timed(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return sorted(timings)[len(timings) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        sys.exit(f"Tk is not available: {e}")
+    root.withdraw()
+
+    rng = random.Random(1)
+    print(f"{'rows':>8} {'reload add+delete':>18} {'incremental add+delete':>24}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in (int(n) for n in args.sizes.split(",")):
+            db = Database(os.path.join(tmp, f"bench{size}.db"))
+            db.add_expenses_bulk(1, ((rng.choice(["Food", "Health"]), rng.randint(100, 10000), "row",
+                                      f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}")
+                                     for _ in range(size)))
+
+            tree = ttk.Treeview(root, columns=("id", "category", "date", "amount", "description"),
+                                show="headings")
+            scrollbar = ttk.Scrollbar(root, command=tree.yview)
+            pager = TreePager(tree, scrollbar,
+                              lambda after, limit, callback: callback(db.get_expenses_page(1, limit, after)),
+                              lambda expense: (expense[2], expense[0]), make_item)
+
+            def reload_edit():
+                expense = db.add_expense(1, "Food", 999, "bench", "2024-12-31")
+                full_reload(db, tree)
+                db.delete_expense(expense[0])
+                full_reload(db, tree)
+
+            def incremental_edit():
+                expense = db.add_expense(1, "Food", 999, "bench", "2024-12-31")
+                pager.insert_row(expense)
+                db.delete_expense(expense[0])
+                pager.remove_row(str(expense[0]))
+
+            reload_ms = timed(reload_edit, max(1, min(args.repeat, 200000 // size)))
+            pager.reset()
+            incremental_ms = timed(incremental_edit, args.repeat)
+            print(f"{size:>8} {reload_ms:>15.1f} ms {incremental_ms:>21.1f} ms")
+
+            tree.destroy()
+            scrollbar.destroy()
+            db.close()
+
+    root.destroy()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Export throughput and peak memory: the streaming exporter in each format
+against fetching everything with get_transactions first.
+
+Peak memory is what tracemalloc sees allocated by Python during the export;
+it should stay flat for the streaming exports as --rows grows.
+
+Usage: python benchmarks/export_speed.py [--rows N]
+"""
+import argparse
+import csv
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.datagen import DataSpec, generate
+from database import Database
+from exporter import WRITERS, export_file
+
+
+def export_fetchall(db, user_id, path):
+    """What an export without streaming looks like: the whole history in a list"""
+    rows = db.get_transactions(user_id)
+    with open(path, "w", newline="") as f:
+        csv.writer(f).writerows(rows)
+    return len(rows)
+
+
+def measure(func):
+    """Return (rows, seconds) for one run and the Python peak in MB for another"""
+    start = time.perf_counter()
+    rows = func()
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return rows, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000, help="transactions to export")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with Database(os.path.join(tmp, "export.db")) as db:
+            start = time.perf_counter()
+            user_id = generate(db, DataSpec(users=1, transactions=args.rows))[0]
+            print(f"Generated {args.rows} transactions in {time.perf_counter() - start:.1f} s\n")
+
+            all_path = os.path.join(tmp, "all.csv")
+            cases = [("fetchall + csv", all_path, lambda: export_fetchall(db, user_id, all_path))]
+            for ext in WRITERS:
+                if ext == ".parquet" and importlib.util.find_spec("pyarrow") is None:
+                    print("parquet skipped: pyarrow is not installed")
+                    continue
+                path = os.path.join(tmp, "out" + ext)
+                cases.append((f"stream {ext[1:]}", path,
+                              lambda path=path: export_file(db, user_id, path)))
+
+            print(f"{'export':<16} {'rows/s':>12} {'seconds':>9} {'peak MB':>9} {'file MB':>9}")
+            for name, path, func in cases:
+                rows, elapsed, peak = measure(func)
+                size = os.path.getsize(path) / 1e6
+                print(f"{name:<16} {rows / elapsed:>12,.0f} {elapsed:>9.2f} {peak:>9.1f} {size:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Single-row add_expense calls with one commit each against group commit
+at several group sizes, under the default WAL settings and under SQLite's
+own rollback journal with synchronous=FULL.
+
+Usage: python benchmarks/group_commit.py [--rows N] [--groups 10,100,1000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from connection import DEFAULT_PRAGMAS, LEGACY_PRAGMAS
+from database import Database
+
+CATEGORIES = ["Food", "Transportation", "Housing", "Utilities", "Entertainment", "Other"]
+
+
+def run(path, pragmas, rows, group):
+    """Add rows expenses one call at a time and return the seconds taken,
+    flush included. group is the group commit size, None for per-row commits"""
+    db = Database(path, pragmas)
+    user_id = db.validate_user("admin", "admin123")
+    if group is not None:
+        # Flushes are triggered by the group size alone
+        db.enable_group_commit(max_ops=group, max_delay_ms=60000)
+    began = time.perf_counter()
+    for i in range(rows):
+        db.add_expense(user_id, CATEGORIES[i % len(CATEGORIES)], 100 + i % 5000,
+                       f"expense {i}", f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}")
+    db.flush()
+    elapsed = time.perf_counter() - began
+    db.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--groups", default="10,100,1000", help="comma separated group sizes")
+    args = parser.parse_args()
+    groups = [int(size) for size in args.groups.split(",")]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, pragmas in (("WAL, synchronous=NORMAL", DEFAULT_PRAGMAS),
+                              ("rollback journal, synchronous=FULL", LEGACY_PRAGMAS)):
+            print(f"{name}, {args.rows} rows")
+            baseline = None
+            for group in [None] + groups:
+                path = os.path.join(tmp, f"{len(os.listdir(tmp))}.db")
+                elapsed = run(path, pragmas, args.rows, group)
+                label = "per-row commit" if group is None else f"group of {group}"
+                if baseline is None:
+                    baseline = elapsed
+                print(f"  {label:<16} {elapsed:8.3f} s  {args.rows / elapsed:9.0f} rows/s"
+                      f"  {baseline / elapsed:6.1f}x")
+            print()
+
+
+if __name__ == "__main__":
+    main()
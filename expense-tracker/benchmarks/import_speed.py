@@ -0,0 +1,71 @@
+"""Compare per-row add_expense commits with the bulk insert API and the
+streaming CSV importer.
+
+Usage: python benchmarks/import_speed.py [--rows N] [--per-row N]
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from importer import import_file
+
+CATEGORIES = ["Food", "Housing", "Transportation", "Entertainment", "Utilities",
+              "Shopping", "Health", "Education", "Other"]
+
+
+def write_csv(path, rows):
+    """Write a statement CSV with a mix of expenses and income"""
+    rng = random.Random(7)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["date", "amount", "category", "description"])
+        for i in range(rows):
+            amount = rng.uniform(1, 500) * (-1 if i % 10 else 1)
+            writer.writerow([f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                             f"{amount:.2f}", rng.choice(CATEGORIES), f"row {i}"])
+        # A couple of broken lines to exercise the reject report
+        writer.writerow(["not-a-date", "10.00", "Food", "bad date"])
+        writer.writerow(["2024-01-01", "ten", "Food", "bad amount"])
+
+
+def rate(rows, seconds):
+    return f"{rows:>9} rows in {seconds:7.3f} s = {rows / seconds:>10,.0f} rows/s"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=500000)
+    parser.add_argument("--per-row", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "bench.db"))
+
+        start = time.perf_counter()
+        for i in range(args.per_row):
+            db.add_expense(1, "Food", 1250, f"row {i}", "2024-01-01")
+        print("add_expense loop   ", rate(args.per_row, time.perf_counter() - start))
+
+        rows = (("Food", 1250, f"row {i}", "2024-01-01") for i in range(args.rows))
+        start = time.perf_counter()
+        count = db.add_expenses_bulk(1, rows)
+        print("add_expenses_bulk  ", rate(count, time.perf_counter() - start))
+
+        path = os.path.join(tmp, "statement.csv")
+        write_csv(path, args.rows)
+        start = time.perf_counter()
+        report = import_file(db, 1, path)
+        elapsed = time.perf_counter() - start
+        print("import_file (CSV)  ", rate(report.expenses + report.income, elapsed))
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Show the query plans and timings of the Database read queries before and
+after the schema migrations.
+
+Before, the statements the original app ran are timed on the legacy schema.
+After, the read methods of the current Database are called and the SQL they
+actually run is captured with a trace callback and explained.
+
+Usage: python benchmarks/query_plans.py [--rows N] [--users N]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from instrumentation import is_internal
+from migrations import create_base_tables, migrate
+
+# The read queries of the original app, run against the legacy schema
+QUERIES = {
+    "get_expenses": (
+        "SELECT id, category, date, amount, description FROM expenses WHERE user_id = ? ORDER BY date DESC",
+        1,
+    ),
+    "get_income": (
+        "SELECT id, amount, date, source FROM income WHERE user_id = ? ORDER BY date DESC",
+        1,
+    ),
+    "get_transactions": (
+        "SELECT id, category, date, amount, description, 'expense' as type FROM expenses WHERE user_id = ?"
+        " UNION ALL "
+        "SELECT id, source, date, amount, 'Income' as description, 'income' as type FROM income WHERE user_id = ?"
+        " ORDER BY date DESC",
+        2,
+    ),
+    "get_expense_by_category": (
+        "SELECT category, SUM(amount) FROM expenses WHERE user_id = ? GROUP BY category",
+        1,
+    ),
+    "get_income_by_source": (
+        "SELECT source, SUM(amount) FROM income WHERE user_id = ? GROUP BY source",
+        1,
+    ),
+}
+
+# Database read methods reported after migrating, with their arguments after
+# the user id
+METHODS = [
+    ("get_expenses", ()),
+    ("get_expenses_page", (100,)),
+    ("get_income_page", (100,)),
+    ("get_transactions", ()),
+    ("get_transactions_page", (100,)),
+    ("get_transactions_page", (100, None, "amount")),
+    ("query", ("expense", "2020-01-01", "2021-01-01", ["Food"])),
+    ("search_transactions", ("food",)),
+    ("get_totals", ()),
+    ("get_expense_by_category", ()),
+    ("get_income_by_source", ()),
+    ("get_rollup", ("expense", "month")),
+]
+
+CATEGORIES = ["Food", "Housing", "Transportation", "Entertainment", "Utilities",
+              "Shopping", "Health", "Education", "Other"]
+SOURCES = ["Salary", "Freelance", "Investment", "Gift", "Bonus", "Refund", "Other"]
+
+
+def populate(conn, rows, users):
+    """Fill a legacy (unindexed) schema with random expenses and income"""
+    rng = random.Random(42)
+    create_base_tables(conn.cursor())
+    conn.executemany("INSERT INTO users (username, password) VALUES (?, ?)",
+                     ((f"user{i}", "secret") for i in range(users)))
+    conn.executemany(
+        "INSERT INTO expenses (user_id, category, date, amount, description) VALUES (?, ?, ?, ?, ?)",
+        ((rng.randint(1, users), rng.choice(CATEGORIES),
+          f"20{rng.randint(15, 25)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+          round(rng.uniform(1, 500), 2), "benchmark row") for _ in range(rows))
+    )
+    conn.executemany(
+        "INSERT INTO income (user_id, amount, date, source) VALUES (?, ?, ?, ?)",
+        ((rng.randint(1, users), round(rng.uniform(100, 5000), 2),
+          f"20{rng.randint(15, 25)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+          rng.choice(SOURCES)) for _ in range(rows // 10))
+    )
+    conn.commit()
+
+
+def report(conn, label):
+    """Print the plan and the best-of-five latency for every query"""
+    print(f"== {label} ==")
+    for name, (sql, params) in QUERIES.items():
+        args = (1,) * params
+        plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, args)]
+        elapsed = best_of_five(lambda: conn.execute(sql, args).fetchall())
+        print(f"{name:<26} {elapsed * 1000:8.2f} ms")
+        for step in plan:
+            print(f"    {step}")
+    print()
+
+
+def best_of_five(func, *args):
+    timings = []
+    for _ in range(5):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def report_methods(db, user_id, label):
+    """Print the best-of-five latency of every METHODS call and the plans of
+    the statements it ran"""
+    print(f"== {label} ==")
+    for name, args in METHODS:
+        method = getattr(db, name)
+        statements = []
+        db.conn.set_trace_callback(statements.append)
+        try:
+            method(user_id, *args)
+        finally:
+            db.conn.set_trace_callback(None)
+        call = f"{name}({', '.join(map(repr, args))})"
+        print(f"{call:<54} {best_of_five(method, user_id, *args) * 1000:8.2f} ms")
+        for sql in statements:
+            if is_internal(sql) or not sql.lstrip().upper().startswith(("SELECT", "WITH")):
+                continue
+            # Traced SQL has its parameters filled in, so it explains as is
+            for row in db.conn.execute("EXPLAIN QUERY PLAN " + sql):
+                print(f"    {row[3]}")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=300000)
+    parser.add_argument("--users", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "bench.db"))
+        populate(conn, args.rows, args.users)
+        report(conn, f"legacy schema, {args.rows} expenses")
+
+        version = migrate(conn)
+        conn.close()
+        with Database(os.path.join(tmp, "bench.db")) as db:
+            report_methods(db, 1, f"Database methods after migrating to schema version {version}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Memory per loaded transaction: plain tuples, as get_transactions used to
+return, with and without display values formatted for every row up front,
+against the typed records of records.py, which format lazily.
+
+Bytes per row are what tracemalloc sees held by the loaded list; load times
+are measured in separate runs without tracing.
+
+Usage: python benchmarks/record_memory.py [--rows N]
+"""
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.datagen import DataSpec, generate
+from database import LEDGER_ROW, Database
+from money import format_cents
+
+# Rows of one rendered page, formatted after the records are loaded
+PAGE = 100
+
+
+def load_tuples(db, user_id):
+    """The history as tuples, the way get_transactions returned it before records"""
+    return db.conn.execute(
+        f"SELECT {LEDGER_ROW} FROM ledger WHERE user_id = ? ORDER BY date DESC, id DESC",
+        (user_id,)
+    ).fetchall()
+
+
+def load_formatted(db, user_id):
+    """Tuples plus the display values of every row, formatted eagerly"""
+    rows = load_tuples(db, user_id)
+    values = []
+    for row in rows:
+        amount = format_cents(-row[3]) if row[5] == "expense" else format_cents(row[3], sign="+")
+        values.append((row[5].capitalize(), row[1], row[2], amount, row[4]))
+    return rows, values
+
+
+def load_records(db, user_id):
+    return db.get_transactions(user_id)
+
+
+def load_records_page(db, user_id):
+    """Records with one page of them shown"""
+    rows = db.get_transactions(user_id)
+    for row in rows[:PAGE]:
+        row.display()
+    return rows
+
+
+def held(func):
+    """Return the bytes func's result holds on to and the result's row count"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = func()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    rows = len(result[0] if isinstance(result, tuple) else result)
+    del result
+    return after - before, rows
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    del result
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "records.db"))
+        (user_id,) = generate(db, DataSpec(users=1, transactions=args.rows))
+
+        print(f"{args.rows:,} transactions\n")
+        print(f"{'':<28}{'bytes/row':>10}{'total MB':>10}{'load s':>9}")
+        for name, func in (("tuples", load_tuples),
+                           ("tuples + formatted values", load_formatted),
+                           ("records", load_records),
+                           (f"records, {PAGE} rows shown", load_records_page)):
+            size, rows = held(lambda: func(db, user_id))
+            gc.collect()
+            elapsed = timed(lambda: func(db, user_id))
+            gc.collect()
+            print(f"{name:<28}{size / rows:>10.0f}{size / 1e6:>10.0f}{elapsed:>9.2f}")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Catching up on recurring transactions after time offline: one batched
+materialize_recurring() transaction against adding each due occurrence
+with its own add_expense/add_income commit.
+
+Usage: python benchmarks/recurring_catchup.py [--users N] [--months N]
+"""
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from recurrence import Rule
+
+# (type, label, amount, rule) set up for every user
+RULES = [
+    ("expense", "Housing", 150000, "monthly"),
+    ("expense", "Utilities", 8000, "FREQ=MONTHLY;BYMONTHDAY=-1"),
+    ("expense", "Entertainment", 1599, "monthly"),
+    ("expense", "Food", 6500, "FREQ=WEEKLY;BYDAY=MO,TH"),
+    ("expense", "Transportation", 275, "FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR"),
+    ("income", "Salary", 320000, "biweekly"),
+]
+
+
+def setup(path, users, start):
+    db = Database(path)
+    user_ids = []
+    for i in range(users):
+        db.add_user(f"user{i}", "secret")
+        user_ids.append(db.validate_user(f"user{i}", "secret"))
+        for kind, label, amount, rule in RULES:
+            db.add_recurring(user_ids[-1], kind, label, amount, rule, start)
+    return db, user_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--months", type=int, default=6, help="time since the rules were last run")
+    args = parser.parse_args()
+
+    today = datetime.date.today()
+    start = (today - datetime.timedelta(days=round(args.months * 30.44))).isoformat()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db, user_ids = setup(os.path.join(tmp, "rows.db"), args.users, start)
+        began = time.perf_counter()
+        added = 0
+        for user_id in user_ids:
+            for kind, label, amount, rule in RULES:
+                for date in Rule.parse(rule).occurrences(start, through=today):
+                    if kind == "expense":
+                        db.add_expense(user_id, label, amount, None, date)
+                    else:
+                        db.add_income(user_id, amount, label, date)
+                    added += 1
+        per_row = time.perf_counter() - began
+        db.close()
+
+        db, user_ids = setup(os.path.join(tmp, "batch.db"), args.users, start)
+        began = time.perf_counter()
+        batched = db.materialize_recurring()
+        batch = time.perf_counter() - began
+        began = time.perf_counter()
+        again = db.materialize_recurring()
+        rerun = time.perf_counter() - began
+        db.close()
+
+    print(f"{args.users} users x {len(RULES)} rules, {args.months} months behind\n")
+    print(f"per-row commits       {added:>7} rows in {per_row:7.3f} s")
+    print(f"materialize_recurring {batched:>7} rows in {batch:7.3f} s ({per_row / batch:.0f}x faster)")
+    print(f"second run            {again:>7} rows in {rerun:7.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Time the daily, weekly and monthly rollups and the cash flow series against
+aggregating the base tables directly.
+
+Usage: python benchmarks/rollup_speed.py [--rows N] [--years N]
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from rollups import cash_flow, load_rollup
+
+CATEGORIES = ["Food", "Housing", "Transportation", "Entertainment", "Utilities",
+              "Shopping", "Health", "Education", "Other"]
+SOURCES = ["Salary", "Freelance", "Investment", "Gift", "Bonus", "Refund", "Other"]
+
+
+def populate(db, rows, years):
+    """Add rows transactions spread over the last years, one in ten income"""
+    rng = random.Random(11)
+    first = datetime.date.today() - datetime.timedelta(days=365 * years)
+    days = [(first + datetime.timedelta(days=i)).isoformat() for i in range(365 * years)]
+    db.add_expenses_bulk(1, ((rng.choice(CATEGORIES), rng.randint(100, 50000), "benchmark row",
+                              rng.choice(days)) for _ in range(rows - rows // 10)))
+    db.add_income_bulk(1, ((rng.randint(10000, 500000), rng.choice(SOURCES), rng.choice(days))
+                           for _ in range(rows // 10)))
+
+
+def best_of(func, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--years", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "bench.db"))
+        start = time.perf_counter()
+        populate(db, args.rows, args.years)
+        print(f"Inserted {args.rows} transactions in {time.perf_counter() - start:.1f} s")
+
+        for period in ("day", "week", "month"):
+            rollup = load_rollup(db, 1, "expense", period)
+            ms = best_of(lambda: load_rollup(db, 1, "expense", period))
+            print(f"load_rollup {period:<5} {rollup.totals.shape[0]:>5} x {rollup.totals.shape[1]}"
+                  f"  {ms:8.1f} ms")
+
+        ms = best_of(lambda: cash_flow(db, 1, "month"))
+        print(f"cash_flow month               {ms:8.1f} ms")
+
+        # The same daily series summed from every expense row instead
+        ms = best_of(lambda: db.conn.execute(
+            "SELECT date, category, SUM(amount) FROM expenses WHERE user_id = ?"
+            " GROUP BY date, category", (1,)).fetchall(), repeat=1)
+        print(f"GROUP BY on expenses (day)    {ms:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
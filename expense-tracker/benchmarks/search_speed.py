@@ -0,0 +1,70 @@
+"""Compare full-text search_transactions with a LIKE scan over the same rows.
+
+Usage: python benchmarks/search_speed.py [--rows N]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+
+CATEGORIES = ["Food", "Housing", "Transportation", "Entertainment", "Utilities",
+              "Shopping", "Health", "Education", "Other"]
+MERCHANTS = ["Amazon", "Walmart", "Target", "Costco", "Starbucks", "Shell", "Uber",
+             "Netflix", "Spotify", "Kroger", "Walgreens", "Home Depot", "Apple", "Delta"]
+WORDS = ["order", "refund", "monthly", "subscription", "groceries", "fuel", "ride",
+         "coffee", "gift", "repair", "ticket", "store", "online", "pickup"]
+
+# A rare term, a merchant, a common word prefix and a category
+QUERIES = ["zanzibar", "amazon", "sub", "food groceries"]
+
+
+def populate(db, rows):
+    rng = random.Random(5)
+    expenses = []
+    for i in range(rows):
+        description = f"{rng.choice(MERCHANTS)} {rng.choice(WORDS)} {rng.choice(WORDS)} #{i}"
+        if i % 50000 == 0:
+            description += " Zanzibar trip"
+        expenses.append((rng.choice(CATEGORIES), rng.randint(100, 50000), description,
+                         f"20{rng.randint(15, 25)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"))
+    db.add_expenses_bulk(1, expenses)
+
+
+def best_of(func, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "bench.db"))
+        start = time.perf_counter()
+        populate(db, args.rows)
+        print(f"Inserted {args.rows} expenses in {time.perf_counter() - start:.1f} s")
+
+        for query in QUERIES:
+            ms, rows = best_of(lambda: db.search_transactions(1, query, limit=100))
+            print(f"search {query!r:<18} {len(rows):>4} rows  {ms:9.1f} ms")
+            pattern = f"%{query.split()[0]}%"
+            ms, rows = best_of(lambda: db.conn.execute(
+                "SELECT id FROM expenses WHERE user_id = ? AND (description LIKE ? OR category LIKE ?)"
+                " LIMIT 100", (1, pattern, pattern)).fetchall())
+            print(f"LIKE   {pattern!r:<18} {len(rows):>4} rows  {ms:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
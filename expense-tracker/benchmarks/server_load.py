@@ -0,0 +1,184 @@
+"""Load test for server.py: many keep-alive clients issuing a mix of reads
+and writes, reporting throughput and latency percentiles.
+
+Without --url a server is started on a generated database in a temporary
+directory and stopped afterwards.
+
+Usage: python -m benchmarks.server_load [--clients 50] [--seconds 10] [--writes 0.1]
+       python -m benchmarks.server_load --url http://127.0.0.1:8765 --user NAME --password PW
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.datagen import CATEGORIES, DataSpec, generate
+from database import Database
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Read requests the clients pick from, weighted like a user browsing
+READS = [
+    ("GET", "/transactions?limit=100", 4),
+    ("GET", "/expenses?limit=100", 2),
+    ("GET", "/totals/expenses", 2),
+    ("GET", "/search?q=amazon%20ord&limit=50", 1),
+    ("GET", "/rollup?period=month", 1),
+]
+
+
+class Client:
+    """One keep-alive HTTP connection"""
+
+    def __init__(self, host, port, auth):
+        self.host = host
+        self.port = port
+        self.auth = auth
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def request(self, method, path, body=None):
+        payload = json.dumps(body).encode() if body is not None else b""
+        self.writer.write(
+            f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+            f"Authorization: {self.auth}\r\nContent-Length: {len(payload)}\r\n\r\n".encode()
+            + payload
+        )
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        status = int(lines[0].split(" ")[1])
+        length = 0
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+        return status, json.loads(await self.reader.readexactly(length))
+
+    def close(self):
+        self.writer.close()
+
+
+async def run_client(client, deadline, write_share, rng, latencies, errors):
+    await client.connect()
+    paths = [(method, path) for method, path, weight in READS for _ in range(weight)]
+    try:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            if rng.random() < write_share:
+                status, body = await client.request("POST", "/expenses", {
+                    "category": rng.choice(CATEGORIES), "amount": rng.randint(100, 50000),
+                    "description": "load test", "date": "2024-12-31"})
+                if status == 201:
+                    status, body = await client.request("DELETE", f"/expenses/{body['id']}")
+            else:
+                status, body = await client.request(*rng.choice(paths))
+            latencies.append(time.perf_counter() - start)
+            if status >= 400:
+                errors.append(status)
+    finally:
+        client.close()
+
+
+async def load(host, port, auth, clients, seconds, write_share, seed):
+    latencies = []
+    errors = []
+    deadline = time.perf_counter() + seconds
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        run_client(Client(host, port, auth), deadline, write_share,
+                   random.Random(seed + index), latencies, errors)
+        for index in range(clients)
+    ))
+    return latencies, errors, time.perf_counter() - start
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def report(latencies, errors, elapsed):
+    latencies.sort()
+    print(f"{len(latencies)} requests in {elapsed:.1f} s: {len(latencies) / elapsed:.0f} req/s,"
+          f" {len(errors)} errors")
+    if latencies:
+        print(f"latency ms: p50 {percentile(latencies, 0.5) * 1000:.2f}"
+              f"  p90 {percentile(latencies, 0.9) * 1000:.2f}"
+              f"  p99 {percentile(latencies, 0.99) * 1000:.2f}"
+              f"  max {latencies[-1] * 1000:.2f}"
+              f"  mean {statistics.mean(latencies) * 1000:.2f}")
+
+
+def wait_for_port(host, port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), 1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server did not start on {host}:{port}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="server to test; by default one is started")
+    parser.add_argument("--user", help="username for --url")
+    parser.add_argument("--password", help="password for --url")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--writes", type=float, default=0.1,
+                        help="share of requests that add and delete an expense")
+    parser.add_argument("--readers", type=int, default=4, help="read threads of the started server")
+    parser.add_argument("--transactions", type=int, default=10000,
+                        help="transactions per user in the generated database")
+    parser.add_argument("--port", type=int, default=8766, help="port for the started server")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.url:
+        parts = urlsplit(args.url)
+        credentials = f"{args.user}:{args.password}"
+        auth = "Basic " + base64.b64encode(credentials.encode()).decode()
+        latencies, errors, elapsed = asyncio.run(load(
+            parts.hostname, parts.port, auth, args.clients, args.seconds, args.writes, args.seed))
+        report(latencies, errors, elapsed)
+        return 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "load.db")
+        spec = DataSpec(users=1, transactions=args.transactions, seed=args.seed)
+        with Database(path) as db:
+            generate(db, spec)
+        auth = "Basic " + base64.b64encode(f"bench{args.seed}_0:secret".encode()).decode()
+
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(HERE, "server.py"), "--db", path,
+             "--port", str(args.port), "--readers", str(args.readers)],
+            stdout=subprocess.DEVNULL)
+        try:
+            wait_for_port("127.0.0.1", args.port)
+            print(f"{args.clients} clients, {args.writes:.0%} writes, {args.readers} read threads,"
+                  f" {args.transactions} transactions")
+            latencies, errors, elapsed = asyncio.run(load(
+                "127.0.0.1", args.port, auth, args.clients, args.seconds, args.writes, args.seed))
+        finally:
+            server.terminate()
+            server.wait()
+        report(latencies, errors, elapsed)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""Sorting, filtering and totals on the columnar snapshot against the SQL
+query each would otherwise need, plus what the snapshot costs to build.
+
+Usage: python benchmarks/snapshot_speed.py [--rows N] [--repeat N]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.datagen import DataSpec, generate
+from database import LEDGER_ROW, Database
+from snapshot import TransactionSnapshot
+
+PAGE_SIZE = 100
+
+# What a sort by the Amount header needs without a snapshot
+SQL_SORTED_PAGE = (
+    f"SELECT {LEDGER_ROW} FROM ledger WHERE user_id = ?"
+    " ORDER BY abs(amount) DESC, date DESC, id DESC LIMIT ?"
+)
+SQL_INCOME_PAGE = (
+    "SELECT id, source, date, amount, 'Income', 'income' FROM income WHERE user_id = ?"
+    " ORDER BY date, id LIMIT ?"
+)
+SQL_TOTALS = (
+    "SELECT 'expense', SUM(amount) FROM expenses WHERE user_id = ?"
+    " UNION ALL SELECT 'income', SUM(amount) FROM income WHERE user_id = ?"
+)
+
+
+def best_ms(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000, help="transactions for the user")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with Database(os.path.join(tmp, "snapshot.db")) as db:
+            user_id = generate(db, DataSpec(users=1, transactions=args.rows))[0]
+            conn = db.conn
+
+            start = time.perf_counter()
+            snapshot = TransactionSnapshot.load(db, user_id)
+            load_s = time.perf_counter() - start
+            size = sum(values[:snapshot.size].nbytes for values in snapshot.columns.values())
+            print(f"{len(snapshot)} rows: snapshot built in {load_s:.2f} s,"
+                  f" {size / 1e6:.1f} MB of columns,"
+                  f" {len(snapshot.labels)} labels, {len(snapshot.descriptions)} descriptions\n")
+
+            everything = snapshot.select()
+            cases = [
+                ("sort by amount, first page",
+                 lambda: conn.execute(SQL_SORTED_PAGE, (user_id, PAGE_SIZE)).fetchall(),
+                 lambda: snapshot.page(snapshot.sort(everything, "amount", True), None, PAGE_SIZE)),
+                ("income only, first page",
+                 lambda: conn.execute(SQL_INCOME_PAGE, (user_id, PAGE_SIZE)).fetchall(),
+                 lambda: snapshot.page(snapshot.sort(snapshot.select(kind="income")), None, PAGE_SIZE)),
+                ("totals by type",
+                 lambda: conn.execute(SQL_TOTALS, (user_id, user_id)).fetchall(),
+                 lambda: snapshot.totals(everything)),
+                ("filter + totals by category",
+                 lambda: conn.execute(
+                     "SELECT category, SUM(amount) FROM expenses WHERE user_id = ? AND date >= ?"
+                     " GROUP BY category", (user_id, "2024-01-01")).fetchall(),
+                 lambda: snapshot.totals(snapshot.select(kind="expense", start="2024-01-01"), "label")),
+            ]
+
+            print(f"{'operation':<30} {'SQL ms':>10} {'snapshot ms':>12}")
+            for name, sql, columnar in cases:
+                print(f"{name:<30} {best_ms(sql, args.repeat):>10.2f} {best_ms(columnar, args.repeat):>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Sorted list pages from the sort indexes against loading every row and
+sorting it in Python, for each column the lists can be sorted by.
+
+A deep page is the page after --depth pages of scrolling, fetched with the
+cursor of the page before it.
+
+Usage: python benchmarks/sort_pages.py [--rows N] [--depth N]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.datagen import DataSpec, generate
+from database import SORT_KEYS, Database, sort_key
+
+PAGE = 100
+
+
+def timed(func, *args, repeat=5, **kwargs):
+    """Return the result of func(*args, **kwargs) and its best time of
+    repeat runs"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--depth", type=int, default=1000, help="pages scrolled before the deep page")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "sort.db"))
+        (user_id,) = generate(db, DataSpec(users=1, transactions=args.rows))
+        lists = {
+            "expense": (db.get_expenses_page, db.get_expenses),
+            "income": (db.get_income_page, db.get_income),
+            "transaction": (db.get_transactions_page, db.get_transactions),
+        }
+
+        print(f"{args.rows:,} transactions, {PAGE} rows a page\n")
+        print(f"{'':<24}{'first ms':>10}{'deep ms':>10}{'load + sort ms':>16}")
+        for kind, (get_page, get_all) in lists.items():
+            rows, load = timed(get_all, user_id, repeat=1)
+            for sort in SORT_KEYS[kind]:
+                key = SORT_KEYS[kind][sort][1]
+                ordered, python = timed(sorted, rows, key=key, reverse=True, repeat=1)
+                first, first_time = timed(get_page, user_id, PAGE, None, sort)
+                assert first == ordered[:PAGE]
+                # The deep page starts after the last row of the page before it
+                depth = min(args.depth, len(ordered) // PAGE - 1)
+                after = sort_key(kind, sort, ordered[depth * PAGE - 1]) if depth else None
+                deep, deep_time = timed(get_page, user_id, PAGE, after, sort)
+                assert deep == ordered[depth * PAGE:(depth + 1) * PAGE]
+                print(f"{kind + ' by ' + sort:<24}{first_time * 1000:>10.2f}{deep_time * 1000:>10.2f}"
+                      f"{(load + python) * 1000:>16.0f}")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Measure cold start of the app: module import time, time until the login
+window is drawn and time until the first tab shows its first page of rows.
+
+Each run happens in a fresh interpreter so imports are really cold. Needs a
+display for Tk, except for the import measurement.
+
+Usage: python benchmarks/startup_time.py [--runs N] [--budget-ms MS]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def child(db_name):
+    """Run one cold start and print its timings as JSON"""
+    timings = {}
+    start = time.perf_counter()
+    sys.path.insert(0, HERE)
+    import tkinter as tk
+    import main
+    timings["import_ms"] = (time.perf_counter() - start) * 1000
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        timings["error"] = f"Tk is not available: {e}"
+        print(json.dumps(timings))
+        return
+
+    app = main.ExpenseTrackerApp(root, db_name)
+    root.update()
+    timings["login_window_ms"] = (time.perf_counter() - start) * 1000
+
+    # Log in with the default account and wait for the first page of rows
+    app.username_entry.insert(0, "admin")
+    app.password_entry.insert(0, "admin123")
+    app.login()
+    deadline = time.perf_counter() + 30
+    while time.perf_counter() < deadline:
+        root.update()
+        pager = getattr(app, "pagers", {}).get("expenses")
+        if pager is not None and not pager.loading():
+            break
+        time.sleep(0.001)
+    root.update()
+    timings["first_tab_ms"] = (time.perf_counter() - start) * 1000
+    app.on_close()
+    print(json.dumps(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--rows", type=int, default=10000,
+                        help="expenses in the benchmark database")
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="fail if the median time to the first tab exceeds this")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child)
+        return
+
+    sys.path.insert(0, HERE)
+    from database import Database
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db_name = os.path.join(tmp, "bench.db")
+        with Database(db_name) as db:
+            db.add_expenses_bulk(1, (("Food", 1000 + i % 5000, "row", f"2024-{i % 12 + 1:02d}-01")
+                                     for i in range(args.rows)))
+        for _ in range(args.runs):
+            output = subprocess.run([sys.executable, __file__, "--child", db_name],
+                                    capture_output=True, text=True, check=True).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+
+    if "error" in results[0]:
+        print(results[0]["error"])
+    for key in ("import_ms", "login_window_ms", "first_tab_ms"):
+        values = sorted(r[key] for r in results if key in r)
+        if values:
+            print(f"{key:<16} median {values[len(values) // 2]:8.1f} ms"
+                  f"   min {values[0]:8.1f} ms   max {values[-1]:8.1f} ms")
+
+    if args.budget_ms is not None:
+        values = sorted(r.get("first_tab_ms", r["import_ms"]) for r in results)
+        median = values[len(values) // 2]
+        if median > args.budget_ms:
+            print(f"Over budget: {median:.1f} ms > {args.budget_ms:.1f} ms")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+"""Run timed scenarios for the Database methods and the list views against a
+generated database, write the results as JSON and compare them with a
+stored baseline.
+
+Usage:
+    python -m benchmarks.suite --output baseline.json
+    python -m benchmarks.suite --compare baseline.json [--threshold 0.2]
+
+With --compare the exit status is 1 if any scenario got slower than the
+baseline by more than the threshold, so the suite can gate a change.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.datagen import CATEGORIES, add_spec_arguments, generate, spec_from_args
+from budgets import BudgetEngine
+from database import Database, transaction_key
+from dates import month_range
+from money import format_cents
+
+# Write scenarios add, then remove, this many rows per repetition
+WRITE_OPS = 200
+
+# Pages the paging scenarios walk through, as a user scrolling would
+PAGES = 10
+PAGE_SIZE = 100
+
+# name -> function(context, timer) returning the number of operations timed
+SCENARIOS = {}
+
+
+def scenario(name):
+    """Register a function as a benchmark scenario"""
+    def register(func):
+        SCENARIOS[name] = func
+        return func
+    return register
+
+
+class Skip(Exception):
+    """Raised by a scenario that cannot run here, e.g. Tk without a display"""
+
+
+class Timer:
+    """Adds up the time spent inside its with blocks, so scenarios can keep
+    their setup out of the measurement"""
+
+    def __init__(self):
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed += time.perf_counter() - self.start
+
+
+class Context:
+    """What scenarios get to work with: the database and the generated users"""
+
+    def __init__(self, db, user_ids):
+        self.db = db
+        self.user_ids = user_ids
+        self.user_id = user_ids[0]
+
+
+def walk_pages(fetch, cursor_of):
+    """Fetch up to PAGES pages the way the list views do and return the count"""
+    after = None
+    for page in range(PAGES):
+        rows = fetch(after)
+        if len(rows) < PAGE_SIZE:
+            return page + 1
+        after = cursor_of(rows[-1])
+    return PAGES
+
+
+@scenario("get_transactions")
+def get_transactions(ctx, timer):
+    with timer:
+        ctx.db.get_transactions(ctx.user_id)
+    return 1
+
+
+@scenario("get_transactions_page")
+def get_transactions_page(ctx, timer):
+    with timer:
+        return walk_pages(lambda after: ctx.db.get_transactions_page(ctx.user_id, PAGE_SIZE, after),
+                          transaction_key)
+
+
+@scenario("get_expenses_page")
+def get_expenses_page(ctx, timer):
+    with timer:
+        return walk_pages(lambda after: ctx.db.get_expenses_page(ctx.user_id, PAGE_SIZE, after),
+                          lambda row: (row[2], row[0]))
+
+
+@scenario("get_income_page")
+def get_income_page(ctx, timer):
+    with timer:
+        return walk_pages(lambda after: ctx.db.get_income_page(ctx.user_id, PAGE_SIZE, after),
+                          lambda row: (row[2], row[0]))
+
+
+@scenario("get_expense_by_category")
+def get_expense_by_category(ctx, timer):
+    with timer:
+        ctx.db.get_expense_by_category(ctx.user_id)
+    return 1
+
+
+@scenario("get_income_by_source")
+def get_income_by_source(ctx, timer):
+    with timer:
+        ctx.db.get_income_by_source(ctx.user_id)
+    return 1
+
+
+@scenario("get_rollup_month")
+def get_rollup_month(ctx, timer):
+    with timer:
+        ctx.db.get_rollup(ctx.user_id, "expense", "month")
+    return 1
+
+
+@scenario("query_month")
+def query_month(ctx, timer):
+    # One month of history, the latest the user has, in a few categories
+    latest = ctx.db.get_transactions_page(ctx.user_id, 1)
+    start, end = month_range(latest[0][2][:7] if latest else "2024-01")
+    with timer:
+        ctx.db.query(ctx.user_id, start=start, end=end, categories=CATEGORIES[:3], limit=None)
+    return 1
+
+
+@scenario("search_transactions")
+def search_transactions(ctx, timer):
+    with timer:
+        ctx.db.search_transactions(ctx.user_id, "amazon order", limit=PAGE_SIZE)
+    return 1
+
+
+@scenario("add_expense")
+def add_expense(ctx, timer):
+    with timer:
+        ids = [ctx.db.add_expense(ctx.user_id, CATEGORIES[i % len(CATEGORIES)], 1250,
+                                  "benchmark", "2024-12-31")[0]
+               for i in range(WRITE_OPS)]
+    for expense_id in ids:
+        ctx.db.delete_expense(expense_id)
+    return WRITE_OPS
+
+
+@scenario("delete_expense")
+def delete_expense(ctx, timer):
+    ids = [ctx.db.add_expense(ctx.user_id, "Food", 1250, "benchmark", "2024-12-31")[0]
+           for _ in range(WRITE_OPS)]
+    with timer:
+        for expense_id in ids:
+            ctx.db.delete_expense(expense_id)
+    return WRITE_OPS
+
+
+@scenario("budget_check")
+def budget_check(ctx, timer):
+    # What ExpenseTrackerApp.add_expense adds per expense to warn about budgets
+    for category in CATEGORIES:
+        ctx.db.set_budget(ctx.user_id, category, 100000)
+    budgets = BudgetEngine.load(ctx.db, ctx.user_id)
+    with timer:
+        for i in range(WRITE_OPS):
+            budgets.add(CATEGORIES[i % len(CATEGORIES)], "2024-12-31", 1250)
+    for category in CATEGORIES:
+        ctx.db.delete_budget(ctx.user_id, category)
+    return WRITE_OPS
+
+
+@scenario("budget_status")
+def budget_status(ctx, timer):
+    with timer:
+        ctx.db.budget_status(ctx.user_id, "2024-12")
+    return 1
+
+
+@scenario("add_income")
+def add_income(ctx, timer):
+    with timer:
+        ids = [ctx.db.add_income(ctx.user_id, 100000, "Salary", "2024-12-31")[0]
+               for _ in range(WRITE_OPS)]
+    for income_id in ids:
+        ctx.db.delete_income(income_id)
+    return WRITE_OPS
+
+
+@scenario("delete_income")
+def delete_income(ctx, timer):
+    ids = [ctx.db.add_income(ctx.user_id, 100000, "Salary", "2024-12-31")[0]
+           for _ in range(WRITE_OPS)]
+    with timer:
+        for income_id in ids:
+            ctx.db.delete_income(income_id)
+    return WRITE_OPS
+
+
+def make_transaction_item(trans):
+    # Same formatting as ExpenseTrackerApp.make_transaction_item
+    if trans[5] == 'expense':
+        amount = format_cents(-trans[3])
+    else:
+        amount = format_cents(trans[3], sign="+")
+    values = (trans[5].capitalize(), trans[1], trans[2], amount, trans[4])
+    return f"{trans[5]}:{trans[0]}", values, (trans[5],)
+
+
+@scenario("treeview_population")
+def treeview_population(ctx, timer):
+    import tkinter as tk
+    from tkinter import ttk
+    from paging import TreePager
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        raise Skip(f"Tk is not available: {e}")
+    root.withdraw()
+    try:
+        tree = ttk.Treeview(root, columns=("type", "category", "date", "amount", "description"),
+                            show="headings")
+        scrollbar = ttk.Scrollbar(root, command=tree.yview)
+
+        # Pages are fetched synchronously here; returning no Future tells
+        # the pager the request is already finished
+        def fetch_page(after, limit, callback):
+            callback(ctx.db.get_transactions_page(ctx.user_id, limit, after))
+
+        pager = TreePager(tree, scrollbar, fetch_page,
+                          transaction_key,
+                          make_transaction_item, striped=False, page_size=PAGE_SIZE)
+        with timer:
+            pager.reset()
+            for _ in range(PAGES - 1):
+                pager.load_more()
+            root.update_idletasks()
+        return PAGES
+    finally:
+        root.destroy()
+
+
+def run_scenario(func, ctx, repeat):
+    """Run a scenario repeat times and return its statistics in milliseconds"""
+    timings = []
+    ops = 1
+    for _ in range(repeat):
+        timer = Timer()
+        ops = func(ctx, timer)
+        timings.append(timer.elapsed * 1000)
+    median = statistics.median(timings)
+    return {
+        "ops": ops,
+        "repeat": repeat,
+        "min_ms": min(timings),
+        "median_ms": median,
+        "max_ms": max(timings),
+        "per_op_us": median * 1000 / ops,
+    }
+
+
+def run_suite(spec, repeat, names):
+    """Generate a database for spec and run the named scenarios against it"""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        with Database(os.path.join(tmp, "bench.db")) as db:
+            start = time.perf_counter()
+            ctx = Context(db, generate(db, spec))
+            print(f"Generated {spec.users} users x {spec.transactions} transactions"
+                  f" in {time.perf_counter() - start:.1f} s")
+
+            for name in names:
+                try:
+                    results[name] = run_scenario(SCENARIOS[name], ctx, repeat)
+                except Skip as e:
+                    results[name] = {"skipped": str(e)}
+                print_result(name, results[name])
+
+    return {
+        "meta": {
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "spec": spec.as_dict(),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def print_result(name, result):
+    if "skipped" in result:
+        print(f"{name:<26} skipped: {result['skipped']}")
+    else:
+        print(f"{name:<26} {result['median_ms']:10.2f} ms median"
+              f" {result['per_op_us']:12.1f} us/op")
+
+
+def compare(report, baseline, threshold):
+    """Print each scenario against the baseline and return the regressed names"""
+    regressions = []
+    if report["meta"]["spec"] != baseline["meta"]["spec"]:
+        print("warning: the baseline was generated with different data settings")
+
+    print(f"\n{'scenario':<26} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, result in report["results"].items():
+        before = baseline["results"].get(name)
+        if before is None or "skipped" in before or "skipped" in result:
+            print(f"{name:<26} {'-':>12} {'-':>12} {'n/a':>8}")
+            continue
+        change = result["per_op_us"] / before["per_op_us"] - 1
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<26} {before['per_op_us']:>9.1f} us {result['per_op_us']:>9.1f} us"
+              f" {change:>+7.0%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_spec_arguments(parser)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--scenarios", help="comma-separated subset of: " + ", ".join(SCENARIOS))
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="slowdown per operation that counts as a regression (default 0.2)")
+    args = parser.parse_args()
+
+    names = args.scenarios.split(",") if args.scenarios else list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    report = run_suite(spec_from_args(args), args.repeat, names)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} scenarios regressed by more than {args.threshold:.0%}")
+            return 1
+        print("\nNo regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
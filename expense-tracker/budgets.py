@@ -0,0 +1,51 @@
+class BudgetEngine:
+    """A user's monthly category budgets with running spending totals.
+
+    Totals are read once from the trigger-maintained expense_totals table
+    and then kept up to date in memory as expenses are added and deleted,
+    so checking a budget is a dict lookup rather than a query. Status rows
+    are (category, budget, spent) tuples like Database.budget_status.
+    """
+
+    def __init__(self, user_id, budgets=(), totals=()):
+        self.user_id = user_id
+        # category -> monthly budget in cents
+        self.budgets = dict(budgets)
+        # (month, category) -> cents spent
+        self.spent = {(month, category): total for month, category, total in totals}
+
+    @classmethod
+    def load(cls, db, user_id):
+        return cls(user_id, db.get_budgets(user_id), db.get_monthly_expense_totals(user_id))
+
+    def set_budget(self, category, amount):
+        self.budgets[category] = amount
+
+    def delete_budget(self, category):
+        self.budgets.pop(category, None)
+
+    def add(self, category, date, amount):
+        """Count a new expense. Returns the category's status row if this
+        expense took it over budget, None otherwise"""
+        key = (date[:7], category)
+        before = self.spent.get(key, 0)
+        after = self.spent[key] = before + amount
+        budget = self.budgets.get(category)
+        if budget is not None and before <= budget < after:
+            return (category, budget, after)
+        return None
+
+    def remove(self, category, date, amount):
+        """Take a deleted expense out of the totals"""
+        key = (date[:7], category)
+        self.spent[key] = self.spent.get(key, 0) - amount
+
+    def status(self, category, month):
+        """Return the (category, budget, spent) row of one category and
+        'YYYY-MM' month, with a budget of None if it has none"""
+        return (category, self.budgets.get(category), self.spent.get((month, category), 0))
+
+    def budget_status(self, month):
+        """Return the status rows of every budgeted category in a month"""
+        return [(category, budget, self.spent.get((month, category), 0))
+                for category, budget in sorted(self.budgets.items())]
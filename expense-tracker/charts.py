@@ -0,0 +1,287 @@
+import io
+import threading
+import tkinter as tk
+
+
+# matplotlib is imported inside the functions that draw: it costs more than
+# the rest of start-up combined and most sessions never open a chart.
+
+
+def load_trend(db, user_id):
+    """Return the monthly CashFlow behind the trend chart"""
+    from rollups import cash_flow
+    return cash_flow(db, user_id, "month")
+
+
+# Chart settings per kind. query is a Database method name, or a function
+# called with the Database and the user id.
+CHARTS = {
+    "expense": {
+        "query": "get_expense_by_category",
+        "title": "Expense Breakdown by Category",
+        "pie_title": "Expense Breakdown (Pie Chart)",
+        "bar_title": "Expense Breakdown (Bar Chart)",
+        "xlabel": "Category",
+        "legend_title": "Categories",
+        "color": "skyblue",
+    },
+    "income": {
+        "query": "get_income_by_source",
+        "title": "Income Breakdown by Source",
+        "pie_title": "Income by Source (Pie Chart)",
+        "bar_title": "Income by Source (Histogram)",
+        "xlabel": "Source",
+        "legend_title": "Sources",
+        "color": "lightgreen",
+    },
+    "trend": {
+        "query": load_trend,
+        "title": "Monthly Income and Expense Trend",
+        "window": 3,  # months in the expense moving average
+    },
+}
+
+
+class ChartCache:
+    """Chart data and rendered PNGs per (user, chart), tagged with the
+    Database.data_version() they were computed at.
+
+    fetch() runs on the database worker thread and only re-queries when the
+    data version moved; png() renders off-screen and reuses the last image
+    while the data is unchanged. Both may be called from any thread.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.data = {}
+        self.images = {}
+
+    def fetch(self, db, user_id, kind):
+        """Return (version, rows) for a chart, querying only if the data changed"""
+        version = db.data_version()
+        key = (user_id, kind)
+        with self.lock:
+            cached = self.data.get(key)
+        if cached is not None and cached[0] == version:
+            return cached
+
+        query = CHARTS[kind]["query"]
+        if callable(query):
+            entry = (version, query(db, user_id))
+        else:
+            entry = (version, getattr(db, query)(user_id))
+        with self.lock:
+            self.data[key] = entry
+        return entry
+
+    def png(self, db, user_id, kind, dpi=100):
+        """Return the chart as PNG bytes, rendering only if the data changed"""
+        version, rows = self.fetch(db, user_id, kind)
+        key = (user_id, kind, dpi)
+        with self.lock:
+            cached = self.images.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        fig = Figure(figsize=(10, 8), dpi=dpi)
+        make_chart(fig, kind).draw(rows)
+        buffer = io.BytesIO()
+        FigureCanvasAgg(fig).print_png(buffer)
+        image = buffer.getvalue()
+        with self.lock:
+            self.images[key] = (version, image)
+        return image
+
+    def export_png(self, db, user_id, kind, path):
+        """Write the chart to a PNG file without needing a display"""
+        with open(path, "wb") as f:
+            f.write(self.png(db, user_id, kind))
+
+
+def chart_labels(rows):
+    # Income may have no source; matplotlib needs a string for every bar
+    return [row[0] if row[0] is not None else "(none)" for row in rows]
+
+
+class BreakdownChart:
+    """The pie and bar chart pair drawn on a matplotlib Figure"""
+
+    def __init__(self, fig, kind):
+        self.fig = fig
+        self.style = CHARTS[kind]
+        self.pie_ax = fig.add_subplot(121)  # 1 row, 2 cols, 1st plot
+        self.bar_ax = fig.add_subplot(122)  # 1 row, 2 cols, 2nd plot
+        self.labels = None
+        self.bars = []
+        self.annotations = []
+
+    def draw(self, rows):
+        """Draw both charts from scratch"""
+        self.labels = chart_labels(rows)
+        amounts = [row[1] / 100 for row in rows]
+        self.draw_pie(amounts)
+
+        # Create bar chart
+        self.bar_ax.clear()
+        self.bars = self.bar_ax.bar(self.labels, amounts, color=self.style["color"],
+                                    width=0.6, edgecolor='grey')
+
+        # Style bar chart
+        self.bar_ax.set_title(self.style["bar_title"])
+        self.bar_ax.set_xlabel(self.style["xlabel"])
+        self.bar_ax.set_ylabel("Amount ($)")
+        self.bar_ax.tick_params(axis='x', rotation=45)
+
+        # Add values on top of bars
+        self.annotations = []
+        for bar in self.bars:
+            height = bar.get_height()
+            self.annotations.append(self.bar_ax.annotate(
+                f'${height:.2f}',
+                xy=(bar.get_x() + bar.get_width() / 2, height),
+                xytext=(0, 3),  # 3 points vertical offset
+                textcoords="offset points",
+                ha='center', va='bottom', rotation=0))
+
+        # Adjust layout
+        self.fig.tight_layout()
+
+    def draw_pie(self, amounts):
+        from matplotlib.artist import setp
+
+        # Create pie chart
+        self.pie_ax.clear()
+        wedges, texts, autotexts = self.pie_ax.pie(amounts, autopct='%1.1f%%', startangle=90,
+                                                   explode=[0.05] * len(amounts),
+                                                   shadow=True, radius=1.1)
+
+        # Style pie chart
+        setp(autotexts, size=9, weight="bold")
+        self.pie_ax.set_title(self.style["pie_title"])
+        self.pie_ax.legend(wedges, self.labels, title=self.style["legend_title"],
+                           loc="center left", bbox_to_anchor=(0.9, 0, 0.5, 1))
+
+    def update(self, rows):
+        """Update the charts for new data, in place when the labels are unchanged"""
+        if chart_labels(rows) != self.labels:
+            self.draw(rows)
+            return
+
+        # Same categories: move the existing bars and their value labels.
+        # Pie wedges carry shadows and label positions that depend on every
+        # other wedge, so the pie alone is redrawn on its existing axes.
+        amounts = [row[1] / 100 for row in rows]
+        for bar, annotation, height in zip(self.bars, self.annotations, amounts):
+            bar.set_height(height)
+            annotation.xy = (bar.get_x() + bar.get_width() / 2, height)
+            annotation.set_text(f'${height:.2f}')
+        self.bar_ax.relim()
+        self.bar_ax.autoscale_view()
+        self.draw_pie(amounts)
+
+
+class TrendChart:
+    """Monthly income and expenses with the running balance on a second axis"""
+
+    def __init__(self, fig):
+        self.fig = fig
+        self.style = CHARTS["trend"]
+        self.ax = fig.add_subplot(111)
+        self.balance_ax = self.ax.twinx()
+
+    def draw(self, flow):
+        from rollups import moving_average
+
+        # Dollars for display; the cents series stay exact in the CashFlow
+        months = flow.periods.astype("datetime64[D]").astype(object)
+        window = self.style["window"]
+        average = moving_average(flow.expenses, window)
+
+        self.ax.clear()
+        self.balance_ax.clear()
+        self.ax.plot(months, flow.income / 100, color="green", marker="o", label="Income")
+        self.ax.plot(months, flow.expenses / 100, color="red", marker="o", label="Expenses")
+        self.ax.plot(months, average / 100, color="red", linestyle="--",
+                     label=f"Expenses ({window}-month average)")
+        self.balance_ax.plot(months, flow.balance / 100, color="#4a7abc", label="Balance")
+
+        self.ax.set_title(self.style["title"])
+        self.ax.set_xlabel("Month")
+        self.ax.set_ylabel("Amount ($)")
+        self.balance_ax.set_ylabel("Running balance ($)")
+        self.ax.tick_params(axis='x', rotation=45)
+
+        # One legend for the lines of both axes
+        lines = self.ax.get_lines() + self.balance_ax.get_lines()
+        self.ax.legend(lines, [line.get_label() for line in lines], loc="upper left")
+
+        self.fig.tight_layout()
+
+    def update(self, flow):
+        """A new month shifts every point, so the lines are simply redrawn"""
+        self.draw(flow)
+
+
+def make_chart(fig, kind):
+    """Return the chart object that draws kind on fig"""
+    if kind == "trend":
+        return TrendChart(fig)
+    return BreakdownChart(fig, kind)
+
+
+class ChartWindow:
+    """A Toplevel showing one breakdown chart that can be refreshed in place"""
+
+    def __init__(self, root, kind, version, rows, bg_color, accent_color, button_font,
+                 on_save=None):
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        from matplotlib.figure import Figure
+
+        style = CHARTS[kind]
+        self.version = version
+
+        # Create a new top-level window
+        self.window = tk.Toplevel(root)
+        self.window.title(style["title"])
+        self.window.geometry("800x600")
+        self.window.configure(bg=bg_color)
+
+        # Header
+        tk.Label(self.window, text=style["title"],
+                 font=("Arial", 16, "bold"), bg=bg_color).pack(pady=10)
+
+        # Create figure, charts and canvas
+        fig = Figure(figsize=(10, 8), dpi=100)
+        self.chart = make_chart(fig, kind)
+        self.chart.draw(rows)
+        self.canvas = FigureCanvasTkAgg(fig, master=self.window)
+        self.canvas.draw()
+
+        # Buttons are packed before the canvas so they keep their space
+        button_frame = tk.Frame(self.window, bg=bg_color)
+        button_frame.pack(side=tk.BOTTOM, pady=10)
+        if on_save is not None:
+            tk.Button(button_frame, text="Save as PNG...", command=on_save,
+                      bg=accent_color, fg="white", font=button_font).pack(side=tk.LEFT, padx=5)
+        tk.Button(button_frame, text="Close", command=self.window.destroy,
+                  bg=accent_color, fg="white", font=button_font).pack(side=tk.LEFT, padx=5)
+
+        self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+    def exists(self):
+        try:
+            return bool(self.window.winfo_exists())
+        except tk.TclError:
+            return False
+
+    def refresh(self, version, rows):
+        """Bring the window to the front, redrawing only if the data changed"""
+        if version != self.version:
+            self.version = version
+            self.chart.update(rows)
+            self.canvas.draw_idle()
+        self.window.deiconify()
+        self.window.lift()
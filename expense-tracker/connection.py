@@ -0,0 +1,68 @@
+import sqlite3
+
+
+# Pragmas applied to every connection. WAL lets readers run alongside the
+# writer, and synchronous=NORMAL is still crash-safe in WAL mode while only
+# syncing at checkpoints instead of on every commit.
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -16000,        # in KiB, so ~16 MB of page cache
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+
+# SQLite's defaults, for comparison and for callers that need them
+LEGACY_PRAGMAS = {
+    "journal_mode": "DELETE",
+    "synchronous": "FULL",
+}
+
+# Our fixed queries plus the variants of the paged and filtered ones come to a
+# few dozen statements; leave headroom so none of them is ever re-prepared.
+CACHED_STATEMENTS = 256
+
+# Seconds to wait for another connection's write lock before giving up
+BUSY_TIMEOUT = 10.0
+
+# The oldest SQLite the queries run on: DELETE ... RETURNING in the batch
+# edits and AS MATERIALIZED in the search both arrived in 3.35
+MIN_SQLITE_VERSION = (3, 35, 0)
+
+
+def check_sqlite_version():
+    """Raise RuntimeError if the SQLite library Python was built with is
+    older than MIN_SQLITE_VERSION"""
+    if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+        required = ".".join(map(str, MIN_SQLITE_VERSION))
+        raise RuntimeError(
+            f"SQLite {required} or later is required, but Python's sqlite3 module"
+            f" uses SQLite {sqlite3.sqlite_version}"
+        )
+
+
+class ConnectionFactory:
+    """Opens SQLite connections with the same tuned settings every time"""
+
+    def __init__(self, db_name, pragmas=None, cached_statements=CACHED_STATEMENTS,
+                 timeout=BUSY_TIMEOUT):
+        check_sqlite_version()
+        self.db_name = db_name
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        self.cached_statements = cached_statements
+        self.timeout = timeout
+        # Functions called with every new connection, e.g. to install hooks
+        self.on_connect = []
+
+    def connect(self):
+        """Open a new connection and apply the configured pragmas"""
+        # Each connection is only ever used by the thread that opened it, but
+        # Database.close() may close it from another thread at shutdown
+        conn = sqlite3.connect(self.db_name, timeout=self.timeout,
+                               cached_statements=self.cached_statements,
+                               check_same_thread=False)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        for hook in self.on_connect:
+            hook(conn)
+        return conn
@@ -1,49 +1,326 @@
 import sqlite3
 import datetime
+import heapq
+import json
 import os
+import re
+import threading
+import time
+from itertools import chain, count, islice
+from connection import ConnectionFactory
+from dates import day_number, month_range, to_iso_date
+from migrations import (DAY_OF, FILL_LEDGER_DAYS, REBUILD_DAILY_TOTALS, REBUILD_LEDGER,
+                        REBUILD_SEARCH, REBUILD_TOTALS, migrate)
+from records import Expense, Income, SearchResult, Transaction
+from recurrence import Rule
+
+def check_cents(amount):
+    """Return amount if it is integer cents, raise TypeError otherwise"""
+    # bool is an int subclass but never a meaningful amount
+    if type(amount) is not int:
+        raise TypeError(f"amounts are integer cents, got {amount!r}; convert with money.to_cents()")
+    return amount
+
+def id_array(ids):
+    """Return row ids as a JSON array that json_each() reads, so any number
+    of ids binds as a single parameter. Ids may be ints or digit strings,
+    like Treeview item ids; anything else raises TypeError"""
+    values = []
+    for row_id in ids:
+        if isinstance(row_id, str) and row_id.strip().isdigit():
+            row_id = int(row_id)
+        if type(row_id) is not int:
+            raise TypeError(f"row ids are integers, got {row_id!r}")
+        values.append(row_id)
+    return json.dumps(values)
+
+# Base table, label column, record columns and record class of each kind of
+# transaction, for the bulk edits
+KIND_TABLES = {
+    "expense": ("expenses", "category", "id, category, date, amount, description", Expense),
+    "income": ("income", "source", "id, amount, date, source", Income),
+}
+
+# Daily totals table and label column behind each kind of rollup
+ROLLUP_TABLES = {
+    "expense": ("expense_daily_totals", "category"),
+    "income": ("income_daily_totals", "source"),
+}
+
+# SQL expression that maps a day to the key of its period
+ROLLUP_PERIODS = {
+    "day": "day",
+    "week": "date(day, '-6 days', 'weekday 1')",
+    "month": "substr(day, 1, 7)",
+}
+
+# Rows per INSERT statement in bulk loads. The search index triggers make FTS5
+# flush its pending terms at the end of every statement, so inserting one row
+# per statement writes one tiny index segment per row. 100 rows of up to five
+# columns also stays under the 999 parameter limit of older SQLite builds.
+ROWS_PER_INSERT = 100
+
+# Filters search_transactions accepts, with the SQL condition each one adds.
+# {label} is replaced by the category or source column of each table.
+SEARCH_FILTERS = {
+    "start": "date >= ?",
+    "end": "date < ?",
+    "min_amount": "amount >= ?",
+    "max_amount": "amount <= ?",
+    "label": "{label} = ?",
+}
+
+# Default limits of group commit: held-back writes are committed once this
+# many are pending or the oldest has waited this long
+GROUP_COMMIT_OPS = 100
+GROUP_COMMIT_MS = 50
+
+# Directions query() can return rows in, with the keyset comparison for each
+QUERY_ORDERS = {
+    "desc": ("DESC", "<"),
+    "asc": ("ASC", ">"),
+}
+
+def match_expression(text):
+    """Turn search box text into an FTS5 query.
+    Every word has to match; the last one is a prefix unless it is followed
+    by a space, so results narrow down as the user types. Returns None if
+    the text has no words"""
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    # Quoting every word keeps FTS5 operators and punctuation in the text literal
+    terms = [f'"{word}"' for word in words]
+    if not text[-1].isspace():
+        terms[-1] += "*"
+    return " ".join(terms)
+
+def ledger_id(kind, row_id):
+    """Return the ledger id (also the search index rowid) of an expense or income id"""
+    return row_id * 2 + (kind == "income")
+
+def transaction_key(row):
+    """Return the (date, ledger id) that orders and pages transaction rows"""
+    return (row[2], ledger_id(row[5], row[0]))
+
+# Columns the expense, income and transaction lists can be sorted by: the
+# SQL expressions rows are ordered by, ending with the id that breaks ties,
+# and a function returning the same values from a record, which is the
+# keyset cursor of the page that ends with it. Only these columns can be
+# sorted by, and each has an index starting with user_id followed by the
+# same columns (see migrations.SORT_INDEXES), so any page is a range scan of
+# a few rows however large the table.
+SORT_KEYS = {
+    "expense": {
+        "date": (("date", "id"), lambda row: (row.date, row.id)),
+        "amount": (("amount", "id"), lambda row: (row.amount, row.id)),
+        "category": (("category", "amount", "id"), lambda row: (row.category, row.amount, row.id)),
+    },
+    "income": {
+        "date": (("date", "id"), lambda row: (row.date, row.id)),
+        "amount": (("amount", "id"), lambda row: (row.amount, row.id)),
+        "source": (("source_key", "amount", "id"), lambda row: (row.source or "", row.amount, row.id)),
+    },
+    # The ledger, whose ids are ledger ids and whose expense amounts are negative
+    "transaction": {
+        "date": (("date", "id"), transaction_key),
+        "amount": (("abs_amount", "id"),
+                   lambda row: (row.amount, ledger_id(row.kind, row.id))),
+        "category": (("label_key", "abs_amount", "id"),
+                     lambda row: (row.label or "", row.amount, ledger_id(row.kind, row.id))),
+        "type": (("type", "date", "id"),
+                 lambda row: (row.kind, row.date, ledger_id(row.kind, row.id))),
+    },
+}
+
+def sort_key(kind, sort, row):
+    """Return the keyset cursor of a row of the kind ('expense', 'income' or
+    'transaction') of list sorted by sort"""
+    return SORT_KEYS[kind][sort][1](row)
+
+# Transaction sorts whose ledger indexes start with (user_id, type), so
+# without a type filter a page is merged from a page of each type
+TYPED_SORTS = ("amount", "category")
+
+def sort_columns(kind, sort):
+    """Return the SQL columns a list is ordered by for sort"""
+    try:
+        return SORT_KEYS[kind][sort][0]
+    except KeyError:
+        raise ValueError(f"Cannot sort by {sort!r}") from None
+
+def sort_clause(keys, descending, after):
+    """Return the ORDER BY terms of a page sorted by the keys columns, and
+    the keyset condition and parameters that start it after the cursor after"""
+    direction, compare = QUERY_ORDERS["desc" if descending else "asc"]
+    order = ", ".join(f"{key} {direction}" for key in keys)
+    if after is None:
+        return order, "", ()
+    after = tuple(after)
+    if len(after) != len(keys):
+        raise ValueError(f"The cursor has {len(after)} values, the sort {len(keys)}")
+    return order, f" AND ({', '.join(keys)}) {compare} ({', '.join('?' * len(keys))})", after
+
+# Ledger columns as get_transactions rows: the expense or income id, positive
+# amounts and a fixed description for income
+LEDGER_ROW = (
+    "id >> 1, label, date, CASE type WHEN 'expense' THEN -amount ELSE amount END,"
+    " CASE type WHEN 'income' THEN 'Income' ELSE description END, type"
+)
 
 class Database:
-    def __init__(self, db_name="expense_tracker.db"):
-        """Initialize database connection and create tables if they don't exist"""
-        self.conn = sqlite3.connect(db_name)
-        self.cursor = self.conn.cursor()
+    """Data access for the expense tracker.
+
+    All amounts going in and out are integers in cents; see money.py for
+    converting user input and formatting values for display. Expense, income
+    and transaction rows are returned as the typed records of records.py.
+    """
+    
+    def __init__(self, db_name="expense_tracker.db", pragmas=None):
+        """Initialize database connection and create tables if they don't exist.
+        pragmas overrides the connection settings in connection.DEFAULT_PRAGMAS"""
+        self.factory = ConnectionFactory(db_name, pragmas)
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._write_counter = count(1)
+        self._write_version = 0
+        # Group commit, off unless enable_group_commit() is called:
+        # (max ops, max delay in seconds), how many writes are held back in
+        # the open transaction and when the first of them was made
+        self._group = None
+        self.pending_writes = 0
+        self._pending_since = None
         self.create_tables()
         
-    def create_tables(self):
-        """Create necessary tables for the expense tracker application"""
-        # Create User table
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL
-        )
-        ''')
-        
-        # Create Expenses table
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS expenses (
-            id INTEGER PRIMARY KEY,
-            user_id INTEGER NOT NULL,
-            category TEXT NOT NULL,
-            date TEXT NOT NULL,
-            amount REAL NOT NULL,
-            description TEXT,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-        ''')
+    # Every thread gets its own connection and cursor, so readers on other
+    # threads can run while one thread writes. Note that with ":memory:" each
+    # thread therefore sees its own, separate database.
+    @property
+    def conn(self):
+        return self._thread_connection()[0]
+    
+    @property
+    def cursor(self):
+        return self._thread_connection()[1]
+    
+    def _thread_connection(self):
+        """Return this thread's (connection, cursor), opening them on first use"""
+        local = self._local
+        try:
+            return local.conn, local.cursor
+        except AttributeError:
+            conn = self.factory.connect()
+            local.conn, local.cursor = conn, conn.cursor()
+            with self._lock:
+                self._connections.append(conn)
+            return local.conn, local.cursor
+    
+    def add_connection_hook(self, hook):
+        """Call hook(conn) for every connection, open now or opened later"""
+        with self._lock:
+            self.factory.on_connect.append(hook)
+            connections = list(self._connections)
+        for conn in connections:
+            hook(conn)
+    
+    def close(self):
+        """Close the connections opened by every thread, committing the
+        writes group commit still holds back first"""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            if self.pending_writes and conn.in_transaction:
+                conn.commit()
+            # Closing the last connection also checkpoints the WAL into the
+            # database file, so nothing committed depends on the WAL any more
+            conn.close()
+        self.pending_writes = 0
+        self._pending_since = None
+        self._local = threading.local()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
         
-        # Create Income table
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS income (
-            id INTEGER PRIMARY KEY,
-            user_id INTEGER NOT NULL,
-            amount REAL NOT NULL,
-            date TEXT NOT NULL,
-            source TEXT,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-        ''')
+    def data_version(self):
+        """Return a value that changes whenever expense or income data may have changed.
+        It combines a counter bumped by this object's writes with SQLite's
+        data_version, which moves when any other connection commits"""
+        version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        return (self._write_version, version)
+    
+    def _bump_version(self):
+        # next() on a count is atomic, so concurrent writers never reuse a value
+        self._write_version = next(self._write_counter)
+    
+    # Group commit: with synchronous=FULL every commit waits for the disk,
+    # and even under NORMAL each one writes its own WAL frames, so a burst of
+    # single-row writes spends most of its time committing. With group
+    # commit on, add_expense, add_income, delete_expense and delete_income
+    # leave their transaction open, and the writes held back that way are
+    # committed together by flush(). Reads on the writing thread see them
+    # at once; other threads see them after the flush, so a server has to
+    # flush before reading on other connections (see server.Server.read).
+    # Only for a Database written from a single thread, like the app's
+    # worker and the server's writer; that thread calls flush() once
+    # flush_delay() runs out.
+    def enable_group_commit(self, max_ops=GROUP_COMMIT_OPS, max_delay_ms=GROUP_COMMIT_MS):
+        """Hold back writes and commit them max_ops at a time, or once the
+        first has waited max_delay_ms, whichever comes first"""
+        if max_ops < 1 or max_delay_ms < 0:
+            raise ValueError("max_ops must be positive and max_delay_ms not negative")
+        self._group = (max_ops, max_delay_ms / 1000)
+    
+    def disable_group_commit(self):
+        """Commit the writes held back and go back to one commit per write"""
+        self.flush()
+        self._group = None
+    
+    def flush(self, durable=False):
+        """Commit the writes group commit is holding back. With durable the
+        WAL is also checkpointed, which syncs it to disk: under
+        synchronous=NORMAL a commit survives the app crashing, but only a
+        synced one is sure to survive a power cut"""
+        if self.pending_writes:
+            self.conn.commit()
+            self.pending_writes = 0
+            self._pending_since = None
+        if durable:
+            self.conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+    
+    def flush_delay(self):
+        """Return the seconds until the writes held back are due to be
+        flushed, or None if there are none"""
+        if not self.pending_writes:
+            return None
+        return max(0.0, self._pending_since + self._group[1] - time.monotonic())
+    
+    def _commit(self, grouped=False):
+        """Commit this thread's transaction. Grouped writes are only counted
+        while group commit is on, and committed when the group is full or
+        the first of them has waited long enough"""
+        if not grouped or self._group is None:
+            self.conn.commit()
+            # The commit takes any writes held back along with it
+            self.pending_writes = 0
+            self._pending_since = None
+            return
+        now = time.monotonic()
+        if not self.pending_writes:
+            self._pending_since = now
+        self.pending_writes += 1
+        max_ops, max_delay = self._group
+        if self.pending_writes >= max_ops or now - self._pending_since >= max_delay:
+            self.flush()
+    
+    def create_tables(self):
+        """Create or upgrade the schema for the expense tracker application"""
+        # Tables and indexes are managed by the versioned migrations, which
+        # also upgrade databases created by older releases in place
+        migrate(self.conn)
         
         # Add a default user if none exists for testing purposes
         self.cursor.execute("SELECT COUNT(*) FROM users")
@@ -58,7 +335,7 @@ class Database:
         try:
             self.cursor.execute("INSERT INTO users (username, password) VALUES (?, ?)", 
                                (username, password))
-            self.conn.commit()
+            self._commit()
             return True
         except sqlite3.IntegrityError:
             # Username already exists
@@ -73,71 +350,587 @@ class Database:
     
     # Expense functions
     def add_expense(self, user_id, category, amount, description, date=None):
-        """Add a new expense record"""
+        """Add a new expense record and return it as an Expense record,
+        like the rows of get_expenses"""
         if date is None:
             date = datetime.datetime.now().strftime("%Y-%m-%d")
+        else:
+            date = to_iso_date(date)
         
         self.cursor.execute(
             "INSERT INTO expenses (user_id, category, date, amount, description) VALUES (?, ?, ?, ?, ?)",
-            (user_id, category, date, amount, description)
+            (user_id, category, date, check_cents(amount), description)
         )
-        self.conn.commit()
+        self._commit(grouped=True)
+        self._bump_version()
+        return Expense(self.cursor.lastrowid, category, date, amount, description)
+    
+    def add_expenses_bulk(self, user_id, expenses, chunk_size=10000):
+        """Add many expense records from an iterable of
+        (category, amount, description, date) tuples, committing once per chunk"""
+        today = datetime.datetime.now().strftime("%Y-%m-%d")
+        rows = ((user_id, category, to_iso_date(date) if date else today, check_cents(amount), description)
+                for category, amount, description, date in expenses)
+        return self._insert_chunked(
+            "expenses", ("user_id", "category", "date", "amount", "description"),
+            rows, chunk_size
+        )
+    
+    def _record_cursor(self, record):
+        """Return a new cursor of this thread's connection that returns its
+        rows as instances of a records.py class"""
+        cursor = self.conn.cursor()
+        cursor.row_factory = record.row_factory()
+        return cursor
     
     def get_expenses(self, user_id):
         """Get all expenses for a user"""
-        self.cursor.execute(
-            "SELECT id, category, date, amount, description FROM expenses WHERE user_id = ? ORDER BY date DESC",
+        cursor = self._record_cursor(Expense)
+        cursor.execute(
+            "SELECT id, category, date, amount, description FROM expenses WHERE user_id = ? ORDER BY date DESC, id DESC",
             (user_id,)
         )
-        return self.cursor.fetchall()
+        return cursor.fetchall()
     
-    def delete_expense(self, expense_id):
-        """Delete an expense record"""
-        self.cursor.execute("DELETE FROM expenses WHERE id = ?", (expense_id,))
-        self.conn.commit()
+    def get_expenses_page(self, user_id, limit=100, after=None, sort="date", descending=True):
+        """Get one page of expenses, newest first or sorted by another column
+        of SORT_KEYS. after is the sort_key() of the last row of the previous
+        page, which for the date order is its (date, id)"""
+        # Keyset pagination: seek past the cursor in the sort's index
+        # instead of counting off an OFFSET from the start
+        order, keyset, params = sort_clause(sort_columns("expense", sort), descending, after)
+        cursor = self._record_cursor(Expense)
+        cursor.execute(
+            "SELECT id, category, date, amount, description FROM expenses WHERE user_id = ?"
+            f"{keyset} ORDER BY {order} LIMIT ?",
+            (user_id,) + params + (limit,)
+        )
+        return cursor.fetchall()
+    
+    def delete_expense(self, expense_id, user_id=None):
+        """Delete an expense record and return True if it existed.
+        With a user_id only that user's expense is deleted"""
+        if user_id is None:
+            self.cursor.execute("DELETE FROM expenses WHERE id = ?", (expense_id,))
+        else:
+            self.cursor.execute("DELETE FROM expenses WHERE id = ? AND user_id = ?",
+                                (expense_id, user_id))
+        self._commit(grouped=True)
+        self._bump_version()
+        return self.cursor.rowcount > 0
     
     # Income functions
     def add_income(self, user_id, amount, source, date=None):
-        """Add a new income record"""
+        """Add a new income record and return it as an Income record, like
+        the rows of get_income"""
         if date is None:
             date = datetime.datetime.now().strftime("%Y-%m-%d")
+        else:
+            date = to_iso_date(date)
         
         self.cursor.execute(
             "INSERT INTO income (user_id, amount, date, source) VALUES (?, ?, ?, ?)",
-            (user_id, amount, date, source)
+            (user_id, check_cents(amount), date, source)
+        )
+        self._commit(grouped=True)
+        self._bump_version()
+        return Income(self.cursor.lastrowid, amount, date, source)
+    
+    def add_income_bulk(self, user_id, income, chunk_size=10000):
+        """Add many income records from an iterable of
+        (amount, source, date) tuples, committing once per chunk"""
+        today = datetime.datetime.now().strftime("%Y-%m-%d")
+        rows = ((user_id, check_cents(amount), to_iso_date(date) if date else today, source)
+                for amount, source, date in income)
+        return self._insert_chunked(
+            "income", ("user_id", "amount", "date", "source"),
+            rows, chunk_size
         )
-        self.conn.commit()
     
     def get_income(self, user_id):
         """Get all income records for a user"""
-        self.cursor.execute(
-            "SELECT id, amount, date, source FROM income WHERE user_id = ? ORDER BY date DESC",
+        cursor = self._record_cursor(Income)
+        cursor.execute(
+            "SELECT id, amount, date, source FROM income WHERE user_id = ? ORDER BY date DESC, id DESC",
             (user_id,)
         )
-        return self.cursor.fetchall()
+        return cursor.fetchall()
     
-    def delete_income(self, income_id):
-        """Delete an income record"""
-        self.cursor.execute("DELETE FROM income WHERE id = ?", (income_id,))
-        self.conn.commit()
+    def get_income_page(self, user_id, limit=100, after=None, sort="date", descending=True):
+        """Get one page of income records, newest first or sorted by another
+        column of SORT_KEYS. after is the sort_key() of the last row of the
+        previous page"""
+        order, keyset, params = sort_clause(sort_columns("income", sort), descending, after)
+        cursor = self._record_cursor(Income)
+        cursor.execute(
+            "SELECT id, amount, date, source FROM income WHERE user_id = ?"
+            f"{keyset} ORDER BY {order} LIMIT ?",
+            (user_id,) + params + (limit,)
+        )
+        return cursor.fetchall()
+    
+    def delete_income(self, income_id, user_id=None):
+        """Delete an income record and return True if it existed.
+        With a user_id only that user's income is deleted"""
+        if user_id is None:
+            self.cursor.execute("DELETE FROM income WHERE id = ?", (income_id,))
+        else:
+            self.cursor.execute("DELETE FROM income WHERE id = ? AND user_id = ?",
+                                (income_id, user_id))
+        self._commit(grouped=True)
+        self._bump_version()
+        return self.cursor.rowcount > 0
+    
+    def _insert_rows(self, table, columns, rows):
+        """Insert a list of rows into table, ROWS_PER_INSERT rows per
+        statement, without committing"""
+        insert = f"INSERT INTO {table} ({', '.join(columns)}) VALUES "
+        row = "(" + ", ".join("?" * len(columns)) + ")"
+        full = len(rows) - len(rows) % ROWS_PER_INSERT
+        self.cursor.executemany(insert + ", ".join([row] * ROWS_PER_INSERT), (
+            tuple(chain.from_iterable(rows[start:start + ROWS_PER_INSERT]))
+            for start in range(0, full, ROWS_PER_INSERT)
+        ))
+        if full < len(rows):
+            rest = rows[full:]
+            self.cursor.execute(insert + ", ".join([row] * len(rest)),
+                                tuple(chain.from_iterable(rest)))
+    
+    def _insert_chunked(self, table, columns, rows, chunk_size):
+        """Insert rows into table in chunks, one transaction per chunk and
+        ROWS_PER_INSERT rows per statement"""
+        # A failed chunk is rolled back, which must not take held-back writes with it
+        self.flush()
+        total = 0
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            try:
+                self._insert_rows(table, columns, chunk)
+                self.conn.commit()
+                self._bump_version()
+            except sqlite3.Error:
+                self.conn.rollback()
+                raise
+            total += len(chunk)
+        return total
+    
+    # Bulk edits. Each is one statement over a json_each() list of ids, so
+    # thousands of rows cost one round trip and one commit; the triggers
+    # keep the totals, ledger and search index in step row by row. The + on
+    # user_id stops SQLite from scanning the user's whole (user_id, date)
+    # index; the ids are looked up by primary key and only checked against
+    # the user.
+    def _kind_table(self, kind):
+        try:
+            return KIND_TABLES[kind]
+        except KeyError:
+            raise ValueError(f"Unknown transaction type: {kind!r}") from None
+    
+    def delete_many(self, kind, user_id, ids):
+        """Delete a user's expenses or income by id in one transaction and
+        return the deleted rows as records. Ids that do not exist or belong
+        to another user are skipped"""
+        table, label, columns, record = self._kind_table(kind)
+        cursor = self._record_cursor(record)
+        cursor.execute(
+            f"DELETE FROM {table} WHERE id IN (SELECT value FROM json_each(?)) AND +user_id = ?"
+            f" RETURNING {columns}",
+            (id_array(ids), user_id)
+        )
+        rows = cursor.fetchall()
+        self._commit()
+        self._bump_version()
+        return rows
+    
+    def update_many(self, kind, user_id, ids, label=None, date=None):
+        """Give a user's expenses or income a new category or source and/or
+        a new date, in one statement and one transaction. Returns the number
+        of rows changed"""
+        table, column = self._kind_table(kind)[:2]
+        assignments = []
+        params = []
+        if label is not None:
+            assignments.append(f"{column} = ?")
+            params.append(label)
+        if date is not None:
+            assignments.append("date = ?")
+            params.append(to_iso_date(date))
+        if not assignments:
+            raise ValueError("Nothing to update: give a label or a date")
+        self.cursor.execute(
+            f"UPDATE {table} SET {', '.join(assignments)}"
+            " WHERE id IN (SELECT value FROM json_each(?)) AND +user_id = ?",
+            params + [id_array(ids), user_id]
+        )
+        self._commit()
+        self._bump_version()
+        return self.cursor.rowcount
+    
+    def recategorize_many(self, kind, user_id, ids, label):
+        """Move a user's expenses to another category, or income to another
+        source, and return the number of rows changed"""
+        return self.update_many(kind, user_id, ids, label=label)
+    
+    def redate_many(self, kind, user_id, ids, date):
+        """Move a user's expenses or income to another date and return the
+        number of rows changed"""
+        return self.update_many(kind, user_id, ids, date=date)
     
     # Transaction history (combines expenses and income)
     def get_transactions(self, user_id):
-        """Get all transactions (expenses and income) for a user"""
+        """Get all transactions (expenses and income) for a user, newest first"""
+        cursor = self._record_cursor(Transaction)
+        cursor.execute(
+            f"SELECT {LEDGER_ROW} FROM ledger WHERE user_id = ? ORDER BY date DESC, id DESC",
+            (user_id,)
+        )
+        return cursor.fetchall()
+    
+    def get_transactions_page(self, user_id, limit=100, after=None, sort="date", descending=True,
+                              kind=None):
+        """Get one page of transactions, newest first or sorted by another
+        column of SORT_KEYS, optionally only the 'expense' or 'income' ones.
+        after is the sort_key() of the last row of the previous page, which
+        for the date order is its transaction_key()"""
+        # Every sort has a ledger index starting with (user_id, ...) or
+        # (user_id, type, ...), so a page is one range scan of the index per
+        # type, without a sort
+        columns = sort_columns("transaction", sort)
+        if kind is None and sort in TYPED_SORTS:
+            # The first limit rows of both types merged are the page
+            pages = [self.get_transactions_page(user_id, limit, after, sort, descending, each)
+                     for each in ("expense", "income")]
+            merged = heapq.merge(*pages, key=SORT_KEYS["transaction"][sort][1], reverse=descending)
+            return list(islice(merged, limit))
+        condition, params = "", ()
+        if kind is not None:
+            if kind not in ("expense", "income"):
+                raise ValueError(f"Unknown transaction type: {kind!r}")
+            condition, params = " AND type = ?", (kind,)
+            if columns[0] == "type":
+                # The type is the same on every row, so this is date order,
+                # which the (user_id, type, date, id) index seeks on
+                columns = columns[1:]
+                after = None if after is None else tuple(after)[1:]
+        order, keyset, keyset_params = sort_clause(columns, descending, after)
+        cursor = self._record_cursor(Transaction)
+        cursor.execute(
+            f"SELECT {LEDGER_ROW} FROM ledger WHERE user_id = ?{condition}{keyset}"
+            f" ORDER BY {order} LIMIT ?",
+            (user_id,) + params + keyset_params + (limit,)
+        )
+        return cursor.fetchall()
+
+    def iter_transactions(self, user_id, start=None, end=None, kind=None, chunk_size=10000,
+                          days=False):
+        """Yield a user's transactions oldest first as lists of up to chunk_size
+        rows like get_transactions, with a None description for income.
+        start is an inclusive and end an exclusive date, normalized to
+        YYYY-MM-DD as they are compared with the stored text; kind limits the
+        rows to 'expense' or 'income'. With days=True every row ends with its
+        ledger day number, None for a stored date that cannot be read.
+        Only one chunk is held in memory at a time"""
+        conditions = " WHERE user_id = ?"
+        params = [user_id]
+        if kind is not None:
+            if kind not in ("expense", "income"):
+                raise ValueError(f"Unknown transaction type: {kind!r}")
+            conditions += " AND type = ?"
+            params.append(kind)
+        if start is not None:
+            conditions += " AND date >= ?"
+            params.append(to_iso_date(start))
+        if end is not None:
+            conditions += " AND date < ?"
+            params.append(to_iso_date(end))
+
+        # A cursor of its own, so other calls on this thread can run between
+        # chunks without resetting the export
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(
+                "SELECT id >> 1, label, date, CASE type WHEN 'expense' THEN -amount ELSE amount END,"
+                " description, type" + (", day" if days else "") + " FROM ledger" + conditions
+                + " ORDER BY date, id",
+                params
+            )
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
+
+    def query(self, user_id, kind=None, start=None, end=None, categories=None,
+              min_amount=None, max_amount=None, order="desc", limit=100, after=None):
+        """Get the transactions matching every given filter as rows like
+        get_transactions, newest first, or oldest first with order='asc'.
+        kind is 'expense' or 'income', start an inclusive and end an exclusive
+        date, categories a list of expense categories and income sources, and
+        min_amount and max_amount bound the amount in cents. after is the
+        transaction_key() of the last row of the previous page; a limit of
+        None returns every match. Rows with an unreadable stored date are
+        never returned"""
+        if order not in QUERY_ORDERS:
+            raise ValueError(f"Unknown order: {order!r}")
+        direction, compare = QUERY_ORDERS[order]
+
+        # Dates are compared as day numbers, so the date range and the cursor
+        # are both a seek in the (user_id, day, id) index and a page reads
+        # only the rows it returns plus those the other filters skip
+        conditions = ["user_id = ?"]
+        params = [user_id]
+        if start is not None:
+            conditions.append("day >= ?")
+            params.append(day_number(start))
+        else:
+            conditions.append("day IS NOT NULL")
+        if end is not None:
+            conditions.append("day < ?")
+            params.append(day_number(end))
+        if kind is not None:
+            if kind not in ("expense", "income"):
+                raise ValueError(f"Unknown transaction type: {kind!r}")
+            conditions.append("type = ?")
+            params.append(kind)
+        if categories is not None:
+            categories = list(categories)
+            if not categories:
+                return []
+            conditions.append(f"label IN ({', '.join('?' * len(categories))})")
+            params.extend(categories)
+        # Ledger amounts are negative for expenses
+        if min_amount is not None:
+            conditions.append("abs(amount) >= ?")
+            params.append(check_cents(min_amount))
+        if max_amount is not None:
+            conditions.append("abs(amount) <= ?")
+            params.append(check_cents(max_amount))
+        if after is not None:
+            conditions.append(f"(day, id) {compare} (?, ?)")
+            params.extend((day_number(after[0]), after[1]))
+
+        sql = (f"SELECT {LEDGER_ROW} FROM ledger WHERE {' AND '.join(conditions)}"
+               f" ORDER BY day {direction}, id {direction}")
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        cursor = self._record_cursor(Transaction)
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+    def search_transactions(self, user_id, query, filters=None, limit=100, after=None):
+        """Search expense categories and descriptions and income sources.
+        Returns rows like get_transactions plus (score, key), best match first.
+        filters may hold a "type" of 'expense' or 'income' and any of the keys
+        in SEARCH_FILTERS, with amounts in cents and start inclusive, end
+        exclusive dates. after is the (score, key) of the last row of the
+        previous page"""
+        match = match_expression(query)
+        if match is None:
+            return []
+        filters = dict(filters or {})
+        kind = filters.pop("type", None)
+        unknown = set(filters) - set(SEARCH_FILTERS)
+        if unknown:
+            raise ValueError(f"Unknown search filters: {', '.join(sorted(unknown))}")
+
+        # Matches come from the index; each side joins back to its own table
+        # by decoding the index rowid and applies the filters there
+        selects = []
+        params = [match]
+        for side, select, label, parity in (
+            ("expense", "SELECT t.id, t.category, t.date, t.amount, t.description, 'expense' AS type,"
+                        " h.score, h.rowid AS key FROM hits h JOIN expenses t ON t.id = h.rowid / 2",
+             "category", 0),
+            ("income", "SELECT t.id, t.source, t.date, t.amount, 'Income' AS description, 'income' AS type,"
+                       " h.score, h.rowid AS key FROM hits h JOIN income t ON t.id = h.rowid / 2",
+             "source", 1),
+        ):
+            if kind is not None and kind != side:
+                continue
+            conditions = [f"h.rowid % 2 = {parity}", "t.user_id = ?"]
+            params.append(user_id)
+            for name, value in filters.items():
+                conditions.append("t." + SEARCH_FILTERS[name].format(label=label))
+                params.append(value)
+            selects.append(f"{select} WHERE {' AND '.join(conditions)}")
+        if not selects:
+            raise ValueError(f"Unknown transaction type: {kind!r}")
+
+        keyset = ""
+        if after is not None:
+            keyset = " WHERE (score, key) > (?, ?)"
+            params.extend(after)
+        params.append(limit)
+
+        # bm25 scores are negative, lower is better; categories and sources
+        # weigh twice as much as descriptions
+        cursor = self._record_cursor(SearchResult)
+        cursor.execute(
+            "WITH hits AS MATERIALIZED ("
+            " SELECT rowid, bm25(transactions_fts, 2.0, 1.0) AS score"
+            " FROM transactions_fts WHERE transactions_fts MATCH ?)"
+            " SELECT * FROM (" + " UNION ALL ".join(selects) + ")"
+            + keyset + " ORDER BY score, key LIMIT ?",
+            params
+        )
+        return cursor.fetchall()
+    
+    # Recurring transactions
+    def add_recurring(self, user_id, kind, label, amount, rule, start_date=None, description=None):
+        """Store a repeating expense or income and return its id. rule is a
+        recurrence.Rule string or preset name, and the first occurrence is on
+        start_date (default today) or the first date after it the rule
+        allows. Nothing is added until materialize_recurring() runs"""
+        if kind not in ("expense", "income"):
+            raise ValueError(f"Unknown transaction type: {kind!r}")
+        rule = str(Rule.parse(rule))
+        if start_date is None:
+            start_date = datetime.datetime.now().strftime("%Y-%m-%d")
+        self.cursor.execute(
+            "INSERT INTO recurring (user_id, type, label, amount, description, rule, start_date)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (user_id, kind, label, check_cents(amount), description, rule, to_iso_date(start_date))
+        )
+        self._commit()
+        return self.cursor.lastrowid
+    
+    def get_recurring(self, user_id):
+        """Get a user's recurring transactions as (id, type, label, amount,
+        description, rule, start_date, last_materialized) rows"""
         self.cursor.execute(
-            "SELECT id, category, date, amount, description, 'expense' as type FROM expenses WHERE user_id = ?"
-            " UNION ALL "
-            "SELECT id, source, date, amount, 'Income' as description, 'income' as type FROM income WHERE user_id = ?"
-            " ORDER BY date DESC",
+            "SELECT id, type, label, amount, description, rule, start_date, last_materialized"
+            " FROM recurring WHERE user_id = ? ORDER BY id",
+            (user_id,)
+        )
+        return self.cursor.fetchall()
+    
+    def delete_recurring(self, rule_id, user_id=None):
+        """Stop a recurring transaction and return True if it existed.
+        Occurrences that were already added are kept"""
+        if user_id is None:
+            self.cursor.execute("DELETE FROM recurring WHERE id = ?", (rule_id,))
+        else:
+            self.cursor.execute("DELETE FROM recurring WHERE id = ? AND user_id = ?",
+                                (rule_id, user_id))
+        self._commit()
+        return self.cursor.rowcount > 0
+    
+    def materialize_recurring(self, user_id=None, through=None):
+        """Add every occurrence of the recurring transactions of a user, or
+        of all users, that is due by through (default today) and has not
+        been added yet. Returns the number of transactions added.
+        Everything is written in one transaction together with each rule's
+        last_materialized date, so running it again, or after a crash,
+        never adds a date twice"""
+        through = to_iso_date(through) if through is not None else datetime.datetime.now().strftime("%Y-%m-%d")
+        expenses = []
+        income = []
+        self.flush()
+        try:
+            # Rules are read inside the write transaction, so two processes
+            # catching up at once cannot both add the same dates
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.cursor.execute(
+                "SELECT id, user_id, type, label, amount, description, rule, start_date, last_materialized"
+                " FROM recurring WHERE (? IS NULL OR user_id = ?)"
+                " AND (last_materialized IS NULL OR last_materialized < ?)",
+                (user_id, user_id, through)
+            )
+            marks = []
+            for rule_id, owner, kind, label, amount, description, rule, start, last in self.cursor.fetchall():
+                dates = list(Rule.parse(rule).occurrences(start, after=last, through=through))
+                if not dates:
+                    continue
+                if kind == "expense":
+                    expenses.extend((owner, label, date, amount, description) for date in dates)
+                else:
+                    income.extend((owner, amount, date, label) for date in dates)
+                marks.append((dates[-1], rule_id))
+            self._insert_rows("expenses", ("user_id", "category", "date", "amount", "description"), expenses)
+            self._insert_rows("income", ("user_id", "amount", "date", "source"), income)
+            self.cursor.executemany("UPDATE recurring SET last_materialized = ? WHERE id = ?", marks)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        if expenses or income:
+            self._bump_version()
+        return len(expenses) + len(income)
+    
+    # Monthly category budgets
+    def set_budget(self, user_id, category, amount):
+        """Set the monthly budget of an expense category, in cents"""
+        if check_cents(amount) < 0:
+            raise ValueError(f"budgets cannot be negative, got {amount}")
+        self.cursor.execute(
+            "INSERT INTO budgets (user_id, category, amount) VALUES (?, ?, ?)"
+            " ON CONFLICT (user_id, category) DO UPDATE SET amount = excluded.amount",
+            (user_id, category, amount)
+        )
+        self._commit()
+        self._bump_version()
+    
+    def delete_budget(self, user_id, category):
+        """Remove the budget of a category and return True if it had one"""
+        self.cursor.execute("DELETE FROM budgets WHERE user_id = ? AND category = ?",
+                            (user_id, category))
+        self._commit()
+        self._bump_version()
+        return self.cursor.rowcount > 0
+    
+    def get_budgets(self, user_id):
+        """Get a user's (category, amount) budgets"""
+        self.cursor.execute(
+            "SELECT category, amount FROM budgets WHERE user_id = ? ORDER BY category",
+            (user_id,)
+        )
+        return self.cursor.fetchall()
+    
+    def get_monthly_expense_totals(self, user_id):
+        """Get a user's (month, category, total) expense totals for every month"""
+        self.cursor.execute(
+            "SELECT month, category, total FROM expense_totals WHERE user_id = ?",
+            (user_id,)
+        )
+        return self.cursor.fetchall()
+    
+    def get_totals(self, user_id):
+        """Get a user's {'expense': (count, total), 'income': (count, total)}
+        from the monthly totals, without reading any transaction rows"""
+        self.cursor.execute(
+            "SELECT 'expense', SUM(count), SUM(total) FROM expense_totals WHERE user_id = ?"
+            " UNION ALL"
+            " SELECT 'income', SUM(count), SUM(total) FROM income_totals WHERE user_id = ?",
             (user_id, user_id)
         )
+        return {kind: (count or 0, round(total or 0)) for kind, count, total in self.cursor.fetchall()}
+    
+    def budget_status(self, user_id, month):
+        """Get (category, budget, spent) for every budgeted category in a
+        'YYYY-MM' month. Spending comes from the monthly totals, one primary
+        key lookup per budget"""
+        month = month_range(month)[0][:7]
+        self.cursor.execute(
+            "SELECT b.category, b.amount, IFNULL(t.total, 0) FROM budgets b"
+            " LEFT JOIN expense_totals t"
+            " ON t.user_id = b.user_id AND t.category = b.category AND t.month = ?"
+            " WHERE b.user_id = ? ORDER BY b.category",
+            (month, user_id)
+        )
         return self.cursor.fetchall()
     
     # For data visualization
     def get_expense_by_category(self, user_id):
         """Get expense totals grouped by category for charts"""
+        # Read from the trigger-maintained monthly totals rather than
+        # summing every expense the user ever entered
         self.cursor.execute(
-            "SELECT category, SUM(amount) FROM expenses WHERE user_id = ? GROUP BY category",
+            "SELECT category, SUM(total) FROM expense_totals WHERE user_id = ? GROUP BY category",
             (user_id,)
         )
         return self.cursor.fetchall()
@@ -145,12 +938,102 @@ class Database:
     def get_income_by_source(self, user_id):
         """Get income totals grouped by source for charts"""
         self.cursor.execute(
-            "SELECT source, SUM(amount) FROM income WHERE user_id = ? GROUP BY source",
+            "SELECT NULLIF(source, ''), SUM(total) FROM income_totals WHERE user_id = ? GROUP BY source",
             (user_id,)
         )
         return self.cursor.fetchall()
-        
-    def __del__(self):
-        """Close database connection when object is destroyed"""
-        if hasattr(self, 'conn'):
-            self.conn.close()
\ No newline at end of file
+    
+    def get_rollup(self, user_id, kind, period="month", start=None, end=None):
+        """Get (period, category or source, total) rows per day, week or month, oldest first.
+        Weeks are keyed by their Monday and months by 'YYYY-MM'. start and end
+        are 'YYYY-MM-DD' dates; start is inclusive and end exclusive"""
+        table, label = ROLLUP_TABLES[kind]
+        key = ROLLUP_PERIODS[period]
+        # Days are the stored date text, which migration 8 leaves as it was
+        # when it cannot be read ('05/03/2024', '2024-02-30'); those have no
+        # period and are left out, like the NULL ledger days in query()
+        conditions = ["user_id = ?", f"{DAY_OF.format('day')} IS NOT NULL"]
+        params = [user_id]
+        # Range conditions on day are a seek in the (user_id, day) primary key
+        if start is not None:
+            conditions.append("day >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append("day < ?")
+            params.append(end)
+        self.cursor.execute(
+            f"SELECT {key} AS period, NULLIF({label}, ''), SUM(total) FROM {table}"
+            f" WHERE {' AND '.join(conditions)} GROUP BY period, {label} ORDER BY period",
+            params
+        )
+        return self.cursor.fetchall()
+    
+    # Maintenance of the summary tables
+    def rebuild_aggregates(self):
+        """Recompute the per-month and per-day totals tables and the ledger
+        from the expenses and income tables"""
+        self.flush()
+        try:
+            self.conn.execute("BEGIN IMMEDIATE")
+            for sql in REBUILD_TOTALS + REBUILD_DAILY_TOTALS + REBUILD_LEDGER + FILL_LEDGER_DAYS:
+                self.cursor.execute(sql)
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+    
+    def rebuild_search_index(self):
+        """Re-index every expense and income row for full-text search"""
+        self.flush()
+        try:
+            self.conn.execute("BEGIN IMMEDIATE")
+            for sql in REBUILD_SEARCH:
+                self.cursor.execute(sql)
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+    
+    def check_aggregates(self):
+        """Compare the totals tables and the ledger with the base tables and
+        return the mismatching (kind, user_id, category or source, month or
+        day) groups"""
+        mismatches = []
+        for kind, table, totals, label, period, key in (
+            ("expense", "expenses", "expense_totals", "category", "month", "substr(date, 1, 7)"),
+            ("income", "income", "income_totals", "source", "month", "substr(date, 1, 7)"),
+            ("expense", "expenses", "expense_daily_totals", "category", "day", "date"),
+            ("income", "income", "income_daily_totals", "source", "day", "date"),
+        ):
+            actual = (
+                f"SELECT user_id, IFNULL({label}, '') AS label, {key} AS period,"
+                f" SUM(amount) AS total, COUNT(*) AS count FROM {table} GROUP BY 1, 2, 3"
+            )
+            self.cursor.execute(
+                f"SELECT a.user_id, a.label, a.period FROM ({actual}) a"
+                f" LEFT JOIN {totals} t ON t.user_id = a.user_id AND t.{label} = a.label AND t.{period} = a.period"
+                f" WHERE t.count IS NULL OR t.count != a.count OR t.total != a.total"
+                f" UNION "
+                f"SELECT t.user_id, t.{label}, t.{period} FROM {totals} t"
+                f" LEFT JOIN ({actual}) a ON t.user_id = a.user_id AND t.{label} = a.label AND t.{period} = a.period"
+                f" WHERE a.count IS NULL"
+            )
+            mismatches.extend((kind,) + row for row in self.cursor.fetchall())
+
+        # Ledger rows missing, different from or left over from their base row
+        for kind, table, label, amount, description, offset in (
+            ("expense", "expenses", "category", "-t.amount", "t.description", 0),
+            ("income", "income", "source", "t.amount", "NULL", 1),
+        ):
+            self.cursor.execute(
+                f"SELECT t.user_id, t.{label}, t.date FROM {table} t"
+                f" LEFT JOIN ledger l ON l.id = t.id * 2 + {offset}"
+                f" WHERE l.id IS NULL OR l.user_id != t.user_id OR l.date != t.date"
+                f" OR l.day IS NOT {DAY_OF.format('t.date')}"
+                f" OR l.label IS NOT t.{label} OR l.amount != {amount} OR l.description IS NOT {description}"
+                f" UNION "
+                f"SELECT l.user_id, l.label, l.date FROM ledger l"
+                f" WHERE l.id % 2 = {offset} AND NOT EXISTS (SELECT 1 FROM {table} WHERE id = l.id >> 1)"
+            )
+            mismatches.extend((kind,) + row for row in self.cursor.fetchall())
+        return mismatches
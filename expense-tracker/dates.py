@@ -0,0 +1,54 @@
+import datetime
+import re
+
+
+# Dates are stored as 'YYYY-MM-DD' text, which sorts in date order, and the
+# ledger also keeps them as day numbers counted from EPOCH for range queries.
+# Checking and converting input happens here, like amounts in money.py.
+EPOCH = datetime.date(1970, 1, 1)
+
+# Year, month and day of a date, optionally followed by a time of hours and
+# minutes with optional seconds and fractions of a second
+DATE_PATTERN = re.compile(r"(\d{4})-(\d{1,2})-(\d{1,2})(?:[ T]\d{1,2}:\d{2}(?::\d{2}(?:\.\d+)?)?)?")
+
+
+def to_iso_date(value):
+    """Return a date given as a datetime.date or a 'YYYY-MM-DD' string as
+    'YYYY-MM-DD'. Single-digit months and days and a trailing time are
+    accepted, e.g. '2024-1-5 10:30'. Raises ValueError for anything else,
+    including dates that do not exist such as '2024-02-30'"""
+    if isinstance(value, datetime.datetime):
+        return value.date().isoformat()
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, str):
+        value = value.strip()
+        # Fast path for dates that already are in the stored form
+        if len(value) == 10 and value[4] == "-" and value[7] == "-":
+            try:
+                return datetime.date.fromisoformat(value).isoformat()
+            except ValueError:
+                pass
+        match = DATE_PATTERN.fullmatch(value)
+        if match:
+            try:
+                return datetime.date(*map(int, match.groups())).isoformat()
+            except ValueError:
+                pass
+    raise ValueError(f"invalid date {value!r}, expected YYYY-MM-DD")
+
+
+def day_number(value):
+    """Return the number of days from EPOCH to a date"""
+    return (datetime.date.fromisoformat(to_iso_date(value)) - EPOCH).days
+
+
+def month_range(month):
+    """Return the first day of a 'YYYY-MM' month and the first day of the
+    next one, as an inclusive start and exclusive end"""
+    try:
+        first = datetime.date.fromisoformat(to_iso_date(f"{month}-01"))
+    except ValueError:
+        raise ValueError(f"invalid month {month!r}, expected YYYY-MM") from None
+    following = datetime.date(first.year + first.month // 12, first.month % 12 + 1, 1)
+    return first.isoformat(), following.isoformat()
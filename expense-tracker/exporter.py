@@ -0,0 +1,176 @@
+"""Streaming export of a user's transactions to CSV, JSON Lines or Parquet.
+
+Rows are read from the database in chunks and written out before the next
+chunk is fetched, so memory use stays constant however many rows there are.
+
+CSV amounts are dollars ("12.34") so the file opens cleanly in a spreadsheet
+and can be imported again with importer.py. JSON Lines and Parquet keep the
+stored integer cents. Parquet needs the optional pyarrow package; its date
+column is null for stored dates that are not real YYYY-MM-DD dates, which
+the date_text column keeps as they were stored.
+
+Usage: python exporter.py PATH --user-id N [--db PATH] [--start DATE] [--end DATE] [--type expense|income]
+"""
+import argparse
+import csv
+import datetime
+import json
+import os
+import sys
+
+from database import Database
+from dates import to_iso_date
+from money import from_cents
+
+
+# Rows fetched from the database and written per step
+CHUNK_SIZE = 10000
+
+COLUMNS = ("id", "type", "date", "category", "source", "amount", "description")
+
+
+def split_label(row):
+    """Turn a transaction row into the COLUMNS values, amount still in cents.
+    The label is the category of an expense or the source of an income"""
+    row_id, label, date, amount, description, kind = row
+    if kind == "expense":
+        return row_id, kind, date, label, None, amount, description
+    return row_id, kind, date, None, label, amount, description
+
+
+def write_csv(chunks, path, progress=None):
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for rows in chunks:
+            # csv writes None as an empty field
+            writer.writerows(
+                (row_id, kind, date, category, source, from_cents(amount), description)
+                for row_id, kind, date, category, source, amount, description in map(split_label, rows)
+            )
+            count += len(rows)
+            if progress is not None:
+                progress(count)
+    return count
+
+
+def write_jsonl(chunks, path, progress=None):
+    count = 0
+    encode = json.JSONEncoder(ensure_ascii=False).encode
+    with open(path, "w", encoding="utf-8") as f:
+        for rows in chunks:
+            f.write("".join(encode(dict(zip(COLUMNS, split_label(row)))) + "\n" for row in rows))
+            count += len(rows)
+            if progress is not None:
+                progress(count)
+    return count
+
+
+def parse_date(text):
+    """Return the date of ISO text, or None for a date migration 8 could not
+    read and left as it was stored (e.g. '05/03/2024')"""
+    try:
+        return datetime.date.fromisoformat(text)
+    except (TypeError, ValueError):
+        return None
+
+
+def write_parquet(chunks, path, progress=None):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow; install it with 'pip install pyarrow'") from None
+
+    schema = pa.schema([
+        ("id", pa.int64()),
+        ("type", pa.string()),
+        ("date", pa.date32()),
+        ("date_text", pa.string()),
+        ("category", pa.string()),
+        ("source", pa.string()),
+        ("amount", pa.int64()),
+        ("description", pa.string()),
+    ])
+    count = 0
+    # Each chunk becomes one row group; Parquet dictionary-encodes the
+    # repetitive type, category and source columns by itself
+    with pq.ParquetWriter(path, schema) as writer:
+        for rows in chunks:
+            ids, kinds, dates, categories, sources, amounts, descriptions = zip(*map(split_label, rows))
+            writer.write_batch(pa.record_batch([
+                pa.array(ids, pa.int64()),
+                pa.array(kinds, pa.string()),
+                pa.array([parse_date(date) for date in dates], pa.date32()),
+                pa.array(dates, pa.string()),
+                pa.array(categories, pa.string()),
+                pa.array(sources, pa.string()),
+                pa.array(amounts, pa.int64()),
+                pa.array(descriptions, pa.string()),
+            ], schema=schema))
+            count += len(rows)
+            if progress is not None:
+                progress(count)
+    return count
+
+
+WRITERS = {
+    ".csv": write_csv,
+    ".jsonl": write_jsonl,
+    ".parquet": write_parquet,
+}
+
+
+def export_file(db, user_id, path, start=None, end=None, kind=None, progress=None,
+                chunk_size=CHUNK_SIZE):
+    """Export a user's transactions to path, in the format given by its
+    extension, and return the number of rows written.
+    start (inclusive) and end (exclusive) are ISO dates and kind is
+    'expense' or 'income'; progress(rows_so_far) is called after every chunk"""
+    ext = os.path.splitext(path)[1].lower()
+    writer = WRITERS.get(ext)
+    if writer is None:
+        raise ValueError(f"Unsupported export type: {ext or path}")
+
+    # Write next to the target and rename at the end, so a failed export
+    # never leaves a truncated file behind under the real name
+    partial = path + ".part"
+    try:
+        count = writer(db.iter_transactions(user_id, start, end, kind, chunk_size), partial, progress)
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="output file: .csv, .jsonl or .parquet")
+    parser.add_argument("--user-id", type=int, required=True)
+    parser.add_argument("--db", default="expense_tracker.db", help="database file")
+    parser.add_argument("--start", help="first date to include, YYYY-MM-DD")
+    parser.add_argument("--end", help="first date to leave out, YYYY-MM-DD")
+    parser.add_argument("--type", choices=("expense", "income"))
+    args = parser.parse_args()
+    # The bounds are compared with stored YYYY-MM-DD text, so '2024-1-5'
+    # has to become '2024-01-05' and anything unreadable is an error
+    try:
+        start = to_iso_date(args.start) if args.start is not None else None
+        end = to_iso_date(args.end) if args.end is not None else None
+    except ValueError as e:
+        parser.error(str(e))
+
+    def report(count):
+        print(f"\r{count:,} rows", end="", file=sys.stderr, flush=True)
+
+    with Database(args.db) as db:
+        count = export_file(db, args.user_id, args.path, start, end, args.type, report)
+    print(f"\rExported {count:,} rows to {args.path}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,240 @@
+import csv
+import datetime
+import os
+import re
+
+from money import to_cents
+
+
+# Rows are handed to the database in chunks of this size, so memory use stays
+# constant no matter how large the statement file is.
+CHUNK_SIZE = 10000
+
+# Only the first rejected lines are kept for the report; the rest are counted.
+MAX_REPORTED_REJECTS = 100
+
+DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%d.%m.%Y", "%Y%m%d", "%m/%d/%y")
+
+OFX_TAG = re.compile(r"<(\w+)>([^<\r\n]*)")
+
+
+class ImportReport:
+    """Summary of an import: rows written and lines that were rejected"""
+
+    def __init__(self):
+        self.expenses = 0
+        self.income = 0
+        self.rejected_count = 0
+        self.rejected = []
+
+    def reject(self, line_no, reason):
+        self.rejected_count += 1
+        if len(self.rejected) < MAX_REPORTED_REJECTS:
+            self.rejected.append((line_no, reason))
+
+    def __str__(self):
+        lines = [f"Imported {self.expenses} expenses and {self.income} income records"]
+        if self.rejected_count:
+            lines.append(f"Rejected {self.rejected_count} lines:")
+            lines.extend(f"  line {line_no}: {reason}" for line_no, reason in self.rejected)
+            if self.rejected_count > len(self.rejected):
+                lines.append(f"  ... and {self.rejected_count - len(self.rejected)} more")
+        return "\n".join(lines)
+
+
+# Parsing helpers
+def parse_date(value):
+    """Parse a statement date into YYYY-MM-DD, raising ValueError if invalid"""
+    value = value.strip()
+    try:
+        # Fast path for ISO dates, which is what our own exports use
+        return datetime.date.fromisoformat(value).isoformat()
+    except ValueError:
+        pass
+
+    # OFX dates look like 20240115120000.000[-5:EST]; QIF uses 1/15'24
+    value = value.replace("'", "/")
+    if len(value) > 8 and value[:8].isdigit():
+        value = value[:8]
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            continue
+    raise ValueError(f"invalid date {value!r}")
+
+
+def parse_amount(value):
+    """Parse a signed money amount such as '-1,234.50' or '$12' into cents"""
+    cents = to_cents(value)
+    if cents == 0:
+        raise ValueError("amount is zero")
+    return cents
+
+
+# Readers yield (line_no, kind, label, cents, description, date) records,
+# where kind is 'expense' or 'income' and label is the category or source.
+# Invalid rows are yielded as (line_no, None, reason, None, None, None).
+def read_csv(path):
+    """Lazily read records from a CSV file with a header row.
+
+    Required columns are date and amount. An optional type column
+    ('expense'/'income') decides the kind; without it negative amounts are
+    expenses and positive amounts are income. category, source and
+    description columns are used when present.
+    """
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        header = [name.strip().lower() for name in next(reader, [])]
+        missing = {"date", "amount"} - set(header)
+        if missing:
+            raise ValueError(f"CSV file is missing column(s): {', '.join(sorted(missing))}")
+
+        # Plain csv.reader with column positions is much cheaper per row than
+        # DictReader, which matters at hundreds of thousands of rows
+        date_col = header.index("date")
+        amount_col = header.index("amount")
+        type_col = header.index("type") if "type" in header else None
+        category_col = header.index("category") if "category" in header else None
+        source_col = header.index("source") if "source" in header else None
+        description_col = header.index("description") if "description" in header else None
+        width = len(header)
+
+        for row in reader:
+            line_no = reader.line_num
+            if len(row) < width:
+                if not any(row):
+                    continue
+                yield line_no, None, f"expected {width} columns, got {len(row)}", None, None, None
+                continue
+            try:
+                date = parse_date(row[date_col])
+                amount = parse_amount(row[amount_col])
+                kind = row[type_col].strip().lower() if type_col is not None else ""
+                if not kind:
+                    kind = "expense" if amount < 0 else "income"
+                elif kind not in ("expense", "income"):
+                    raise ValueError(f"unknown type {kind!r}")
+            except ValueError as e:
+                yield line_no, None, str(e), None, None, None
+                continue
+
+            description = row[description_col].strip() if description_col is not None else ""
+            label = ""
+            if kind == "income" and source_col is not None:
+                label = row[source_col].strip()
+            if not label and category_col is not None:
+                label = row[category_col].strip()
+            yield line_no, kind, label or "Other", abs(amount), description, date
+
+
+def read_ofx(path):
+    """Lazily read the STMTTRN entries of an OFX (SGML or XML) statement"""
+    with open(path, encoding="latin-1") as f:
+        txn = None
+        start_line = 0
+        for line_no, line in enumerate(f, 1):
+            for tag, value in OFX_TAG.findall(line):
+                tag = tag.upper()
+                if tag == "STMTTRN":
+                    txn = {}
+                    start_line = line_no
+                elif txn is not None:
+                    txn[tag] = value.strip()
+
+            if txn is not None and "</STMTTRN>" in line.upper():
+                yield _ofx_record(start_line, txn)
+                txn = None
+
+
+def _ofx_record(line_no, txn):
+    try:
+        amount = parse_amount(txn.get("TRNAMT", ""))
+        date = parse_date(txn.get("DTPOSTED", ""))
+    except ValueError as e:
+        return line_no, None, str(e), None, None, None
+
+    name = txn.get("NAME") or txn.get("PAYEE") or ""
+    memo = txn.get("MEMO", "")
+    if amount < 0:
+        description = " - ".join(part for part in (name, memo) if part)
+        return line_no, "expense", "Other", -amount, description, date
+    return line_no, "income", name or "Other", amount, memo, date
+
+
+def read_qif(path):
+    """Lazily read the transactions of a QIF bank export"""
+    with open(path, encoding="latin-1") as f:
+        fields = {}
+        start_line = None
+        for line_no, line in enumerate(f, 1):
+            line = line.rstrip("\r\n")
+            if not line or line.startswith("!"):
+                continue
+            if start_line is None:
+                start_line = line_no
+            if line.startswith("^"):
+                yield _qif_record(start_line, fields)
+                fields = {}
+                start_line = None
+            else:
+                fields[line[0]] = line[1:].strip()
+
+
+def _qif_record(line_no, fields):
+    try:
+        amount = parse_amount(fields.get("T") or fields.get("U", ""))
+        date = parse_date(fields.get("D", ""))
+    except ValueError as e:
+        return line_no, None, str(e), None, None, None
+
+    payee = fields.get("P", "")
+    category = fields.get("L", "").split(":")[0] or "Other"
+    if amount < 0:
+        description = " - ".join(part for part in (payee, fields.get("M", "")) if part)
+        return line_no, "expense", category, -amount, description, date
+    return line_no, "income", payee or category, amount, fields.get("M", ""), date
+
+
+READERS = {
+    ".csv": read_csv,
+    ".ofx": read_ofx,
+    ".qfx": read_ofx,
+    ".qif": read_qif,
+}
+
+
+def import_file(db, user_id, path, chunk_size=CHUNK_SIZE):
+    """Stream a CSV, OFX or QIF file into the database and return an ImportReport"""
+    ext = os.path.splitext(path)[1].lower()
+    reader = READERS.get(ext)
+    if reader is None:
+        raise ValueError(f"Unsupported file type: {ext or path}")
+    return import_records(db, user_id, reader(path), chunk_size)
+
+
+def import_records(db, user_id, records, chunk_size=CHUNK_SIZE):
+    """Write parsed records to the database in chunks and return an ImportReport"""
+    report = ImportReport()
+    expenses = []
+    income = []
+
+    for line_no, kind, label, amount, description, date in records:
+        if kind == "expense":
+            expenses.append((label, amount, description, date))
+            if len(expenses) >= chunk_size:
+                report.expenses += db.add_expenses_bulk(user_id, expenses, chunk_size)
+                expenses = []
+        elif kind == "income":
+            income.append((amount, label, date))
+            if len(income) >= chunk_size:
+                report.income += db.add_income_bulk(user_id, income, chunk_size)
+                income = []
+        else:
+            report.reject(line_no, label)
+
+    if expenses:
+        report.expenses += db.add_expenses_bulk(user_id, expenses, chunk_size)
+    if income:
+        report.income += db.add_income_bulk(user_id, income, chunk_size)
+    return report
@@ -0,0 +1,258 @@
+"""Opt-in instrumentation for Database.
+
+instrument(db) wraps the public methods of one Database object to record
+call counts, a latency histogram and rows returned per method, and hooks
+every connection with a trace callback and a progress handler. Calls slower
+than a threshold are written to a slow-query log together with the SQL they
+ran and its query plan. A Database that is never instrumented runs the
+plain class methods, so the layer costs nothing when it is off.
+
+The app turns it on from the environment:
+    EXPENSE_TRACKER_STATS      write the statistics as JSON to this file at exit
+    EXPENSE_TRACKER_SLOW_LOG   append slow calls to this file
+    EXPENSE_TRACKER_SLOW_MS    threshold for the slow log, default 100
+"""
+import atexit
+import datetime
+import functools
+import json
+import os
+import re
+import threading
+import time
+
+from records import Record
+
+# Upper bounds of the latency histogram buckets in milliseconds; the last
+# bucket takes everything slower
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+# The progress handler runs every this many SQLite virtual machine steps
+PROGRESS_STEPS = 1000
+
+SLOW_MS = 100.0
+
+# Public methods that are not queries
+UNTIMED = {"close", "add_connection_hook"}
+
+# The table an INSERT, REPLACE, UPDATE or DELETE statement writes to
+WRITE_TABLE = re.compile(
+    r"\s*(?:INSERT|REPLACE|UPDATE|DELETE)(?:\s+OR\s+\w+)?\s+(?:INTO\s+|FROM\s+)?[\"'`\[]?(\w+)",
+    re.IGNORECASE
+)
+
+
+class MethodStats:
+    """Call count, latency histogram, rows and work done by one method"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.statements = 0
+        self.vm_steps = 0
+        self.histogram = [0] * (len(BUCKETS_MS) + 1)
+
+    def record(self, elapsed_ms, rows, statements, vm_steps, failed):
+        self.calls += 1
+        self.errors += failed
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.rows += rows
+        self.statements += statements
+        self.vm_steps += vm_steps
+        for index, bound in enumerate(BUCKETS_MS):
+            if elapsed_ms <= bound:
+                break
+        else:
+            index = len(BUCKETS_MS)
+        self.histogram[index] += 1
+
+    def as_dict(self):
+        labels = [f"<={bound}ms" for bound in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"]
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "rows": self.rows,
+            "statements": self.statements,
+            "vm_steps": self.vm_steps,
+            "histogram": {label: count for label, count in zip(labels, self.histogram) if count},
+        }
+
+
+def count_rows(result):
+    """Rows returned by a Database method: list or dict length, 1 for a
+    single row or record"""
+    if isinstance(result, (list, dict)):
+        return len(result)
+    if isinstance(result, (tuple, Record)):
+        return 1
+    return 0
+
+
+def is_internal(sql):
+    """Return True for statements SQLite and FTS5 run for themselves: trace
+    lines of virtual table and trigger steps, which start with "--", and
+    bookkeeping such as FTS5's config reads, which name the schema as 'main'"""
+    return sql.startswith("--") or "'main'." in sql
+
+
+class Instrumentation:
+    """Collects statistics for the Database objects passed to instrument()"""
+
+    def __init__(self, slow_ms=SLOW_MS, slow_log=None):
+        self.slow_ms = slow_ms
+        self.slow_log = slow_log
+        self.methods = {}
+        # Lower-cased names of the tables that have triggers
+        self.triggered = set()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.started = datetime.datetime.now()
+
+    @classmethod
+    def from_environment(cls, environ=os.environ):
+        """Return an Instrumentation configured from the environment, or
+        None when none of the EXPENSE_TRACKER_ variables are set"""
+        stats_path = environ.get("EXPENSE_TRACKER_STATS")
+        slow_log = environ.get("EXPENSE_TRACKER_SLOW_LOG")
+        if not stats_path and not slow_log:
+            return None
+        instruments = cls(float(environ.get("EXPENSE_TRACKER_SLOW_MS", SLOW_MS)), slow_log)
+        if stats_path:
+            atexit.register(instruments.export, stats_path)
+        return instruments
+
+    def instrument(self, db):
+        """Start recording every public method call and statement of db"""
+        for name in dir(type(db)):
+            if name.startswith("_") or name in UNTIMED:
+                continue
+            method = getattr(type(db), name)
+            if callable(method):
+                # An instance attribute shadows the class method for this object only
+                setattr(db, name, self.wrap(db, name, getattr(db, name)))
+        db.add_connection_hook(self.attach)
+        return db
+
+    def attach(self, conn):
+        """Install the trace callback and progress handler on a connection"""
+        self.triggered.update(name.lower() for (name,) in conn.execute(
+            "SELECT DISTINCT tbl_name FROM sqlite_master WHERE type = 'trigger'"))
+        conn.set_trace_callback(self.on_statement)
+        conn.set_progress_handler(self.on_progress, PROGRESS_STEPS)
+
+    # The hooks only append to per-thread state; it is folded into the
+    # method statistics when the outermost instrumented call returns
+    def on_statement(self, sql):
+        statements = getattr(self.local, "statements", None)
+        if statements is None or is_internal(sql):
+            return
+        # Each step of a trigger is traced again as the write that fired it,
+        # so one INSERT into expenses arrives once per trigger step; keep it
+        # once. Only writes to a table with triggers repeat like that, so a
+        # read or other write run twice in a row is counted twice. An
+        # identical write to such a table run twice in a row cannot be told
+        # apart from its trigger steps and is counted once.
+        if statements and statements[-1] == sql and self.fires_triggers(sql):
+            return
+        statements.append(sql)
+
+    def fires_triggers(self, sql):
+        """Return True if sql writes to a table that has triggers"""
+        match = WRITE_TABLE.match(sql)
+        return match is not None and match.group(1).lower() in self.triggered
+
+    def on_progress(self):
+        self.local.steps = getattr(self.local, "steps", 0) + PROGRESS_STEPS
+        return 0
+
+    def wrap(self, db, name, method):
+        stats = self.methods.setdefault(name, MethodStats())
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            local = self.local
+            if getattr(local, "statements", None) is not None:
+                # Called from another instrumented method, which gets the time
+                return method(*args, **kwargs)
+
+            local.statements = []
+            local.steps = 0
+            failed = False
+            result = None
+            start = time.perf_counter()
+            try:
+                result = method(*args, **kwargs)
+                return result
+            except Exception:
+                failed = True
+                raise
+            finally:
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                statements, local.statements = local.statements, None
+                with self.lock:
+                    stats.record(elapsed_ms, count_rows(result), len(statements),
+                                 local.steps, failed)
+                if self.slow_log and elapsed_ms >= self.slow_ms:
+                    self.log_slow(db, name, args, elapsed_ms, statements)
+
+        return timed
+
+    def log_slow(self, db, name, args, elapsed_ms, statements):
+        """Append a slow call with its statements and their query plans to the slow log"""
+        lines = [f"{datetime.datetime.now().isoformat(timespec='milliseconds')}"
+                 f" {name}{args!r} took {elapsed_ms:.1f} ms"]
+        for sql in statements:
+            lines.append(f"    SQL: {sql.strip()}")
+            if sql.lstrip().upper().startswith(("SELECT", "WITH")):
+                lines.extend(f"        PLAN: {detail}" for detail in self.query_plan(db, sql))
+        with self.lock:
+            with open(self.slow_log, "a") as f:
+                f.write("\n".join(lines) + "\n")
+
+    def query_plan(self, db, sql):
+        # The traced SQL has its parameters filled in, so it can be explained
+        # as is. The call has finished, so the EXPLAIN itself is not recorded.
+        try:
+            rows = db.conn.execute("EXPLAIN QUERY PLAN " + sql).fetchall()
+        except Exception as e:
+            return [f"unavailable: {e}"]
+        # Rows are (id, parent, unused, detail); indent each under its parent
+        depth = {0: -1}
+        lines = []
+        for node, parent, unused, detail in rows:
+            depth[node] = depth.get(parent, -1) + 1
+            lines.append("  " * depth[node] + detail)
+        return lines
+
+    def snapshot(self):
+        """Return the statistics collected so far as a dict"""
+        with self.lock:
+            methods = {name: stats.as_dict() for name, stats in sorted(self.methods.items())
+                       if stats.calls}
+        return {
+            "started": self.started.isoformat(timespec="seconds"),
+            "exported": datetime.datetime.now().isoformat(timespec="seconds"),
+            "slow_ms": self.slow_ms,
+            "methods": methods,
+        }
+
+    def export(self, path):
+        """Write the statistics to path as JSON"""
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+    def report(self):
+        """Return the statistics as a text table, slowest total first"""
+        methods = self.snapshot()["methods"]
+        lines = [f"{'method':<28} {'calls':>7} {'mean ms':>9} {'max ms':>9} {'rows':>9}"]
+        for name, stats in sorted(methods.items(), key=lambda item: -item[1]["total_ms"]):
+            lines.append(f"{name:<28} {stats['calls']:>7} {stats['mean_ms']:>9.2f}"
+                         f" {stats['max_ms']:>9.2f} {stats['rows']:>9}")
+        return "\n".join(lines)
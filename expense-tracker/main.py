@@ -1,13 +1,42 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 import datetime
-from database import Database
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from worker import DatabaseWorker
+from database import SORT_KEYS, sort_key
+from dates import to_iso_date
+from importer import import_file
+from exporter import export_file
+from money import format_cents, to_cents
+from budgets import BudgetEngine
+from recurrence import Rule
+from paging import TreePager
+from charts import ChartCache, ChartWindow
 from tkinter import font as tkfont
 
+# Wait this long after the last keystroke before running a search
+SEARCH_DELAY_MS = 250
+
+EXPENSE_CATEGORIES = ["Food", "Housing", "Transportation", "Entertainment", "Utilities", "Shopping", "Health", "Education", "Other"]
+INCOME_SOURCES = ["Salary", "Freelance", "Investment", "Gift", "Bonus", "Refund", "Other"]
+
+# Singular and plural names of each kind of row, for messages
+KIND_NOUNS = {"expense": ("expense", "expenses"), "income": ("income entry", "income entries")}
+
+# Budgets at least this full are highlighted before they run over
+BUDGET_WARNING_SHARE = 0.9
+
+# Choices of the Repeat box on the add forms, as recurrence presets
+REPEAT_OPTIONS = {
+    "Never": None,
+    "Weekly": "weekly",
+    "Every 2 weeks": "biweekly",
+    "Monthly": "monthly",
+    "Quarterly": "quarterly",
+    "Yearly": "yearly",
+}
+
 class ExpenseTrackerApp:
-    def __init__(self, root):
+    def __init__(self, root, db_name="expense_tracker.db"):
         self.root = root
         self.root.title("Expense Tracker")
         self.root.geometry("800x600")
@@ -27,17 +56,40 @@ class ExpenseTrackerApp:
         self.label_font = tkfont.Font(family="Arial", size=10)
         self.button_font = tkfont.Font(family="Arial", size=10, weight="bold")
         
-        self.db = Database()
+        # All database access goes through a worker thread so that slow
+        # queries and commits never block the Tk event loop
+        self.db = DatabaseWorker(self.root, db_name)
         self.current_user_id = None
         self.username = None
+        self.chart_cache = ChartCache()
+        self.chart_windows = {}
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
         # Start with login screen
         self.show_login_screen()
 
+    def on_close(self):
+        self.db.close()
+        self.root.destroy()
+        
+    def run_db(self, func, *args, callback=None, errback=None, tag=None):
+        """Run a Database call on the worker thread; callback gets the result on the Tk thread"""
+        return self.db.submit(func, *args, callback=callback,
+                              errback=errback or self.show_db_error, tag=tag)
+        
+    def show_db_error(self, error):
+        messagebox.showerror("Database Error", str(error))
+        
     def show_login_screen(self):
-        # Clear any existing widgets
+        # Drop requests queued for the previous session and get the writes
+        # it made onto disk, including any group commit still holds back
+        self.db.cancel_all()
+        self.db.submit("flush", True)
+        
+        # Clear any existing widgets, chart windows included
         for widget in self.root.winfo_children():
             widget.destroy()
+        self.chart_windows = {}
             
         # Create a frame with some padding and a border
         frame = tk.Frame(self.root, padx=30, pady=30, bg=self.bg_color, 
@@ -90,7 +142,10 @@ class ExpenseTrackerApp:
             messagebox.showerror("Error", "Please enter both username and password")
             return
             
-        user_id = self.db.validate_user(username, password)
+        self.run_db("validate_user", username, password,
+                    callback=lambda user_id: self.finish_login(username, user_id))
+        
+    def finish_login(self, username, user_id):
         if user_id:
             self.current_user_id = user_id
             self.username = username
@@ -106,7 +161,9 @@ class ExpenseTrackerApp:
             messagebox.showerror("Error", "Please enter both username and password")
             return
             
-        success = self.db.add_user(username, password)
+        self.run_db("add_user", username, password, callback=self.finish_register)
+        
+    def finish_register(self, success):
         if success:
             messagebox.showinfo("Success", "Registration successful. You can now login.")
         else:
@@ -117,6 +174,10 @@ class ExpenseTrackerApp:
         for widget in self.root.winfo_children():
             widget.destroy()
             
+        # Add recurring transactions that came due since the last run. The
+        # worker runs requests in order, so every list loaded below has them.
+        self.run_db("materialize_recurring", self.current_user_id)
+        
         # Create top frame for user info and logout
         top_frame = tk.Frame(self.root, bg=self.accent_color, height=50)
         top_frame.pack(fill=tk.X)
@@ -138,23 +199,68 @@ class ExpenseTrackerApp:
         
         notebook = ttk.Notebook(self.root)
         notebook.pack(expand=True, fill=tk.BOTH, padx=10, pady=10)
+        self.notebook = notebook
         
         # Create tabs
         expenses_tab = ttk.Frame(notebook)
         income_tab = ttk.Frame(notebook)
         history_tab = ttk.Frame(notebook)
+        budgets_tab = ttk.Frame(notebook)
         charts_tab = ttk.Frame(notebook)
         
         notebook.add(expenses_tab, text="Expenses")
         notebook.add(income_tab, text="Income")
         notebook.add(history_tab, text="Transaction History")
+        notebook.add(budgets_tab, text="Budgets")
         notebook.add(charts_tab, text="Charts")
         
-        # Set up the tabs
-        self.setup_expenses_tab(expenses_tab)
-        self.setup_income_tab(income_tab)
-        self.setup_history_tab(history_tab)
-        self.setup_charts_tab(charts_tab)
+        # Tabs are only built and loaded the first time they are shown, so
+        # the main window appears without waiting for the other three.
+        # Requests are tagged with the name of the tab they belong to.
+        self.tabs = {
+            str(expenses_tab): ("expenses", self.setup_expenses_tab),
+            str(income_tab): ("income", self.setup_income_tab),
+            str(history_tab): ("history", self.setup_history_tab),
+            str(budgets_tab): ("budgets", self.setup_budgets_tab),
+            str(charts_tab): ("charts", self.setup_charts_tab),
+        }
+        self.built_tabs = set()
+        self.pagers = {}
+        # (column, descending) order of the expense and income lists
+        self.list_sorts = {"expenses": ("date", True), "income": ("date", True)}
+        self.history_query = ""
+        self.history_sort = None
+        self.history_kind = None
+        # (column, descending, type) of the history rows paged from the
+        # database; kept while a sort waits for the snapshot to load
+        self.history_paging = ("date", True, None)
+        self.snapshot = None
+        self.snapshot_loading = False
+        self.history_order = None
+        self.current_tab = None
+        notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+        self.on_tab_changed()
+        
+        # Budget checks after every expense run against these in-memory totals
+        self.budgets = None
+        self.budget_month = datetime.date.today().strftime("%Y-%m")
+        self.load_budgets()
+        
+    def on_tab_changed(self, event=None):
+        tab_id = self.notebook.select()
+        tab, setup = self.tabs[tab_id]
+        
+        # Pending loads for the tab we are leaving are stale by the time the
+        # user comes back, so cancel them rather than let them queue up
+        if self.current_tab is not None and self.current_tab != tab:
+            self.db.cancel(self.current_tab)
+        self.current_tab = tab
+        
+        if tab not in self.built_tabs:
+            self.built_tabs.add(tab)
+            setup(self.notebook.nametowidget(tab_id))
+        elif tab in self.pagers:
+            self.pagers[tab].resume()
         
     def setup_expenses_tab(self, parent):
         # Frame for the form with a border
@@ -176,9 +282,8 @@ class ExpenseTrackerApp:
         tk.Label(form_frame, text="Category:", font=self.label_font, 
                 bg=self.bg_color, fg=self.text_color).grid(row=1, column=2, padx=5, pady=5, sticky="e")
         self.expense_category_var = tk.StringVar()
-        categories = ["Food", "Housing", "Transportation", "Entertainment", "Utilities", "Shopping", "Health", "Education", "Other"]
         self.expense_category_dropdown = ttk.Combobox(form_frame, textvariable=self.expense_category_var, 
-                                                    values=categories, width=15, font=self.label_font)
+                                                    values=EXPENSE_CATEGORIES, width=15, font=self.label_font)
         self.expense_category_dropdown.grid(row=1, column=3, padx=5, pady=5, sticky="w")
         self.expense_category_dropdown.current(0)
         
@@ -195,6 +300,13 @@ class ExpenseTrackerApp:
         self.expense_description_entry = tk.Entry(form_frame, width=40, font=self.label_font)
         self.expense_description_entry.grid(row=2, column=1, columnspan=3, padx=5, pady=5, sticky="w")
         
+        # Repeat input; anything but Never saves a recurring expense
+        tk.Label(form_frame, text="Repeat:", font=self.label_font, 
+                bg=self.bg_color, fg=self.text_color).grid(row=3, column=0, padx=5, pady=5, sticky="e")
+        self.expense_repeat_var = tk.StringVar(value="Never")
+        ttk.Combobox(form_frame, textvariable=self.expense_repeat_var, values=list(REPEAT_OPTIONS), 
+                     state="readonly", width=15, font=self.label_font).grid(row=3, column=1, padx=5, pady=5, sticky="w")
+        
         # Button frame
         button_frame = tk.Frame(form_frame, bg=self.bg_color)
         button_frame.grid(row=2, column=4, columnspan=2, padx=5, pady=5)
@@ -221,7 +333,8 @@ class ExpenseTrackerApp:
         style.configure("Treeview.Heading", font=('Arial', 10, 'bold'))
         
         columns = ("id", "category", "date", "amount", "description")
-        self.expense_tree = ttk.Treeview(list_frame, columns=columns, show="headings", style="Treeview")
+        self.expense_tree = ttk.Treeview(list_frame, columns=columns, show="headings", style="Treeview",
+                                         selectmode="extended")
         
         # Define headings
         self.expense_tree.heading("id", text="ID")
@@ -229,6 +342,7 @@ class ExpenseTrackerApp:
         self.expense_tree.heading("date", text="Date")
         self.expense_tree.heading("amount", text="Amount")
         self.expense_tree.heading("description", text="Description")
+        self.sortable_headings("expenses", self.expense_tree, "expense")
         
         # Define columns
         self.expense_tree.column("id", width=50)
@@ -239,19 +353,40 @@ class ExpenseTrackerApp:
         
         # Add scrollbar
         scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.expense_tree.yview)
-        self.expense_tree.configure(yscroll=scrollbar.set)
         
         self.expense_tree.pack(side=tk.LEFT, expand=True, fill=tk.BOTH)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
+        # Alternating row colors
+        self.expense_tree.tag_configure("evenrow", background="#f0f0f0")
+        self.expense_tree.tag_configure("oddrow", background="#ffffff")
+        
+        # Rows are loaded a page at a time as the list is scrolled
+        self.pagers["expenses"] = TreePager(
+            self.expense_tree, scrollbar,
+            lambda after, limit, callback: self.run_db(
+                "get_expenses_page", self.current_user_id, limit, after, *self.list_sorts["expenses"],
+                callback=callback, tag="expenses"),
+            lambda expense: sort_key("expense", self.list_sorts["expenses"][0], expense),
+            self.make_expense_item
+        )
+        
         # Delete button frame
         delete_frame = tk.Frame(parent, bg=self.bg_color)
         delete_frame.pack(fill=tk.X, padx=10, pady=5)
         
-        delete_btn = tk.Button(delete_frame, text="Delete Selected Expense", command=self.delete_expense, 
+        delete_btn = tk.Button(delete_frame, text="Delete Selected", command=self.delete_expense, 
                              bg=self.delete_button_color, fg="white", font=self.button_font)
         delete_btn.pack(side=tk.LEFT, padx=10, pady=5)
         
+        # Bulk edits apply to every selected row (Shift/Ctrl-click to select several)
+        category_btn = tk.Button(delete_frame, text="Change Category...", font=self.button_font,
+                                 command=lambda: self.recategorize_selected("expense", self.expense_tree))
+        category_btn.pack(side=tk.LEFT, padx=5, pady=5)
+        date_btn = tk.Button(delete_frame, text="Change Date...", font=self.button_font,
+                             command=lambda: self.redate_selected("expense", self.expense_tree))
+        date_btn.pack(side=tk.LEFT, padx=5, pady=5)
+        
         # Load expenses
         self.load_expenses()
         
@@ -275,9 +410,8 @@ class ExpenseTrackerApp:
         tk.Label(form_frame, text="Source:", font=self.label_font, 
                 bg=self.bg_color, fg=self.text_color).grid(row=1, column=2, padx=5, pady=5, sticky="e")
         self.income_source_var = tk.StringVar()
-        sources = ["Salary", "Freelance", "Investment", "Gift", "Bonus", "Refund", "Other"]
         self.income_source_dropdown = ttk.Combobox(form_frame, textvariable=self.income_source_var, 
-                                                 values=sources, width=15, font=self.label_font)
+                                                 values=INCOME_SOURCES, width=15, font=self.label_font)
         self.income_source_dropdown.grid(row=1, column=3, padx=5, pady=5, sticky="w")
         self.income_source_dropdown.current(0)
         
@@ -288,9 +422,16 @@ class ExpenseTrackerApp:
         self.income_date_entry.insert(0, datetime.datetime.now().strftime("%Y-%m-%d"))
         self.income_date_entry.grid(row=1, column=5, padx=5, pady=5, sticky="w")
         
+        # Repeat input; anything but Never saves a recurring income
+        tk.Label(form_frame, text="Repeat:", font=self.label_font, 
+                bg=self.bg_color, fg=self.text_color).grid(row=2, column=0, padx=5, pady=5, sticky="e")
+        self.income_repeat_var = tk.StringVar(value="Never")
+        ttk.Combobox(form_frame, textvariable=self.income_repeat_var, values=list(REPEAT_OPTIONS), 
+                     state="readonly", width=15, font=self.label_font).grid(row=2, column=1, padx=5, pady=5, sticky="w")
+        
         # Button frame
         button_frame = tk.Frame(form_frame, bg=self.bg_color)
-        button_frame.grid(row=2, column=0, columnspan=6, padx=5, pady=10)
+        button_frame.grid(row=3, column=0, columnspan=6, padx=5, pady=10)
         
         # Add button
         add_btn = tk.Button(button_frame, text="Add Income", command=self.add_income, 
@@ -310,13 +451,15 @@ class ExpenseTrackerApp:
         
         # Create treeview for income
         columns = ("id", "amount", "date", "source")
-        self.income_tree = ttk.Treeview(list_frame, columns=columns, show="headings", style="Treeview")
+        self.income_tree = ttk.Treeview(list_frame, columns=columns, show="headings", style="Treeview",
+                                        selectmode="extended")
         
         # Define headings
         self.income_tree.heading("id", text="ID")
         self.income_tree.heading("amount", text="Amount")
         self.income_tree.heading("date", text="Date")
         self.income_tree.heading("source", text="Source")
+        self.sortable_headings("income", self.income_tree, "income")
         
         # Define columns
         self.income_tree.column("id", width=50)
@@ -326,19 +469,39 @@ class ExpenseTrackerApp:
         
         # Add scrollbar
         scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.income_tree.yview)
-        self.income_tree.configure(yscroll=scrollbar.set)
         
         self.income_tree.pack(side=tk.LEFT, expand=True, fill=tk.BOTH)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
+        # Alternating row colors
+        self.income_tree.tag_configure("evenrow", background="#f0f0f0")
+        self.income_tree.tag_configure("oddrow", background="#ffffff")
+        
+        # Rows are loaded a page at a time as the list is scrolled
+        self.pagers["income"] = TreePager(
+            self.income_tree, scrollbar,
+            lambda after, limit, callback: self.run_db(
+                "get_income_page", self.current_user_id, limit, after, *self.list_sorts["income"],
+                callback=callback, tag="income"),
+            lambda inc: sort_key("income", self.list_sorts["income"][0], inc),
+            self.make_income_item
+        )
+        
         # Delete button frame
         delete_frame = tk.Frame(parent, bg=self.bg_color)
         delete_frame.pack(fill=tk.X, padx=10, pady=5)
         
-        delete_btn = tk.Button(delete_frame, text="Delete Selected Income", command=self.delete_income, 
+        delete_btn = tk.Button(delete_frame, text="Delete Selected", command=self.delete_income, 
                              bg=self.delete_button_color, fg="white", font=self.button_font)
         delete_btn.pack(side=tk.LEFT, padx=10, pady=5)
         
+        source_btn = tk.Button(delete_frame, text="Change Source...", font=self.button_font,
+                               command=lambda: self.recategorize_selected("income", self.income_tree))
+        source_btn.pack(side=tk.LEFT, padx=5, pady=5)
+        date_btn = tk.Button(delete_frame, text="Change Date...", font=self.button_font,
+                             command=lambda: self.redate_selected("income", self.income_tree))
+        date_btn.pack(side=tk.LEFT, padx=5, pady=5)
+        
         # Load income
         self.load_income()
         
@@ -348,7 +511,37 @@ class ExpenseTrackerApp:
         title_frame.pack(fill=tk.X, padx=10, pady=(10, 5))
         
         tk.Label(title_frame, text="Transaction History", font=self.header_font, 
-                bg=self.bg_color, fg=self.accent_color).pack(anchor=tk.W)
+                bg=self.bg_color, fg=self.accent_color).pack(side=tk.LEFT)
+        
+        # Import button
+        import_btn = tk.Button(title_frame, text="Import Statement...", command=self.import_statement, 
+                             bg=self.accent_color, fg="white", font=self.button_font)
+        import_btn.pack(side=tk.RIGHT)
+        
+        # Recurring transactions button
+        recurring_btn = tk.Button(title_frame, text="Recurring...", command=self.show_recurring, 
+                                  bg=self.accent_color, fg="white", font=self.button_font)
+        recurring_btn.pack(side=tk.RIGHT, padx=(0, 5))
+        
+        # Export button; shows the row count while an export runs
+        self.export_btn = tk.Button(title_frame, text="Export...", command=self.export_history, 
+                                    bg=self.accent_color, fg="white", font=self.button_font)
+        self.export_btn.pack(side=tk.RIGHT, padx=(0, 5))
+        
+        # Search box; while it has text the list shows ranked matches
+        self.search_after_id = None
+        self.search_var = tk.StringVar()
+        self.search_var.trace_add("write", self.on_search_changed)
+        tk.Entry(title_frame, textvariable=self.search_var, width=30).pack(side=tk.RIGHT, padx=10)
+        tk.Label(title_frame, text="Search:", bg=self.bg_color, font=self.label_font).pack(side=tk.RIGHT)
+        
+        # Type filter, applied by the database like the header sorts
+        self.history_kind_var = tk.StringVar(value="All")
+        kind_dropdown = ttk.Combobox(title_frame, textvariable=self.history_kind_var, state="readonly",
+                                     values=("All", "Expenses", "Income"), width=9, font=self.label_font)
+        kind_dropdown.pack(side=tk.RIGHT, padx=10)
+        kind_dropdown.bind("<<ComboboxSelected>>", self.on_history_kind_changed)
+        tk.Label(title_frame, text="Show:", bg=self.bg_color, font=self.label_font).pack(side=tk.RIGHT)
         
         # Create treeview for transaction history with custom style
         history_frame = tk.Frame(parent)
@@ -357,12 +550,19 @@ class ExpenseTrackerApp:
         columns = ("type", "category", "date", "amount", "description")
         self.history_tree = ttk.Treeview(history_frame, columns=columns, show="headings", style="Treeview")
         
-        # Define headings
-        self.history_tree.heading("type", text="Type")
-        self.history_tree.heading("category", text="Category/Source")
-        self.history_tree.heading("date", text="Date")
-        self.history_tree.heading("amount", text="Amount")
-        self.history_tree.heading("description", text="Description")
+        # Define headings; clicking one sorts by that column. The database
+        # sorts by any of them but the description, which has no index and
+        # is sorted in the in-memory snapshot instead
+        self.history_headings = {
+            "type": "Type",
+            "category": "Category/Source",
+            "date": "Date",
+            "amount": "Amount",
+            "description": "Description",
+        }
+        for column, text in self.history_headings.items():
+            self.history_tree.heading(column, text=text,
+                                      command=lambda column=column: self.sort_history(column))
         
         # Define columns
         self.history_tree.column("type", width=80)
@@ -373,14 +573,109 @@ class ExpenseTrackerApp:
         
         # Add scrollbar
         scrollbar = ttk.Scrollbar(history_frame, orient=tk.VERTICAL, command=self.history_tree.yview)
-        self.history_tree.configure(yscroll=scrollbar.set)
         
         self.history_tree.pack(side=tk.LEFT, expand=True, fill=tk.BOTH)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
+        # Add color coding
+        self.history_tree.tag_configure("expense", background="#ffebee")  # Light red for expenses
+        self.history_tree.tag_configure("income", background="#e8f5e9")   # Light green for income
+        
+        # Count and totals of the rows shown while sorting or filtering
+        self.history_summary = tk.Label(parent, text="", bg=self.bg_color, fg=self.text_color,
+                                        font=self.label_font, anchor="w")
+        self.history_summary.pack(fill=tk.X, padx=10, pady=(0, 5))
+        
+        # Rows are loaded a page at a time as the list is scrolled
+        self.pagers["history"] = TreePager(
+            self.history_tree, scrollbar,
+            self.fetch_history_page,
+            self.history_cursor,
+            self.make_transaction_item,
+            striped=False
+        )
+        
         # Load transaction history
         self.load_transactions()
         
+    def setup_budgets_tab(self, parent):
+        # Frame for the form with a border
+        form_frame = tk.Frame(parent, padx=15, pady=15, bg=self.bg_color,
+                             highlightbackground=self.accent_color, highlightthickness=1)
+        form_frame.pack(fill=tk.X, padx=10, pady=10)
+        
+        # Title
+        tk.Label(form_frame, text="Monthly Budgets", font=self.header_font, 
+                bg=self.bg_color, fg=self.accent_color).grid(row=0, column=0, columnspan=6, pady=(0, 15), sticky="w")
+        
+        # Category input
+        tk.Label(form_frame, text="Category:", font=self.label_font, 
+                bg=self.bg_color, fg=self.text_color).grid(row=1, column=0, padx=5, pady=5, sticky="e")
+        self.budget_category_var = tk.StringVar()
+        self.budget_category_dropdown = ttk.Combobox(form_frame, textvariable=self.budget_category_var, 
+                                                   values=EXPENSE_CATEGORIES, width=15, font=self.label_font)
+        self.budget_category_dropdown.grid(row=1, column=1, padx=5, pady=5, sticky="w")
+        self.budget_category_dropdown.current(0)
+        
+        # Amount input
+        tk.Label(form_frame, text="Per month ($):", font=self.label_font, 
+                bg=self.bg_color, fg=self.text_color).grid(row=1, column=2, padx=5, pady=5, sticky="e")
+        self.budget_amount_entry = tk.Entry(form_frame, width=10, font=self.label_font)
+        self.budget_amount_entry.grid(row=1, column=3, padx=5, pady=5, sticky="w")
+        
+        # Set button
+        set_btn = tk.Button(form_frame, text="Set Budget", command=self.set_budget, 
+                          bg=self.button_color, fg="white", font=self.button_font, padx=10, pady=2)
+        set_btn.grid(row=1, column=4, padx=5, pady=5)
+        
+        # Month being shown, with buttons to step through months
+        month_frame = tk.Frame(parent, bg=self.bg_color)
+        month_frame.pack(fill=tk.X, padx=10)
+        tk.Button(month_frame, text="\u25c0", command=lambda: self.shift_budget_month(-1),
+                  font=self.button_font).pack(side=tk.LEFT)
+        self.budget_month_label = tk.Label(month_frame, text=self.budget_month, font=self.header_font,
+                                           bg=self.bg_color, fg=self.text_color, width=10)
+        self.budget_month_label.pack(side=tk.LEFT, padx=10)
+        tk.Button(month_frame, text="\u25b6", command=lambda: self.shift_budget_month(1),
+                  font=self.button_font).pack(side=tk.LEFT)
+        
+        # Budget vs actual for the month
+        list_frame = tk.Frame(parent, padx=10, pady=10)
+        list_frame.pack(expand=True, fill=tk.BOTH, padx=10, pady=10)
+        
+        columns = ("category", "budget", "spent", "remaining", "used")
+        self.budget_tree = ttk.Treeview(list_frame, columns=columns, show="headings", style="Treeview")
+        
+        # Define headings
+        self.budget_tree.heading("category", text="Category")
+        self.budget_tree.heading("budget", text="Budget")
+        self.budget_tree.heading("spent", text="Spent")
+        self.budget_tree.heading("remaining", text="Remaining")
+        self.budget_tree.heading("used", text="Used")
+        
+        # Define columns
+        self.budget_tree.column("category", width=120)
+        self.budget_tree.column("budget", width=100)
+        self.budget_tree.column("spent", width=100)
+        self.budget_tree.column("remaining", width=100)
+        self.budget_tree.column("used", width=80)
+        
+        self.budget_tree.pack(expand=True, fill=tk.BOTH)
+        
+        # Red once over budget, amber when getting close
+        self.budget_tree.tag_configure("over", background="#ffebee")
+        self.budget_tree.tag_configure("near", background="#fff8e1")
+        
+        # Remove button frame
+        delete_frame = tk.Frame(parent, bg=self.bg_color)
+        delete_frame.pack(fill=tk.X, padx=10, pady=5)
+        
+        delete_btn = tk.Button(delete_frame, text="Remove Selected Budget", command=self.delete_budget, 
+                             bg=self.delete_button_color, fg="white", font=self.button_font)
+        delete_btn.pack(side=tk.LEFT, padx=10, pady=5)
+        
+        self.show_budget_status()
+        
     def setup_charts_tab(self, parent):
         chart_frame = tk.Frame(parent, bg=self.bg_color)
         chart_frame.pack(expand=True, fill=tk.BOTH, padx=20, pady=20)
@@ -405,9 +700,15 @@ class ExpenseTrackerApp:
                                    fg="white", font=self.button_font, padx=15, pady=10)
         income_chart_btn.pack(side=tk.LEFT, padx=20)
         
+        # Trend chart button
+        trend_chart_btn = tk.Button(button_frame, text="View Monthly Trend", 
+                                  command=self.show_trend_chart, bg=self.accent_color, 
+                                  fg="white", font=self.button_font, padx=15, pady=10)
+        trend_chart_btn.pack(side=tk.LEFT, padx=20)
+        
     def add_expense(self):
         try:
-            amount = float(self.expense_amount_entry.get())
+            amount = to_cents(self.expense_amount_entry.get())
             category = self.expense_category_var.get()
             date = self.expense_date_entry.get()
             description = self.expense_description_entry.get()
@@ -416,23 +717,47 @@ class ExpenseTrackerApp:
                 messagebox.showwarning("Input Error", "Please fill in all required fields")
                 return
                 
-            self.db.add_expense(self.current_user_id, category, amount, description, date)
+        except ValueError:
+            messagebox.showerror("Error", "Amount must be a number")
+            return
             
-            # Clear fields
-            self.reset_expense_form()
+        try:
+            date = to_iso_date(date)
+        except ValueError:
+            messagebox.showerror("Error", "Date must be in YYYY-MM-DD format")
+            return
             
-            # Reload data
-            self.load_expenses()
-            self.load_transactions()
+        repeat = REPEAT_OPTIONS[self.expense_repeat_var.get()]
+        if repeat is not None:
+            self.add_recurring("expense", category, amount, repeat, date, description)
+            self.reset_expense_form()
+            return
             
+        self.run_db("add_expense", self.current_user_id, category, amount, description, date,
+                    callback=self.expense_added)
+        
+    def expense_added(self, expense):
+        # Clear fields
+        self.reset_expense_form()
+        
+        # Show the new row in place instead of reloading every list
+        self.insert_row("expenses", expense)
+        self.insert_row("history", expense.as_transaction())
+        
+        # Only the expense that crosses the limit warns, not every one after it
+        category, date = expense.category, expense.date
+        over = self.budgets.add(category, date, expense.amount) if self.budgets is not None else None
+        self.show_budget_status()
+        if over is not None:
+            messagebox.showwarning("Over Budget",
+                                   f"Expense added. {category} is now over its budget for {date[:7]}: "
+                                   f"{format_cents(over[2])} spent of {format_cents(over[1])}.")
+        else:
             messagebox.showinfo("Success", "Expense added successfully!")
             
-        except ValueError:
-            messagebox.showerror("Error", "Amount must be a number")
-            
     def add_income(self):
         try:
-            amount = float(self.income_amount_entry.get())
+            amount = to_cents(self.income_amount_entry.get())
             source = self.income_source_var.get()
             date = self.income_date_entry.get()
             
@@ -440,19 +765,34 @@ class ExpenseTrackerApp:
                 messagebox.showwarning("Input Error", "Please fill in all required fields")
                 return
                 
-            self.db.add_income(self.current_user_id, amount, source, date)
-            
-            # Clear fields
-            self.reset_income_form()
+        except ValueError:
+            messagebox.showerror("Error", "Amount must be a number")
+            return
             
-            # Reload data
-            self.load_income()
-            self.load_transactions()
+        try:
+            date = to_iso_date(date)
+        except ValueError:
+            messagebox.showerror("Error", "Date must be in YYYY-MM-DD format")
+            return
             
-            messagebox.showinfo("Success", "Income added successfully!")
+        repeat = REPEAT_OPTIONS[self.income_repeat_var.get()]
+        if repeat is not None:
+            self.add_recurring("income", source, amount, repeat, date, None)
+            self.reset_income_form()
+            return
             
-        except ValueError:
-            messagebox.showerror("Error", "Amount must be a number")
+        self.run_db("add_income", self.current_user_id, amount, source, date,
+                    callback=self.income_added)
+        
+    def income_added(self, income):
+        # Clear fields
+        self.reset_income_form()
+        
+        # Show the new row in place instead of reloading every list
+        self.insert_row("income", income)
+        self.insert_row("history", income.as_transaction())
+        
+        messagebox.showinfo("Success", "Income added successfully!")
             
     def reset_expense_form(self):
         self.expense_amount_entry.delete(0, tk.END)
@@ -460,274 +800,564 @@ class ExpenseTrackerApp:
         self.expense_date_entry.delete(0, tk.END)
         self.expense_date_entry.insert(0, datetime.datetime.now().strftime("%Y-%m-%d"))
         self.expense_category_dropdown.current(0)
+        self.expense_repeat_var.set("Never")
         
     def reset_income_form(self):
         self.income_amount_entry.delete(0, tk.END)
         self.income_date_entry.delete(0, tk.END)
         self.income_date_entry.insert(0, datetime.datetime.now().strftime("%Y-%m-%d"))
         self.income_source_dropdown.current(0)
+        self.income_repeat_var.set("Never")
+            
+    # Tabs that have not been shown yet have no pager; they load fresh
+    # data when they are built, so there is nothing to update for them
+    def insert_row(self, tab, row):
+        if tab == "history" and self.snapshot is not None:
+            self.snapshot.add(row)
+        # Search results are ranked rather than dated, so a new row only
+        # shows up in the history once the search is cleared
+        if tab == "history" and self.history_query:
+            return
+        if tab == "history" and self.snapshot_mode():
+            # Re-sorting the snapshot is cheap; only the first page is redrawn
+            self.update_history_view()
+            return
+        if tab == "history" and tab in self.pagers:
+            self.show_history_summary()
+            # Rows of the other type are filtered out of the list
+            if self.history_paging[2] not in (None, row.kind):
+                return
+        if tab in self.pagers:
+            self.pagers[tab].insert_row(row)
+            
+    def remove_rows(self, tab, iids):
+        if tab == "history" and self.snapshot is not None:
+            for kind in ("expense", "income"):
+                prefix = kind + ":"
+                self.snapshot.remove_many(kind, [int(iid[len(prefix):]) for iid in iids
+                                                 if iid.startswith(prefix)])
+        if tab == "history" and tab in self.pagers and not self.history_query:
+            self.show_history_summary()
+        if tab in self.pagers:
+            self.pagers[tab].remove_rows(iids)
+            
+    def reload(self, tab):
+        if tab in self.pagers:
+            self.pagers[tab].reset()
+            
+    def sortable_headings(self, tab, tree, kind):
+        # Only columns with a sort index (SORT_KEYS) can be clicked; a click
+        # reloads the list from the database in the new order, page by page
+        headings = {column: tree.heading(column, "text") for column in SORT_KEYS[kind]}
+        for column in headings:
+            tree.heading(column, command=lambda column=column: self.sort_list(tab, tree, headings, column))
+            
+    def sort_list(self, tab, tree, headings, column):
+        sort = self.list_sorts[tab] = self.next_sort(self.list_sorts[tab], column)
+        self.show_sort(tree, headings, sort)
+        self.pagers[tab].descending = sort[1]
+        self.reload(tab)
+        
+    def next_sort(self, sort, column):
+        # Clicking the sorted column again flips the direction; dates and
+        # amounts start with the newest and largest
+        if sort is not None and sort[0] == column:
+            return (column, not sort[1])
+        return (column, column in ("date", "amount"))
+        
+    def show_sort(self, tree, headings, sort):
+        # Show the sort direction on the sorted column's heading
+        for column, text in headings.items():
+            if sort is not None and sort[0] == column:
+                text += " \u25bc" if sort[1] else " \u25b2"
+            tree.heading(column, text=text)
             
     def load_expenses(self):
-        # Clear current items
-        for item in self.expense_tree.get_children():
-            self.expense_tree.delete(item)
-            
-        # Get expenses from database
-        expenses = self.db.get_expenses(self.current_user_id)
-        
-        # Add to treeview
-        for expense in expenses:
-            # Format amount as currency
-            formatted_amount = f"${expense[3]:.2f}"
-            values = (expense[0], expense[1], expense[2], formatted_amount, expense[4])
-            self.expense_tree.insert("", tk.END, values=values)
-            
-        # Add alternating row colors
-        for i, item in enumerate(self.expense_tree.get_children()):
-            if i % 2 == 0:
-                self.expense_tree.item(item, tags=("evenrow",))
-            else:
-                self.expense_tree.item(item, tags=("oddrow",))
-                
-        self.expense_tree.tag_configure("evenrow", background="#f0f0f0")
-        self.expense_tree.tag_configure("oddrow", background="#ffffff")
+        self.reload("expenses")
+        
+    def make_expense_item(self, expense):
+        # Records format their values the first time they are shown
+        return str(expense.id), expense.display(), ()
             
     def load_income(self):
-        # Clear current items
-        for item in self.income_tree.get_children():
-            self.income_tree.delete(item)
-            
-        # Get income from database
-        income = self.db.get_income(self.current_user_id)
-        
-        # Add to treeview
-        for inc in income:
-            # Format amount as currency
-            formatted_amount = f"${inc[1]:.2f}"
-            values = (inc[0], formatted_amount, inc[2], inc[3])
-            self.income_tree.insert("", tk.END, values=values)
-            
-        # Add alternating row colors
-        for i, item in enumerate(self.income_tree.get_children()):
-            if i % 2 == 0:
-                self.income_tree.item(item, tags=("evenrow",))
-            else:
-                self.income_tree.item(item, tags=("oddrow",))
-                
-        self.income_tree.tag_configure("evenrow", background="#f0f0f0")
-        self.income_tree.tag_configure("oddrow", background="#ffffff")
+        self.reload("income")
+        
+    def make_income_item(self, inc):
+        return str(inc.id), inc.display(), ()
             
     def load_transactions(self):
-        # Clear current items
-        for item in self.history_tree.get_children():
-            self.history_tree.delete(item)
-            
-        # Get transactions from database
-        transactions = self.db.get_transactions(self.current_user_id)
-        
-        # Add to treeview
-        for trans in transactions:
-            # Format based on transaction type
-            if trans[5] == 'expense':
-                amount = f"-${trans[3]:.2f}"
-                tag = "expense"
-                values = (trans[5].capitalize(), trans[1], trans[2], amount, trans[4])
-            else:  # income
-                amount = f"+${trans[3]:.2f}"
-                tag = "income"
-                values = (trans[5].capitalize(), trans[1], trans[2], amount, trans[4])
-                
-            item_id = self.history_tree.insert("", tk.END, values=values, tags=(tag,))
+        self.reload("history")
+        
+    def fetch_history_page(self, after, limit, callback):
+        if self.snapshot_mode():
+            # Pages come straight from the sorted snapshot, no query needed;
+            # returning no Future tells the pager the page is already there
+            callback(self.snapshot.page(self.history_order, after, limit))
+            return None
+        if self.history_query:
+            # Matches are limited to the type picked under "Show:"
+            return self.run_db("search_transactions", self.current_user_id, self.history_query,
+                               {"type": self.history_kind}, limit, after,
+                               callback=callback, tag="history")
+        return self.run_db("get_transactions_page", self.current_user_id, limit, after,
+                           *self.history_paging, callback=callback, tag="history")
+        
+    def history_cursor(self, trans):
+        # Search rows are paged by their (score, key) ranking
+        if self.history_query:
+            return (trans.score, trans.key)
+        # Snapshot rows by their position in the sorted order
+        if self.snapshot_mode():
+            return trans.position
+        return sort_key("transaction", self.history_paging[0], trans)
+        
+    def snapshot_mode(self):
+        # Only sorts without an index are served from the in-memory snapshot,
+        # once it is loaded; searches always go to the database
+        return not self.history_query and self.history_order is not None
+        
+    def sort_history(self, column):
+        self.history_sort = self.next_sort(self.history_sort, column)
+        self.update_history_view()
+        
+    def on_history_kind_changed(self, event=None):
+        self.history_kind = {"Expenses": "expense", "Income": "income"}.get(self.history_kind_var.get())
+        self.update_history_view()
+        
+    def update_history_view(self):
+        # Search results are in match order, so no heading shows a sort
+        # while searching; the sort applies again once the search is cleared
+        self.show_sort(self.history_tree, self.history_headings,
+                       None if self.history_query else self.history_sort)
+        column, descending = self.history_sort or ("date", True)
+        
+        if self.history_query:
+            self.show_history_summary()
+            self.load_transactions()
+            return
             
-        # Add color coding
-        self.history_tree.tag_configure("expense", background="#ffebee")  # Light red for expenses
-        self.history_tree.tag_configure("income", background="#e8f5e9")   # Light green for income
+        if column in SORT_KEYS["transaction"]:
+            # Indexed sorts and the type filter are paged by the database,
+            # so the first page is one index seek however long the history
+            self.history_order = None
+            self.history_paging = (column, descending, self.history_kind)
+            self.pagers["history"].descending = descending
+            self.show_history_summary()
+            self.load_transactions()
+            return
             
-    def delete_expense(self):
-        selected_item = self.expense_tree.selection()
-        if not selected_item:
-            messagebox.showwarning("Selection Error", "Please select an expense to delete")
+        if self.snapshot is None:
+            # Load the snapshot once in the background; later sorts and
+            # filters only touch memory
+            if not self.snapshot_loading:
+                self.snapshot_loading = True
+                self.history_summary.config(text="Loading...")
+                self.run_db(load_snapshot, self.current_user_id, callback=self.snapshot_loaded,
+                            errback=self.snapshot_failed)
             return
             
-        # Get the expense ID from the selected item
-        expense_id = self.expense_tree.item(selected_item, "values")[0]
+        index = self.snapshot.select(kind=self.history_kind)
+        self.history_order = self.snapshot.sort(index, column, descending)
+        self.show_history_summary()
+        self.load_transactions()
+            
+    def snapshot_loaded(self, snapshot):
+        self.snapshot_loading = False
+        if snapshot.user_id != self.current_user_id or not self.history_tree.winfo_exists():
+            return
+        self.snapshot = snapshot
+        self.update_history_view()
+        
+    def snapshot_failed(self, error):
+        self.snapshot_loading = False
+        self.show_db_error(error)
+        
+    def show_history_summary(self):
+        # The count and totals of the rows shown while sorting or filtering;
+        # search matches are ranked, not totalled
+        if self.history_query or (self.history_sort is None and self.history_kind is None):
+            self.history_summary.config(text="")
+        elif self.snapshot_mode():
+            index = self.snapshot.select(kind=self.history_kind)
+            totals = self.snapshot.totals(index)
+            self.set_history_summary(len(index), totals.get("expense", 0), totals.get("income", 0))
+        else:
+            # Read from the monthly totals rather than counting ledger rows;
+            # untagged, so a tab switch does not leave the summary stale
+            self.run_db("get_totals", self.current_user_id, callback=self.totals_loaded)
         
-        # Confirm deletion
-        confirm = messagebox.askyesno("Confirm Delete", "Are you sure you want to delete this expense?")
-        if not confirm:
+    def totals_loaded(self, totals):
+        if not self.history_tree.winfo_exists():
             return
-            
-        # Delete from database
-        self.db.delete_expense(expense_id)
+        kinds = [self.history_kind] if self.history_kind is not None else ["expense", "income"]
+        count = sum(totals[kind][0] for kind in kinds)
+        self.set_history_summary(count, *(totals[kind][1] if kind in kinds else 0
+                                          for kind in ("expense", "income")))
+        
+    def set_history_summary(self, count, expenses, income):
+        self.history_summary.config(
+            text=f"{count:,} transactions    Expenses: {format_cents(expenses)}"
+                 f"    Income: {format_cents(income)}")
+        
+    def on_search_changed(self, *args):
+        # Debounce: restart the timer on every keystroke and only search
+        # once the user pauses typing
+        if self.search_after_id is not None:
+            self.root.after_cancel(self.search_after_id)
+        self.search_after_id = self.root.after(SEARCH_DELAY_MS, self.run_search)
+        
+    def run_search(self):
+        self.search_after_id = None
+        if not self.history_tree.winfo_exists():
+            return
+        query = self.search_var.get()
+        if not query.strip():
+            query = ""
+        if query == self.history_query:
+            return
+        self.history_query = query
         
-        # Reload data
-        self.load_expenses()
-        self.load_transactions()
+        # Pages still queued for the previous query are no longer wanted
+        self.db.cancel("history")
+        self.update_history_view()
+        
+    def make_transaction_item(self, trans):
+        # The type is also a tag, which colors the row
+        return trans.iid, trans.display(), (trans.kind,)
+            
+    def import_statement(self):
+        path = filedialog.askopenfilename(
+            title="Import Statement",
+            filetypes=[("Statements", "*.csv *.ofx *.qfx *.qif"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+            
+        self.run_db(import_file, self.current_user_id, path, callback=self.import_finished,
+                    errback=lambda e: messagebox.showerror("Import Failed", str(e)))
         
-        messagebox.showinfo("Success", "Expense deleted successfully!")
+    def import_finished(self, report):
+        self.reload_all()
         
-    def delete_income(self):
-        selected_item = self.income_tree.selection()
+        if report.rejected_count:
+            messagebox.showwarning("Import Finished", str(report))
+        else:
+            messagebox.showinfo("Import Finished", str(report))
+            
+    def reload_all(self):
+        # Reload data; the snapshot is rebuilt the next time it is needed
+        self.snapshot = None
+        self.history_order = None
+        self.load_expenses()
+        self.load_income()
+        self.load_budgets()
+        if "history" in self.pagers:
+            self.update_history_view()
+            
+    def add_recurring(self, kind, label, amount, repeat, date, description):
+        # The rule is stored once; materializing adds the occurrences due so
+        # far, the first one included if it is not in the future
+        self.run_db("add_recurring", self.current_user_id, kind, label, amount, repeat, date, description)
+        self.run_db("materialize_recurring", self.current_user_id,
+                    callback=lambda count: self.recurring_added(kind, count))
+        
+    def recurring_added(self, kind, count):
+        self.reload_all()
+        messagebox.showinfo("Success", f"Recurring {kind} saved. {count} added so far.")
+        
+    def show_recurring(self):
+        self.run_db("get_recurring", self.current_user_id, callback=self.show_recurring_window)
+        
+    def show_recurring_window(self, rules):
+        window = tk.Toplevel(self.root)
+        window.title("Recurring Transactions")
+        window.configure(bg=self.bg_color)
+        
+        columns = ("type", "label", "amount", "repeats", "start", "last")
+        tree = ttk.Treeview(window, columns=columns, show="headings", style="Treeview")
+        for column, text, width in (("type", "Type", 80), ("label", "Category/Source", 120),
+                                    ("amount", "Amount", 90), ("repeats", "Repeats", 160),
+                                    ("start", "Starts", 90), ("last", "Last Added", 90)):
+            tree.heading(column, text=text)
+            tree.column(column, width=width)
+        for rule_id, kind, label, amount, description, rule, start, last in rules:
+            values = (kind.capitalize(), label, format_cents(amount), Rule.parse(rule).describe(), start, last or "")
+            tree.insert("", tk.END, iid=str(rule_id), values=values, tags=(kind,))
+        tree.tag_configure("expense", background="#ffebee")
+        tree.tag_configure("income", background="#e8f5e9")
+        tree.pack(expand=True, fill=tk.BOTH, padx=10, pady=10)
+        
+        # Stopping a rule keeps the transactions it already added
+        stop_btn = tk.Button(window, text="Stop Selected", bg=self.delete_button_color, fg="white",
+                             font=self.button_font, command=lambda: self.stop_recurring(tree))
+        stop_btn.pack(side=tk.LEFT, padx=10, pady=(0, 10))
+        
+    def stop_recurring(self, tree):
+        selected_item = tree.selection()
         if not selected_item:
-            messagebox.showwarning("Selection Error", "Please select an income entry to delete")
+            messagebox.showwarning("Selection Error", "Please select a recurring transaction to stop")
+            return
+            
+        rule_id = selected_item[0]
+        self.run_db("delete_recurring", int(rule_id), self.current_user_id,
+                    callback=lambda deleted: tree.delete(rule_id) if tree.winfo_exists() else None)
+        
+    def export_history(self):
+        path = filedialog.asksaveasfilename(
+            title="Export Transactions", defaultextension=".csv",
+            filetypes=[("CSV", "*.csv"), ("JSON Lines", "*.jsonl"), ("Parquet", "*.parquet")]
+        )
+        if not path:
+            return
+            
+        # The worker thread only stores the row count; the Tk thread reads it
+        self.export_rows = 0
+        def progress(count):
+            self.export_rows = count
+            
+        self.export_btn.config(state=tk.DISABLED)
+        self.run_db(export_file, self.current_user_id, path, None, None, None, progress,
+                    callback=lambda count: self.export_finished(f"Exported {count:,} transactions to {path}"),
+                    errback=lambda e: self.export_finished(None, e))
+        self.show_export_progress()
+        
+    def show_export_progress(self):
+        if not self.export_btn.winfo_exists() or self.export_btn["state"] != tk.DISABLED:
             return
+        self.export_btn.config(text=f"Exporting... {self.export_rows:,}")
+        self.root.after(250, self.show_export_progress)
+        
+    def export_finished(self, message, error=None):
+        if self.export_btn.winfo_exists():
+            self.export_btn.config(text="Export...", state=tk.NORMAL)
+        if error is not None:
+            messagebox.showerror("Export Failed", str(error))
+        else:
+            messagebox.showinfo("Export Finished", message)
             
-        # Get the income ID from the selected item
-        income_id = self.income_tree.item(selected_item, "values")[0]
+    def delete_expense(self):
+        self.delete_selected("expense", self.expense_tree)
         
+    def delete_income(self):
+        self.delete_selected("income", self.income_tree)
+        
+    def selected_rows(self, kind, tree, action):
+        # Item ids of the expense and income lists are the row ids
+        selected = tree.selection()
+        if not selected:
+            messagebox.showwarning("Selection Error", f"Please select the {KIND_NOUNS[kind][1]} to {action}")
+        return selected
+        
+    def count_of(self, kind, count):
+        singular, plural = KIND_NOUNS[kind]
+        return f"this {singular}" if count == 1 else f"these {count:,} {plural}"
+        
+    def delete_selected(self, kind, tree):
+        selected = self.selected_rows(kind, tree, "delete")
+        if not selected:
+            return
+            
         # Confirm deletion
-        confirm = messagebox.askyesno("Confirm Delete", "Are you sure you want to delete this income entry?")
+        confirm = messagebox.askyesno("Confirm Delete",
+                                      f"Are you sure you want to delete {self.count_of(kind, len(selected))}?")
         if not confirm:
             return
             
-        # Delete from database
-        self.db.delete_income(income_id)
+        # One statement and one commit for the whole selection, only ever
+        # touching the current user's rows
+        self.run_db("delete_many", kind, self.current_user_id, selected,
+                    callback=lambda rows: self.rows_deleted(kind, rows))
+        
+    def rows_deleted(self, kind, rows):
+        # Remove just these rows from the lists, restriping each list once
+        self.remove_rows("expenses" if kind == "expense" else "income", [str(row.id) for row in rows])
+        self.remove_rows("history", [f"{kind}:{row.id}" for row in rows])
+        if kind == "expense" and self.budgets is not None:
+            for row in rows:
+                self.budgets.remove(row.category, row.date, row.amount)
+            self.show_budget_status()
+            
+        singular, plural = KIND_NOUNS[kind]
+        noun = singular.capitalize() if len(rows) == 1 else f"{len(rows):,} {plural}"
+        messagebox.showinfo("Success", f"{noun} deleted successfully!")
         
-        # Reload data
-        self.load_income()
-        self.load_transactions()
+    def recategorize_selected(self, kind, tree):
+        selected = self.selected_rows(kind, tree, "change")
+        if not selected:
+            return
+        field, choices = ("category", EXPENSE_CATEGORIES) if kind == "expense" else ("source", INCOME_SOURCES)
+        label = self.ask_value(f"Change {field.capitalize()}",
+                               f"New {field} for {self.count_of(kind, len(selected))}:", choices)
+        if not label:
+            return
+        self.run_db("recategorize_many", kind, self.current_user_id, selected, label,
+                    callback=lambda count: self.rows_edited(kind, count))
+        
+    def redate_selected(self, kind, tree):
+        selected = self.selected_rows(kind, tree, "change")
+        if not selected:
+            return
+        date = self.ask_value("Change Date", f"New date for {self.count_of(kind, len(selected))}:",
+                              initial=datetime.datetime.now().strftime("%Y-%m-%d"))
+        if not date:
+            return
+        try:
+            date = to_iso_date(date)
+        except ValueError:
+            messagebox.showerror("Error", "Date must be in YYYY-MM-DD format")
+            return
+        self.run_db("redate_many", kind, self.current_user_id, selected, date,
+                    callback=lambda count: self.rows_edited(kind, count))
+        
+    def rows_edited(self, kind, count):
+        # Edited rows can move in every list and change the budget totals,
+        # so everything is refreshed once
+        self.reload_all()
+        singular, plural = KIND_NOUNS[kind]
+        noun = singular.capitalize() if count == 1 else f"{count:,} {plural}"
+        messagebox.showinfo("Success", f"{noun} updated successfully!")
+        
+    def ask_value(self, title, prompt, choices=(), initial=""):
+        """Ask for one value in a small modal window; returns None if cancelled"""
+        window = tk.Toplevel(self.root)
+        window.title(title)
+        window.configure(bg=self.bg_color, padx=15, pady=15)
+        window.transient(self.root)
+        result = []
+        
+        tk.Label(window, text=prompt, font=self.label_font, bg=self.bg_color,
+                 fg=self.text_color).grid(row=0, column=0, columnspan=2, sticky="w", pady=(0, 5))
+        var = tk.StringVar(value=initial or (choices[0] if choices else ""))
+        entry = ttk.Combobox(window, textvariable=var, values=list(choices), width=20, font=self.label_font)
+        entry.grid(row=1, column=0, columnspan=2, sticky="we", pady=5)
+        entry.focus_set()
+        
+        def submit(event=None):
+            result.append(var.get().strip())
+            window.destroy()
+            
+        tk.Button(window, text="OK", command=submit, bg=self.button_color, fg="white",
+                  font=self.button_font, width=8).grid(row=2, column=0, pady=(10, 0))
+        tk.Button(window, text="Cancel", command=window.destroy, font=self.button_font,
+                  width=8).grid(row=2, column=1, pady=(10, 0))
+        window.bind("<Return>", submit)
+        window.bind("<Escape>", lambda event: window.destroy())
+        
+        window.grab_set()
+        self.root.wait_window(window)
+        return result[0] if result else None
+        
+    def load_budgets(self):
+        # Read once per login or import; after that the engine keeps its
+        # totals up to date as expenses are added and deleted
+        self.run_db(BudgetEngine.load, self.current_user_id, callback=self.budgets_loaded)
+        
+    def budgets_loaded(self, budgets):
+        if budgets.user_id != self.current_user_id:
+            return
+        self.budgets = budgets
+        self.show_budget_status()
         
-        messagebox.showinfo("Success", "Income deleted successfully!")
+    def show_budget_status(self):
+        if "budgets" not in self.built_tabs or self.budgets is None:
+            return
+        self.budget_tree.delete(*self.budget_tree.get_children())
+        for category, budget, spent in self.budgets.budget_status(self.budget_month):
+            if spent > budget:
+                tags = ("over",)
+            elif spent >= budget * BUDGET_WARNING_SHARE:
+                tags = ("near",)
+            else:
+                tags = ()
+            used = f"{spent * 100 // budget}%" if budget else "-"
+            values = (category, format_cents(budget), format_cents(spent), format_cents(budget - spent), used)
+            self.budget_tree.insert("", tk.END, iid=category, values=values, tags=tags)
+            
+    def shift_budget_month(self, step):
+        year, month = map(int, self.budget_month.split("-"))
+        index = year * 12 + month - 1 + step
+        self.budget_month = f"{index // 12:04d}-{index % 12 + 1:02d}"
+        self.budget_month_label.config(text=self.budget_month)
+        self.show_budget_status()
+        
+    def set_budget(self):
+        category = self.budget_category_var.get()
+        try:
+            amount = to_cents(self.budget_amount_entry.get())
+        except ValueError:
+            messagebox.showerror("Error", "Budget must be a number")
+            return
+            
+        if not category or amount < 0:
+            messagebox.showwarning("Input Error", "Please choose a category and a budget of at least $0")
+            return
+            
+        self.run_db("set_budget", self.current_user_id, category, amount,
+                    callback=lambda result: self.budget_changed(category, amount))
+        
+    def delete_budget(self):
+        selected_item = self.budget_tree.selection()
+        if not selected_item:
+            messagebox.showwarning("Selection Error", "Please select a budget to remove")
+            return
+            
+        category = selected_item[0]
+        self.run_db("delete_budget", self.current_user_id, category,
+                    callback=lambda deleted: self.budget_changed(category, None))
+        
+    def budget_changed(self, category, amount):
+        if self.budgets is not None:
+            if amount is None:
+                self.budgets.delete_budget(category)
+            else:
+                self.budgets.set_budget(category, amount)
+        self.budget_amount_entry.delete(0, tk.END)
+        self.show_budget_status()
         
     def show_expense_chart(self):
-        # Get expense by category data
-        expense_data = self.db.get_expense_by_category(self.current_user_id)
-        
-        if not expense_data:
-            messagebox.showinfo("No Data", "No expense data to display")
-            return
-            
-        # Create a new top-level window
-        chart_window = tk.Toplevel(self.root)
-        chart_window.title("Expense Breakdown by Category")
-        chart_window.geometry("800x600")
-        chart_window.configure(bg=self.bg_color)
-        
-        # Header
-        tk.Label(chart_window, text="Expense Breakdown by Category", 
-                font=("Arial", 16, "bold"), bg=self.bg_color).pack(pady=10)
-        
-        # Create figure and axes
-        fig = plt.Figure(figsize=(10, 8), dpi=100)
-        
-        # Add subplots for pie chart and bar chart
-        pie_ax = fig.add_subplot(121)  # 1 row, 2 cols, 1st plot
-        bar_ax = fig.add_subplot(122)  # 1 row, 2 cols, 2nd plot
-        
-        # Extract categories and amounts
-        categories = [item[0] for item in expense_data]
-        amounts = [item[1] for item in expense_data]
-        
-        # Create pie chart
-        wedges, texts, autotexts = pie_ax.pie(amounts, autopct='%1.1f%%', startangle=90, 
-                                           explode=[0.05] * len(categories),
-                                           shadow=True, radius=1.1)
-        
-        # Style pie chart
-        plt.setp(autotexts, size=9, weight="bold")
-        pie_ax.set_title("Expense Breakdown (Pie Chart)")
-        pie_ax.legend(wedges, categories, title="Categories", loc="center left", bbox_to_anchor=(0.9, 0, 0.5, 1))
-        
-        # Create bar chart
-        bars = bar_ax.bar(categories, amounts, color='skyblue', width=0.6, edgecolor='grey')
-        
-        # Style bar chart
-        bar_ax.set_title("Expense Breakdown (Bar Chart)")
-        bar_ax.set_xlabel("Category")
-        bar_ax.set_ylabel("Amount ($)")
-        bar_ax.tick_params(axis='x', rotation=45)
-        
-        # Add values on top of bars
-        for bar in bars:
-            height = bar.get_height()
-            bar_ax.annotate(f'${height:.2f}',
-                          xy=(bar.get_x() + bar.get_width() / 2, height),
-                          xytext=(0, 3),  # 3 points vertical offset
-                          textcoords="offset points",
-                          ha='center', va='bottom', rotation=0)
-        
-        # Adjust layout
-        fig.tight_layout()
-        
-        # Create canvas
-        canvas = FigureCanvasTkAgg(fig, master=chart_window)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
-        
-        # Close button
-        close_btn = tk.Button(chart_window, text="Close", command=chart_window.destroy, 
-                            bg=self.accent_color, fg="white", font=self.button_font)
-        close_btn.pack(pady=10)
+        self.show_chart("expense")
         
     def show_income_chart(self):
-        # Get income by source data
-        income_data = self.db.get_income_by_source(self.current_user_id)
-        
-        if not income_data:
-            messagebox.showinfo("No Data", "No income data to display")
-            return
-            
-        # Create a new top-level window
-        chart_window = tk.Toplevel(self.root)
-        chart_window.title("Income Breakdown by Source")
-        chart_window.geometry("800x600")
-        chart_window.configure(bg=self.bg_color)
-        
-        # Header
-        tk.Label(chart_window, text="Income Breakdown by Source", 
-                font=("Arial", 16, "bold"), bg=self.bg_color).pack(pady=10)
-        
-        # Create figure and axes
-        fig = plt.Figure(figsize=(10, 8), dpi=100)
-        
-        # Add subplots for pie chart and histogram
-        pie_ax = fig.add_subplot(121)  # 1 row, 2 cols, 1st plot
-        hist_ax = fig.add_subplot(122)  # 1 row, 2 cols, 2nd plot
-        
-        # Extract sources and amounts
-        sources = [item[0] for item in income_data]
-        amounts = [item[1] for item in income_data]
-        
-        # Create pie chart
-        wedges, texts, autotexts = pie_ax.pie(amounts, autopct='%1.1f%%', startangle=90,
-                                           explode=[0.05] * len(sources),
-                                           shadow=True, radius=1.1)
-        
-        # Style pie chart
-        plt.setp(autotexts, size=9, weight="bold")
-        pie_ax.set_title("Income by Source (Pie Chart)")
-        pie_ax.legend(wedges, sources, title="Sources", loc="center left", bbox_to_anchor=(0.9, 0, 0.5, 1))
-        
-        # Create histogram
-        bars = hist_ax.bar(sources, amounts, color='lightgreen', width=0.6, edgecolor='grey')
-        
-        # Style histogram
-        hist_ax.set_title("Income by Source (Histogram)")
-        hist_ax.set_xlabel("Source")
-        hist_ax.set_ylabel("Amount ($)")
-        hist_ax.tick_params(axis='x', rotation=45)
-        
-        # Add values on top of bars
-        for bar in bars:
-            height = bar.get_height()
-            hist_ax.annotate(f'${height:.2f}',
-                           xy=(bar.get_x() + bar.get_width() / 2, height),
-                           xytext=(0, 3),  # 3 points vertical offset
-                           textcoords="offset points",
-                           ha='center', va='bottom', rotation=0)
-        
-        # Adjust layout
-        fig.tight_layout()
-        
-        # Create canvas
-        canvas = FigureCanvasTkAgg(fig, master=chart_window)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
-        
-        # Close button
-        close_btn = tk.Button(chart_window, text="Close", command=chart_window.destroy, 
-                            bg=self.accent_color, fg="white", font=self.button_font)
-        close_btn.pack(pady=10)
+        self.show_chart("income")
+        
+    def show_trend_chart(self):
+        self.show_chart("trend")
+        
+    def show_chart(self, kind):
+        # The cache only re-queries when the data changed since the last fetch
+        self.run_db(self.chart_cache.fetch, self.current_user_id, kind,
+                    callback=lambda entry: self.render_chart(kind, entry), tag="charts")
+        
+    def render_chart(self, kind, entry):
+        version, rows = entry
+        if not rows:
+            messagebox.showinfo("No Data", f"No {kind} data to display")
+            return
+            
+        # Reuse the open window for this chart instead of stacking new ones
+        key = (self.current_user_id, kind)
+        window = self.chart_windows.get(key)
+        if window is not None and window.exists():
+            window.refresh(version, rows)
+            return
+            
+        self.chart_windows[key] = ChartWindow(self.root, kind, version, rows,
+                                              self.bg_color, self.accent_color, self.button_font,
+                                              on_save=lambda: self.save_chart(kind))
+        
+    def save_chart(self, kind):
+        path = filedialog.asksaveasfilename(title="Save Chart", defaultextension=".png",
+                                            filetypes=[("PNG image", "*.png")])
+        if not path:
+            return
+            
+        self.run_db(self.chart_cache.export_png, self.current_user_id, kind, path,
+                    callback=lambda result: messagebox.showinfo("Success", f"Chart saved to {path}"))
+
+def load_snapshot(db, user_id):
+    # NumPy is only imported once a view actually needs the snapshot
+    from snapshot import TransactionSnapshot
+    return TransactionSnapshot.load(db, user_id)
 
 if __name__ == "__main__":
     root = tk.Tk()
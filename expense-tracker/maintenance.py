@@ -0,0 +1,69 @@
+"""Maintenance commands for an expense tracker database.
+
+Usage: python maintenance.py [--db PATH] COMMAND
+
+Commands:
+    check-aggregates     compare the summary tables and ledger with the transactions
+    rebuild-aggregates   recompute the summary tables and ledger from scratch
+    rebuild-search       re-index all transactions for full-text search
+    add-recurring        add the recurring transactions due by today, e.g. from cron
+"""
+import argparse
+import sys
+
+from database import Database
+
+
+def check_aggregates(db):
+    mismatches = db.check_aggregates()
+    for kind, user_id, label, period in mismatches:
+        print(f"{kind} summary out of date: user {user_id}, {label or '(none)'}, {period}")
+    if mismatches:
+        print(f"{len(mismatches)} mismatched groups; run rebuild-aggregates to fix them")
+        return 1
+    print("Summary tables are consistent")
+    return 0
+
+
+def rebuild_aggregates(db):
+    db.rebuild_aggregates()
+    print("Summary tables rebuilt")
+    return 0
+
+
+def rebuild_search(db):
+    db.rebuild_search_index()
+    print("Search index rebuilt")
+    return 0
+
+
+def add_recurring(db):
+    added = db.materialize_recurring()
+    print(f"Added {added} recurring transactions")
+    return 0
+
+
+COMMANDS = {
+    "check-aggregates": check_aggregates,
+    "rebuild-aggregates": rebuild_aggregates,
+    "rebuild-search": rebuild_search,
+    "add-recurring": add_recurring,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__.splitlines()[0],
+        epilog=__doc__.split("Commands:")[1],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--db", default="expense_tracker.db", help="database file")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    args = parser.parse_args(argv)
+
+    with Database(args.db) as db:
+        return COMMANDS[args.command](db)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
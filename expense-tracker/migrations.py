@@ -0,0 +1,670 @@
+import sqlite3
+
+from connection import check_sqlite_version
+from dates import to_iso_date
+from money import to_cents
+
+
+# Each migration is a (version, description, function) entry. Versions must be
+# strictly increasing and a migration must never be edited once it has shipped;
+# schema changes always go into a new entry at the end of the list.
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """Register a function as the schema migration for the given version"""
+    def register(func):
+        if MIGRATIONS and MIGRATIONS[-1][0] >= version:
+            raise ValueError(f"Migration {version} registered out of order")
+        MIGRATIONS.append((version, description, func))
+        return func
+    return register
+
+
+@migration(1, "Create users, expenses and income tables")
+def create_base_tables(cursor):
+    # Create User table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY,
+        username TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL
+    )
+    ''')
+
+    # Create Expenses table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS expenses (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        category TEXT NOT NULL,
+        date TEXT NOT NULL,
+        amount REAL NOT NULL,
+        description TEXT,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    ''')
+
+    # Create Income table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS income (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        amount REAL NOT NULL,
+        date TEXT NOT NULL,
+        source TEXT,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    ''')
+
+
+@migration(2, "Add per-user date and category indexes")
+def add_user_indexes(cursor):
+    # Lists are read newest first. SQLite walks these indexes backwards for
+    # ORDER BY date DESC, and the implicit trailing rowid makes that a stable
+    # (date DESC, id DESC) order without a separate sort step.
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_expenses_user_date ON expenses (user_id, date)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_income_user_date ON income (user_id, date)"
+    )
+
+    # Covering indexes for the chart aggregations, which only need the
+    # grouping column and the amount
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_expenses_user_category ON expenses (user_id, category, amount)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_income_user_source ON income (user_id, source, amount)"
+    )
+    cursor.execute("ANALYZE")
+
+
+# Per-month totals kept up to date by triggers, so charts read a handful of
+# summary rows instead of aggregating a user's whole history. Income rows with
+# no source are counted under '' because NULLs never match in a primary key.
+TOTALS_TABLES = (
+    '''
+    CREATE TABLE IF NOT EXISTS expense_totals (
+        user_id INTEGER NOT NULL,
+        category TEXT NOT NULL,
+        month TEXT NOT NULL,
+        total REAL NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (user_id, category, month)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS income_totals (
+        user_id INTEGER NOT NULL,
+        source TEXT NOT NULL,
+        month TEXT NOT NULL,
+        total REAL NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (user_id, source, month)
+    ) WITHOUT ROWID
+    ''',
+)
+
+_ADD_EXPENSE_TOTAL = '''
+        INSERT INTO expense_totals (user_id, category, month, total, count)
+        VALUES (NEW.user_id, NEW.category, substr(NEW.date, 1, 7), NEW.amount, 1)
+        ON CONFLICT (user_id, category, month)
+        DO UPDATE SET total = total + excluded.total, count = count + 1;
+'''
+_REMOVE_EXPENSE_TOTAL = '''
+        UPDATE expense_totals SET total = total - OLD.amount, count = count - 1
+        WHERE user_id = OLD.user_id AND category = OLD.category AND month = substr(OLD.date, 1, 7);
+        DELETE FROM expense_totals
+        WHERE user_id = OLD.user_id AND category = OLD.category AND month = substr(OLD.date, 1, 7)
+        AND count = 0;
+'''
+_ADD_INCOME_TOTAL = '''
+        INSERT INTO income_totals (user_id, source, month, total, count)
+        VALUES (NEW.user_id, IFNULL(NEW.source, ''), substr(NEW.date, 1, 7), NEW.amount, 1)
+        ON CONFLICT (user_id, source, month)
+        DO UPDATE SET total = total + excluded.total, count = count + 1;
+'''
+_REMOVE_INCOME_TOTAL = '''
+        UPDATE income_totals SET total = total - OLD.amount, count = count - 1
+        WHERE user_id = OLD.user_id AND source = IFNULL(OLD.source, '') AND month = substr(OLD.date, 1, 7);
+        DELETE FROM income_totals
+        WHERE user_id = OLD.user_id AND source = IFNULL(OLD.source, '') AND month = substr(OLD.date, 1, 7)
+        AND count = 0;
+'''
+
+TOTALS_TRIGGERS = (
+    "CREATE TRIGGER IF NOT EXISTS expenses_totals_insert AFTER INSERT ON expenses BEGIN"
+    + _ADD_EXPENSE_TOTAL + "END",
+    "CREATE TRIGGER IF NOT EXISTS expenses_totals_delete AFTER DELETE ON expenses BEGIN"
+    + _REMOVE_EXPENSE_TOTAL + "END",
+    "CREATE TRIGGER IF NOT EXISTS expenses_totals_update"
+    " AFTER UPDATE OF user_id, category, date, amount ON expenses BEGIN"
+    + _REMOVE_EXPENSE_TOTAL + _ADD_EXPENSE_TOTAL + "END",
+    "CREATE TRIGGER IF NOT EXISTS income_totals_insert AFTER INSERT ON income BEGIN"
+    + _ADD_INCOME_TOTAL + "END",
+    "CREATE TRIGGER IF NOT EXISTS income_totals_delete AFTER DELETE ON income BEGIN"
+    + _REMOVE_INCOME_TOTAL + "END",
+    "CREATE TRIGGER IF NOT EXISTS income_totals_update"
+    " AFTER UPDATE OF user_id, amount, date, source ON income BEGIN"
+    + _REMOVE_INCOME_TOTAL + _ADD_INCOME_TOTAL + "END",
+)
+
+REBUILD_TOTALS = (
+    "DELETE FROM expense_totals",
+    "INSERT INTO expense_totals (user_id, category, month, total, count)"
+    " SELECT user_id, category, substr(date, 1, 7), SUM(amount), COUNT(*)"
+    " FROM expenses GROUP BY 1, 2, 3",
+    "DELETE FROM income_totals",
+    "INSERT INTO income_totals (user_id, source, month, total, count)"
+    " SELECT user_id, IFNULL(source, ''), substr(date, 1, 7), SUM(amount), COUNT(*)"
+    " FROM income GROUP BY 1, 2, 3",
+)
+
+
+@migration(3, "Add trigger-maintained per-month category and source totals")
+def add_totals_tables(cursor):
+    for sql in TOTALS_TABLES + TOTALS_TRIGGERS + REBUILD_TOTALS:
+        cursor.execute(sql)
+
+
+@migration(4, "Store amounts as integer cents")
+def convert_amounts_to_cents(cursor):
+    # REAL columns would turn integers back into floats, so both tables are
+    # rebuilt with INTEGER amounts. The conversion runs in Python so that
+    # e.g. 0.285 rounds to 29 cents from its decimal repr, not its binary value.
+    cursor.connection.create_function("to_cents", 1, to_cents, deterministic=True)
+
+    cursor.execute('''
+    CREATE TABLE expenses_new (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        category TEXT NOT NULL,
+        date TEXT NOT NULL,
+        amount INTEGER NOT NULL,
+        description TEXT,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    ''')
+    cursor.execute(
+        "INSERT INTO expenses_new (id, user_id, category, date, amount, description)"
+        " SELECT id, user_id, category, date, to_cents(amount), description FROM expenses"
+    )
+    cursor.execute("DROP TABLE expenses")
+    cursor.execute("ALTER TABLE expenses_new RENAME TO expenses")
+
+    cursor.execute('''
+    CREATE TABLE income_new (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        amount INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        source TEXT,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    ''')
+    cursor.execute(
+        "INSERT INTO income_new (id, user_id, amount, date, source)"
+        " SELECT id, user_id, to_cents(amount), date, source FROM income"
+    )
+    cursor.execute("DROP TABLE income")
+    cursor.execute("ALTER TABLE income_new RENAME TO income")
+
+    # Dropping the tables dropped their indexes and triggers as well
+    add_user_indexes(cursor)
+    for sql in TOTALS_TRIGGERS:
+        cursor.execute(sql)
+
+    # Totals are sums of cents now, so they get INTEGER columns too
+    cursor.execute("DROP TABLE expense_totals")
+    cursor.execute("DROP TABLE income_totals")
+    cursor.execute('''
+    CREATE TABLE expense_totals (
+        user_id INTEGER NOT NULL,
+        category TEXT NOT NULL,
+        month TEXT NOT NULL,
+        total INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (user_id, category, month)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+    CREATE TABLE income_totals (
+        user_id INTEGER NOT NULL,
+        source TEXT NOT NULL,
+        month TEXT NOT NULL,
+        total INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (user_id, source, month)
+    ) WITHOUT ROWID
+    ''')
+    for sql in REBUILD_TOTALS:
+        cursor.execute(sql)
+
+
+# Per-day totals for the time-series rollups. Keyed by date before category so
+# a date range is a single range scan of the primary key; weekly and monthly
+# series are grouped from these rows instead of from every transaction.
+DAILY_TOTALS_TABLES = (
+    '''
+    CREATE TABLE IF NOT EXISTS expense_daily_totals (
+        user_id INTEGER NOT NULL,
+        day TEXT NOT NULL,
+        category TEXT NOT NULL,
+        total INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (user_id, day, category)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS income_daily_totals (
+        user_id INTEGER NOT NULL,
+        day TEXT NOT NULL,
+        source TEXT NOT NULL,
+        total INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (user_id, day, source)
+    ) WITHOUT ROWID
+    ''',
+)
+
+_ADD_EXPENSE_DAILY_TOTAL = '''
+        INSERT INTO expense_daily_totals (user_id, day, category, total, count)
+        VALUES (NEW.user_id, NEW.date, NEW.category, NEW.amount, 1)
+        ON CONFLICT (user_id, day, category)
+        DO UPDATE SET total = total + excluded.total, count = count + 1;
+'''
+_REMOVE_EXPENSE_DAILY_TOTAL = '''
+        UPDATE expense_daily_totals SET total = total - OLD.amount, count = count - 1
+        WHERE user_id = OLD.user_id AND day = OLD.date AND category = OLD.category;
+        DELETE FROM expense_daily_totals
+        WHERE user_id = OLD.user_id AND day = OLD.date AND category = OLD.category
+        AND count = 0;
+'''
+_ADD_INCOME_DAILY_TOTAL = '''
+        INSERT INTO income_daily_totals (user_id, day, source, total, count)
+        VALUES (NEW.user_id, NEW.date, IFNULL(NEW.source, ''), NEW.amount, 1)
+        ON CONFLICT (user_id, day, source)
+        DO UPDATE SET total = total + excluded.total, count = count + 1;
+'''
+_REMOVE_INCOME_DAILY_TOTAL = '''
+        UPDATE income_daily_totals SET total = total - OLD.amount, count = count - 1
+        WHERE user_id = OLD.user_id AND day = OLD.date AND source = IFNULL(OLD.source, '');
+        DELETE FROM income_daily_totals
+        WHERE user_id = OLD.user_id AND day = OLD.date AND source = IFNULL(OLD.source, '')
+        AND count = 0;
+'''
+
+DAILY_TOTALS_TRIGGERS = (
+    "CREATE TRIGGER IF NOT EXISTS expenses_daily_totals_insert AFTER INSERT ON expenses BEGIN"
+    + _ADD_EXPENSE_DAILY_TOTAL + "END",
+    "CREATE TRIGGER IF NOT EXISTS expenses_daily_totals_delete AFTER DELETE ON expenses BEGIN"
+    + _REMOVE_EXPENSE_DAILY_TOTAL + "END",
+    "CREATE TRIGGER IF NOT EXISTS expenses_daily_totals_update"
+    " AFTER UPDATE OF user_id, category, date, amount ON expenses BEGIN"
+    + _REMOVE_EXPENSE_DAILY_TOTAL + _ADD_EXPENSE_DAILY_TOTAL + "END",
+    "CREATE TRIGGER IF NOT EXISTS income_daily_totals_insert AFTER INSERT ON income BEGIN"
+    + _ADD_INCOME_DAILY_TOTAL + "END",
+    "CREATE TRIGGER IF NOT EXISTS income_daily_totals_delete AFTER DELETE ON income BEGIN"
+    + _REMOVE_INCOME_DAILY_TOTAL + "END",
+    "CREATE TRIGGER IF NOT EXISTS income_daily_totals_update"
+    " AFTER UPDATE OF user_id, amount, date, source ON income BEGIN"
+    + _REMOVE_INCOME_DAILY_TOTAL + _ADD_INCOME_DAILY_TOTAL + "END",
+)
+
+REBUILD_DAILY_TOTALS = (
+    "DELETE FROM expense_daily_totals",
+    "INSERT INTO expense_daily_totals (user_id, day, category, total, count)"
+    " SELECT user_id, date, category, SUM(amount), COUNT(*)"
+    " FROM expenses GROUP BY 1, 2, 3",
+    "DELETE FROM income_daily_totals",
+    "INSERT INTO income_daily_totals (user_id, day, source, total, count)"
+    " SELECT user_id, date, IFNULL(source, ''), SUM(amount), COUNT(*)"
+    " FROM income GROUP BY 1, 2, 3",
+)
+
+
+@migration(5, "Add trigger-maintained per-day totals for time-series rollups")
+def add_daily_totals_tables(cursor):
+    for sql in DAILY_TOTALS_TABLES + DAILY_TOTALS_TRIGGERS + REBUILD_DAILY_TOTALS:
+        cursor.execute(sql)
+
+
+# Full-text index over expense categories and descriptions and income sources.
+# Expense and income ids overlap, so the index rowid is id * 2 for expenses and
+# id * 2 + 1 for income. The table is contentless: it stores only the index,
+# and the base tables stay the one copy of the text.
+SEARCH_TABLE = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(
+        label, description,
+        content='',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+'''
+
+# A contentless table cannot look up what it indexed, so deletes have to pass
+# the exact values that were inserted
+_INDEX_EXPENSE = '''
+        INSERT INTO transactions_fts (rowid, label, description)
+        VALUES (NEW.id * 2, NEW.category, NEW.description);
+'''
+_UNINDEX_EXPENSE = '''
+        INSERT INTO transactions_fts (transactions_fts, rowid, label, description)
+        VALUES ('delete', OLD.id * 2, OLD.category, OLD.description);
+'''
+_INDEX_INCOME = '''
+        INSERT INTO transactions_fts (rowid, label)
+        VALUES (NEW.id * 2 + 1, NEW.source);
+'''
+_UNINDEX_INCOME = '''
+        INSERT INTO transactions_fts (transactions_fts, rowid, label)
+        VALUES ('delete', OLD.id * 2 + 1, OLD.source);
+'''
+
+SEARCH_TRIGGERS = (
+    "CREATE TRIGGER IF NOT EXISTS expenses_search_insert AFTER INSERT ON expenses BEGIN"
+    + _INDEX_EXPENSE + "END",
+    "CREATE TRIGGER IF NOT EXISTS expenses_search_delete AFTER DELETE ON expenses BEGIN"
+    + _UNINDEX_EXPENSE + "END",
+    "CREATE TRIGGER IF NOT EXISTS expenses_search_update"
+    " AFTER UPDATE OF category, description ON expenses BEGIN"
+    + _UNINDEX_EXPENSE + _INDEX_EXPENSE + "END",
+    "CREATE TRIGGER IF NOT EXISTS income_search_insert AFTER INSERT ON income BEGIN"
+    + _INDEX_INCOME + "END",
+    "CREATE TRIGGER IF NOT EXISTS income_search_delete AFTER DELETE ON income BEGIN"
+    + _UNINDEX_INCOME + "END",
+    "CREATE TRIGGER IF NOT EXISTS income_search_update"
+    " AFTER UPDATE OF source ON income BEGIN"
+    + _UNINDEX_INCOME + _INDEX_INCOME + "END",
+)
+
+REBUILD_SEARCH = (
+    "INSERT INTO transactions_fts (transactions_fts) VALUES ('delete-all')",
+    "INSERT INTO transactions_fts (rowid, label, description)"
+    " SELECT id * 2, category, description FROM expenses",
+    "INSERT INTO transactions_fts (rowid, label)"
+    " SELECT id * 2 + 1, source FROM income",
+    "INSERT INTO transactions_fts (transactions_fts) VALUES ('optimize')",
+)
+
+
+@migration(6, "Add full-text search over transactions")
+def add_search_index(cursor):
+    cursor.execute(SEARCH_TABLE)
+    for sql in SEARCH_TRIGGERS + REBUILD_SEARCH:
+        cursor.execute(sql)
+
+
+# One row per expense and income, so the history is read in date order
+# straight from an index instead of merging and sorting both tables. The id
+# is the search index rowid, id * 2 for expenses and id * 2 + 1 for income,
+# which is unique across both tables without a lookup. Amounts are signed:
+# negative for expenses, positive for income.
+LEDGER_TABLE = '''
+    CREATE TABLE IF NOT EXISTS ledger (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        type TEXT NOT NULL,
+        label TEXT,
+        amount INTEGER NOT NULL,
+        description TEXT
+    )
+'''
+
+LEDGER_INDEX = "CREATE INDEX IF NOT EXISTS idx_ledger_user_date ON ledger (user_id, date, id)"
+
+_ADD_EXPENSE_ENTRY = '''
+        INSERT INTO ledger (id, user_id, date, type, label, amount, description)
+        VALUES (NEW.id * 2, NEW.user_id, NEW.date, 'expense', NEW.category, -NEW.amount, NEW.description);
+'''
+_REMOVE_EXPENSE_ENTRY = '''
+        DELETE FROM ledger WHERE id = OLD.id * 2;
+'''
+_ADD_INCOME_ENTRY = '''
+        INSERT INTO ledger (id, user_id, date, type, label, amount)
+        VALUES (NEW.id * 2 + 1, NEW.user_id, NEW.date, 'income', NEW.source, NEW.amount);
+'''
+_REMOVE_INCOME_ENTRY = '''
+        DELETE FROM ledger WHERE id = OLD.id * 2 + 1;
+'''
+
+LEDGER_TRIGGERS = (
+    "CREATE TRIGGER IF NOT EXISTS expenses_ledger_insert AFTER INSERT ON expenses BEGIN"
+    + _ADD_EXPENSE_ENTRY + "END",
+    "CREATE TRIGGER IF NOT EXISTS expenses_ledger_delete AFTER DELETE ON expenses BEGIN"
+    + _REMOVE_EXPENSE_ENTRY + "END",
+    "CREATE TRIGGER IF NOT EXISTS expenses_ledger_update"
+    " AFTER UPDATE OF id, user_id, category, date, amount, description ON expenses BEGIN"
+    + _REMOVE_EXPENSE_ENTRY + _ADD_EXPENSE_ENTRY + "END",
+    "CREATE TRIGGER IF NOT EXISTS income_ledger_insert AFTER INSERT ON income BEGIN"
+    + _ADD_INCOME_ENTRY + "END",
+    "CREATE TRIGGER IF NOT EXISTS income_ledger_delete AFTER DELETE ON income BEGIN"
+    + _REMOVE_INCOME_ENTRY + "END",
+    "CREATE TRIGGER IF NOT EXISTS income_ledger_update"
+    " AFTER UPDATE OF id, user_id, amount, date, source ON income BEGIN"
+    + _REMOVE_INCOME_ENTRY + _ADD_INCOME_ENTRY + "END",
+)
+
+REBUILD_LEDGER = (
+    "DELETE FROM ledger",
+    "INSERT INTO ledger (id, user_id, date, type, label, amount, description)"
+    " SELECT id * 2, user_id, date, 'expense', category, -amount, description FROM expenses",
+    "INSERT INTO ledger (id, user_id, date, type, label, amount)"
+    " SELECT id * 2 + 1, user_id, date, 'income', source, amount FROM income",
+)
+
+
+@migration(7, "Add a trigger-maintained ledger of all transactions")
+def add_ledger_table(cursor):
+    # Filling the table before creating the index is faster than keeping
+    # the index up to date row by row
+    cursor.execute(LEDGER_TABLE)
+    for sql in REBUILD_LEDGER + (LEDGER_INDEX,) + LEDGER_TRIGGERS:
+        cursor.execute(sql)
+
+
+
+# Day number of a stored date, counted from 1970-01-01 like dates.EPOCH, or
+# NULL unless the text is a real YYYY-MM-DD date: julianday() reads
+# '2024-02-30' as March 1st, so the date has to survive the round trip.
+# julianday() of midnight is always a whole day plus a half, so the CAST is exact.
+DAY_OF = (
+    "CASE WHEN date(julianday({0})) = {0}"
+    " THEN CAST(julianday({0}) - 2440587.5 AS INTEGER) END"
+)
+
+LEDGER_DAY_INDEX = "CREATE INDEX IF NOT EXISTS idx_ledger_user_day ON ledger (user_id, day, id)"
+
+_ADD_EXPENSE_DAY_ENTRY = f'''
+        INSERT INTO ledger (id, user_id, date, day, type, label, amount, description)
+        VALUES (NEW.id * 2, NEW.user_id, NEW.date, {DAY_OF.format("NEW.date")}, 'expense',
+                NEW.category, -NEW.amount, NEW.description);
+'''
+_ADD_INCOME_DAY_ENTRY = f'''
+        INSERT INTO ledger (id, user_id, date, day, type, label, amount)
+        VALUES (NEW.id * 2 + 1, NEW.user_id, NEW.date, {DAY_OF.format("NEW.date")}, 'income',
+                NEW.source, NEW.amount);
+'''
+
+LEDGER_DAY_TRIGGERS = (
+    "CREATE TRIGGER IF NOT EXISTS expenses_ledger_insert AFTER INSERT ON expenses BEGIN"
+    + _ADD_EXPENSE_DAY_ENTRY + "END",
+    "CREATE TRIGGER IF NOT EXISTS expenses_ledger_delete AFTER DELETE ON expenses BEGIN"
+    + _REMOVE_EXPENSE_ENTRY + "END",
+    "CREATE TRIGGER IF NOT EXISTS expenses_ledger_update"
+    " AFTER UPDATE OF id, user_id, category, date, amount, description ON expenses BEGIN"
+    + _REMOVE_EXPENSE_ENTRY + _ADD_EXPENSE_DAY_ENTRY + "END",
+    "CREATE TRIGGER IF NOT EXISTS income_ledger_insert AFTER INSERT ON income BEGIN"
+    + _ADD_INCOME_DAY_ENTRY + "END",
+    "CREATE TRIGGER IF NOT EXISTS income_ledger_delete AFTER DELETE ON income BEGIN"
+    + _REMOVE_INCOME_ENTRY + "END",
+    "CREATE TRIGGER IF NOT EXISTS income_ledger_update"
+    " AFTER UPDATE OF id, user_id, amount, date, source ON income BEGIN"
+    + _REMOVE_INCOME_ENTRY + _ADD_INCOME_DAY_ENTRY + "END",
+)
+
+# Run after REBUILD_LEDGER, which predates the day column
+FILL_LEDGER_DAYS = (
+    "UPDATE ledger SET day = " + DAY_OF.format("date"),
+)
+
+
+def iso_date_or_none(value):
+    try:
+        return to_iso_date(value)
+    except ValueError:
+        return None
+
+
+@migration(8, "Normalize dates and add ledger day numbers")
+def add_ledger_days(cursor):
+    # Dates used to be stored as typed. Those that can be read, such as
+    # '2024-1-5' or '2024-01-05 10:30', are rewritten as YYYY-MM-DD; the
+    # update triggers move their totals and ledger rows along with them.
+    # Anything else is left as it was and gets no day number.
+    cursor.connection.create_function("iso_date", 1, iso_date_or_none, deterministic=True)
+    for table in ("expenses", "income"):
+        cursor.execute(
+            f"UPDATE {table} SET date = iso_date(date)"
+            f" WHERE date(julianday(date)) IS NOT date AND iso_date(date) IS NOT NULL"
+        )
+
+    cursor.execute("ALTER TABLE ledger ADD COLUMN day INTEGER")
+    for sql in FILL_LEDGER_DAYS:
+        cursor.execute(sql)
+    for name in ("expenses_ledger_insert", "expenses_ledger_update",
+                 "income_ledger_insert", "income_ledger_update"):
+        cursor.execute(f"DROP TRIGGER {name}")
+    for sql in (LEDGER_DAY_INDEX,) + LEDGER_DAY_TRIGGERS:
+        cursor.execute(sql)
+
+
+# One monthly spending limit per user and expense category. What has been
+# spent against it comes from expense_totals, which is already kept per month.
+BUDGETS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS budgets (
+        user_id INTEGER NOT NULL,
+        category TEXT NOT NULL,
+        amount INTEGER NOT NULL,
+        PRIMARY KEY (user_id, category),
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    ) WITHOUT ROWID
+'''
+
+
+@migration(9, "Add monthly category budgets")
+def add_budgets_table(cursor):
+    cursor.execute(BUDGETS_TABLE)
+
+
+# Repeating expenses and income. Occurrences are added to the expenses and
+# income tables as they come due; last_materialized is the date of the last
+# one added, NULL before the first, and moves in the same transaction as the
+# inserts so that no date is ever added twice.
+RECURRING_TABLE = '''
+    CREATE TABLE IF NOT EXISTS recurring (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        type TEXT NOT NULL,
+        label TEXT,
+        amount INTEGER NOT NULL,
+        description TEXT,
+        rule TEXT NOT NULL,
+        start_date TEXT NOT NULL,
+        last_materialized TEXT,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+'''
+
+RECURRING_INDEX = "CREATE INDEX IF NOT EXISTS idx_recurring_user ON recurring (user_id)"
+
+
+@migration(10, "Add recurring transaction rules")
+def add_recurring_table(cursor):
+    cursor.execute(RECURRING_TABLE)
+    cursor.execute(RECURRING_INDEX)
+
+
+# Sort keys of the sortable list columns (see database.SORT_KEYS), each with
+# an index that starts with user_id and ends with the row id, so a sorted page
+# in either direction is a range scan without a sort step. SQLite only seeks
+# on keyset comparisons of columns, not of expressions, so the ledger's
+# absolute amount and sources and labels with NULL read as '' are VIRTUAL
+# generated columns: computed when read and stored only in their indexes.
+# Date order and the category/amount order of expenses already have indexes.
+SORT_COLUMNS = [
+    "ALTER TABLE income ADD COLUMN source_key TEXT AS (IFNULL(source, '')) VIRTUAL",
+    "ALTER TABLE ledger ADD COLUMN abs_amount INTEGER AS (abs(amount)) VIRTUAL",
+    "ALTER TABLE ledger ADD COLUMN label_key TEXT AS (IFNULL(label, '')) VIRTUAL",
+]
+
+SORT_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_expenses_user_amount ON expenses (user_id, amount)",
+    "CREATE INDEX IF NOT EXISTS idx_income_user_amount ON income (user_id, amount)",
+    "CREATE INDEX IF NOT EXISTS idx_income_user_source_key ON income (user_id, source_key, amount)",
+    # Per type, so the type filter is part of the seek; the combined
+    # history is a merge of the expense and income pages
+    "CREATE INDEX IF NOT EXISTS idx_ledger_user_type ON ledger (user_id, type, date, id)",
+    "CREATE INDEX IF NOT EXISTS idx_ledger_user_type_amount ON ledger (user_id, type, abs_amount, id)",
+    "CREATE INDEX IF NOT EXISTS idx_ledger_user_type_label ON ledger (user_id, type, label_key, abs_amount, id)",
+]
+
+
+@migration(11, "Add sort key columns and indexes for sorted list pages")
+def add_sort_indexes(cursor):
+    for sql in SORT_COLUMNS + SORT_INDEXES:
+        cursor.execute(sql)
+    # Without statistics for the new indexes the planner takes the
+    # (user_id, amount) ones for date-ordered reads and sorts the result
+    cursor.execute("ANALYZE")
+
+
+def get_schema_version(conn):
+    """Return the schema version recorded in the database, 0 if none"""
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        " version INTEGER PRIMARY KEY,"
+        " description TEXT NOT NULL,"
+        " applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+    )
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def migrate(conn, target=None):
+    """Apply every pending migration up to target and return the new version"""
+    check_sqlite_version()
+    current = get_schema_version(conn)
+    conn.commit()
+
+    for version, description, func in MIGRATIONS:
+        if version <= current or (target is not None and version > target):
+            continue
+
+        # Each step runs in its own transaction together with its version
+        # record, so an interrupted upgrade resumes from the last good step.
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # Another process sharing the file may have applied this step
+            # while we were waiting for the write lock
+            if conn.execute(
+                "SELECT 1 FROM schema_version WHERE version = ?", (version,)
+            ).fetchone():
+                conn.commit()
+                current = version
+                continue
+            func(conn.cursor())
+            conn.execute(
+                "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                (version, description)
+            )
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        current = version
+
+    return current
@@ -0,0 +1,40 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+
+# Amounts are stored and passed around as integer cents. Conversion from user
+# input and formatting for display happen only at the edges, in this module.
+CENT = Decimal("0.01")
+
+
+def to_cents(value):
+    """Convert a dollar amount given as str, Decimal, int or float to integer cents.
+
+    Floats go through their shortest repr, so 0.285 becomes 29 cents rather
+    than 28 from its binary approximation. Raises ValueError if the value is
+    not a finite number.
+    """
+    if isinstance(value, float):
+        value = repr(value)
+    elif isinstance(value, str):
+        value = value.strip().replace(",", "").replace("$", "")
+    try:
+        amount = Decimal(value)
+    except (InvalidOperation, TypeError, ValueError):
+        raise ValueError(f"invalid amount {value!r}") from None
+    if not amount.is_finite():
+        raise ValueError(f"invalid amount {value!r}")
+    return int(amount.quantize(CENT, rounding=ROUND_HALF_UP).scaleb(2))
+
+
+def from_cents(cents):
+    """Return integer cents as an exact Decimal dollar amount"""
+    return Decimal(cents).scaleb(-2)
+
+
+def format_cents(cents, sign=""):
+    """Format integer cents for display, e.g. 123456 -> '$1234.56'.
+    sign is put in front of the dollar sign for positive amounts"""
+    if cents < 0:
+        sign = "-"
+        cents = -cents
+    return f"{sign}${cents // 100}.{cents % 100:02d}"
@@ -0,0 +1,157 @@
+import tkinter as tk
+
+
+# Rows fetched per query. A Treeview shows ~20 rows at the default size, so a
+# page covers the visible window plus a generous prefetch margin.
+PAGE_SIZE = 100
+
+# Fetch the next page once the bottom of the view is within this fraction of
+# the loaded rows.
+PREFETCH_FRACTION = 0.2
+
+
+class TreePager:
+    """Fills a Treeview one keyset page at a time as the user scrolls.
+
+    fetch_page(after, limit, callback) fetches the next rows after the cursor
+    (None for the first page) and passes them to callback, later from the Tk
+    event loop, and returns the Future of the request. cursor_of(row)
+    returns the cursor for a row and make_item(row) returns the (iid,
+    values, tags) of its Treeview item.
+    descending says whether pages come in descending or ascending cursor
+    order; set it before reset() when the list's sort changes.
+    """
+
+    def __init__(self, tree, scrollbar, fetch_page, cursor_of, make_item,
+                 striped=True, page_size=PAGE_SIZE):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.fetch_page = fetch_page
+        self.cursor_of = cursor_of
+        self.make_item = make_item
+        self.striped = striped
+        self.page_size = page_size
+        self.descending = True
+        self.cursor = None
+        self.count = 0
+        self.keys = []
+        self.exhausted = False
+        self.request = None
+        self.generation = 0
+
+        # Every view change (scrollbar, mouse wheel, keyboard) goes through
+        # yscrollcommand, so that is where we notice the user nearing the end
+        self.tree.configure(yscrollcommand=self.on_scroll)
+
+    def reset(self):
+        """Drop all loaded rows and load the first page again"""
+        children = self.tree.get_children()
+        if children:
+            self.tree.delete(*children)
+        self.cursor = None
+        self.count = 0
+        self.keys = []
+        self.exhausted = False
+        self.request = None
+        # Pages requested before the reset are stale when they arrive
+        self.generation += 1
+        self.load_more()
+
+    def load_more(self):
+        """Request the next page of rows"""
+        if self.exhausted or self.loading():
+            return
+        generation = self.generation
+        self.request = self.fetch_page(self.cursor, self.page_size,
+                                       lambda rows: self.append_page(rows, generation))
+
+    def loading(self):
+        """Return True while a page request is queued or running"""
+        return self.request is not None and not self.request.cancelled()
+
+    def resume(self):
+        """Re-request a page whose request was cancelled, e.g. on a tab switch"""
+        if self.request is not None and self.request.cancelled():
+            self.request = None
+            self.load_more()
+
+    def append_page(self, rows, generation):
+        """Append a fetched page of rows to the Treeview"""
+        if generation != self.generation or not self.tree.winfo_exists():
+            return
+        self.request = None
+
+        for row in rows:
+            iid, values, tags = self.make_item(row)
+            if self.striped:
+                tags = tags + (("evenrow",) if self.count % 2 == 0 else ("oddrow",))
+            self.tree.insert("", tk.END, iid=iid, values=values, tags=tags)
+            self.keys.append(self.cursor_of(row))
+            self.count += 1
+
+        if rows:
+            self.cursor = self.cursor_of(rows[-1])
+        if len(rows) < self.page_size:
+            self.exhausted = True
+
+    def insert_row(self, row):
+        """Insert a single new row at its sorted position among the loaded rows"""
+        key = self.cursor_of(row)
+
+        # Find the first loaded row the new one sorts before
+        lo, hi = 0, len(self.keys)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if (self.keys[mid] > key) if self.descending else (self.keys[mid] < key):
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == len(self.keys) and not self.exhausted:
+            # The row sorts after the loaded window; the next page picks it up
+            return
+
+        iid, values, tags = self.make_item(row)
+        self.tree.insert("", lo, iid=iid, values=values, tags=tags)
+        self.keys.insert(lo, key)
+        self.count += 1
+        self.restripe(lo)
+
+    def remove_row(self, iid):
+        """Remove a single row if it is loaded"""
+        self.remove_rows([iid])
+
+    def remove_rows(self, iids):
+        """Remove the loaded rows among iids, restriping only once"""
+        iids = [iid for iid in iids if self.tree.exists(iid)]
+        if not iids:
+            return
+        indexes = sorted(self.tree.index(iid) for iid in iids)
+        self.tree.delete(*iids)
+        for index in reversed(indexes):
+            del self.keys[index]
+        self.count -= len(iids)
+        # A row moves up by the number of removed rows above it, so only the
+        # rows below the 1st, 3rd, 5th... removed row and above the next one
+        # change parity; bounds are where those runs now start and end
+        bounds = [index - removed for removed, index in enumerate(indexes)] + [self.count]
+        for removed in range(0, len(indexes), 2):
+            self.restripe(bounds[removed], bounds[removed + 1])
+
+    def restripe(self, start, stop=None):
+        """Fix the alternating row tags of the loaded rows from start up to
+        stop, default the end. Callers pass only the rows whose parity
+        changed: a row inserted at an index flips every row below it, but
+        removing two rows leaves the rows below both as they were"""
+        if not self.striped:
+            return
+        for index, iid in enumerate(self.tree.get_children()[start:stop], start):
+            tags = tuple(tag for tag in self.tree.item(iid, "tags") if tag not in ("evenrow", "oddrow"))
+            self.tree.item(iid, tags=tags + (("evenrow",) if index % 2 == 0 else ("oddrow",)))
+
+    def on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if self.exhausted or self.loading():
+            return
+        if float(last) >= 1.0 - PREFETCH_FRACTION:
+            # Defer the request so we never start a fetch from inside a redraw
+            self.tree.after_idle(self.load_more)
@@ -0,0 +1,158 @@
+from operator import attrgetter
+
+from money import format_cents
+
+
+# Typed rows returned by the Database read methods. Fields are read by name
+# (expense.amount rather than expense[3]), yet a record still unpacks,
+# indexes and compares like the tuple it replaces, so code written for tuple
+# rows keeps working. Records have __slots__ and no per-instance dict, and
+# the text shown for a row is only formatted when the row is displayed.
+class Record:
+    __slots__ = ("_display",)
+    FIELDS = ()
+    # Text fields whose values repeat from row to row
+    SHARED = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._values = attrgetter(*cls.FIELDS)
+
+    def __iter__(self):
+        return iter(self._values(self))
+
+    def __len__(self):
+        return len(self.FIELDS)
+
+    def __getitem__(self, index):
+        return self._values(self)[index]
+
+    def __eq__(self, other):
+        if isinstance(other, (Record, tuple)):
+            return self._values(self) == tuple(other)
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self._values(self))
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={value!r}" for name, value in zip(self.FIELDS, self))
+        return f"{type(self).__name__}({fields})"
+
+    def __reduce__(self):
+        return type(self), self._values(self)
+
+    def display(self):
+        """Return the values shown for this row in a Treeview, formatted on
+        first use and cached"""
+        try:
+            return self._display
+        except AttributeError:
+            self._display = self.format()
+            return self._display
+
+    def format(self):
+        raise NotImplementedError
+
+    @classmethod
+    def row_factory(cls):
+        """Return a sqlite3 row_factory that builds records of this class.
+        Equal text values within one result, such as dates, categories and
+        the transaction type, share a single string object"""
+        shared = {}
+        share = shared.setdefault
+        positions = [index for index, name in enumerate(cls.FIELDS) if name in cls.SHARED]
+
+        def make(cursor, row):
+            row = list(row)
+            for index in positions:
+                value = row[index]
+                row[index] = share(value, value)
+            return cls(*row)
+        return make
+
+
+class Expense(Record):
+    __slots__ = ("id", "category", "date", "amount", "description")
+    FIELDS = __slots__
+    SHARED = ("category", "date", "description")
+
+    def __init__(self, id, category, date, amount, description):
+        self.id = id
+        self.category = category
+        self.date = date
+        self.amount = amount
+        self.description = description
+
+    def format(self):
+        return (self.id, self.category, self.date, format_cents(self.amount), self.description)
+
+    def as_transaction(self):
+        return Transaction(self.id, self.category, self.date, self.amount, self.description, "expense")
+
+
+class Income(Record):
+    __slots__ = ("id", "amount", "date", "source")
+    FIELDS = __slots__
+    SHARED = ("date", "source")
+
+    def __init__(self, id, amount, date, source):
+        self.id = id
+        self.amount = amount
+        self.date = date
+        self.source = source
+
+    def format(self):
+        return (self.id, format_cents(self.amount), self.date, self.source)
+
+    def as_transaction(self):
+        return Transaction(self.id, self.source, self.date, self.amount, "Income", "income")
+
+
+class Transaction(Record):
+    """An expense or income row of the combined history. label is the
+    category or source and amounts are positive for both kinds"""
+    __slots__ = ("id", "label", "date", "amount", "description", "kind")
+    FIELDS = __slots__
+    SHARED = ("label", "date", "description", "kind")
+
+    def __init__(self, id, label, date, amount, description, kind):
+        self.id = id
+        self.label = label
+        self.date = date
+        self.amount = amount
+        self.description = description
+        self.kind = kind
+
+    @property
+    def iid(self):
+        # Expense and income ids overlap, so the item id carries the type
+        return f"{self.kind}:{self.id}"
+
+    def format(self):
+        if self.kind == "expense":
+            amount = format_cents(-self.amount)
+        else:
+            amount = format_cents(self.amount, sign="+")
+        return (self.kind.capitalize(), self.label, self.date, amount, self.description)
+
+
+class SearchResult(Transaction):
+    """A search_transactions row, with the (score, key) it is ranked by"""
+    __slots__ = ("score", "key")
+    FIELDS = Transaction.FIELDS + __slots__
+
+    def __init__(self, id, label, date, amount, description, kind, score, key):
+        super().__init__(id, label, date, amount, description, kind)
+        self.score = score
+        self.key = key
+
+
+class SnapshotRow(Transaction):
+    """A TransactionSnapshot.page row, with its position in the sorted index"""
+    __slots__ = ("position",)
+    FIELDS = Transaction.FIELDS + __slots__
+
+    def __init__(self, id, label, date, amount, description, kind, position):
+        super().__init__(id, label, date, amount, description, kind)
+        self.position = position
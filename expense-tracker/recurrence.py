@@ -0,0 +1,159 @@
+"""Recurrence rules for repeating expenses and income.
+
+Rules are written like iCalendar RRULEs, with a subset of their parts:
+
+    FREQ=DAILY|WEEKLY|MONTHLY|YEARLY   required
+    INTERVAL=N                         every N days/weeks/months/years
+    BYDAY=MO,WE,FR                     weekdays of a weekly rule
+    BYMONTHDAY=N                       day of a monthly rule, -1 for the last
+    COUNT=N                            stop after N occurrences
+    UNTIL=YYYY-MM-DD                   stop after this date
+
+or as one of the PRESETS names. Monthly and yearly rules falling on a day a
+month does not have (the 31st, February 29th) use its last day instead.
+Dates are generated lazily from the start date, never stored in advance.
+"""
+import calendar
+import datetime
+from itertools import count
+
+from dates import to_iso_date
+
+
+FREQUENCIES = ("DAILY", "WEEKLY", "MONTHLY", "YEARLY")
+WEEKDAYS = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+
+PRESETS = {
+    "daily": "FREQ=DAILY",
+    "weekly": "FREQ=WEEKLY",
+    "biweekly": "FREQ=WEEKLY;INTERVAL=2",
+    "monthly": "FREQ=MONTHLY",
+    "quarterly": "FREQ=MONTHLY;INTERVAL=3",
+    "yearly": "FREQ=YEARLY",
+}
+
+
+def add_months(date, months, day):
+    """Return the given day of the month months after date's month,
+    clamped to the length of that month; negative days count from its end"""
+    index = date.year * 12 + date.month - 1 + months
+    year, month = divmod(index, 12)
+    length = calendar.monthrange(year, month + 1)[1]
+    if day < 0:
+        day = length + 1 + day
+    return datetime.date(year, month + 1, max(1, min(day, length)))
+
+
+class Rule:
+    def __init__(self, freq, interval=1, weekdays=(), monthday=None, count=None, until=None):
+        if freq not in FREQUENCIES:
+            raise ValueError(f"Unknown frequency: {freq!r}")
+        if interval < 1 or (count is not None and count < 1):
+            raise ValueError("INTERVAL and COUNT must be positive")
+        if weekdays and freq != "WEEKLY":
+            raise ValueError("BYDAY is only supported for weekly rules")
+        if monthday is not None and (freq != "MONTHLY" or not 1 <= abs(monthday) <= 31):
+            raise ValueError("BYMONTHDAY must be 1 to 31 or -31 to -1 on a monthly rule")
+        self.freq = freq
+        self.interval = interval
+        self.weekdays = tuple(sorted(set(weekdays)))
+        self.monthday = monthday
+        self.count = count
+        self.until = until
+
+    @classmethod
+    def parse(cls, text):
+        """Parse a rule string or preset name, raising ValueError if invalid"""
+        text = PRESETS.get(text.strip().lower(), text)
+        parts = {}
+        for part in text.strip().strip(";").split(";"):
+            name, sep, value = part.partition("=")
+            if not sep:
+                raise ValueError(f"invalid rule part {part!r}")
+            parts[name.strip().upper()] = value.strip().upper()
+        known = {"FREQ", "INTERVAL", "BYDAY", "BYMONTHDAY", "COUNT", "UNTIL"}
+        if set(parts) - known:
+            raise ValueError(f"Unsupported rule parts: {', '.join(sorted(set(parts) - known))}")
+        if "FREQ" not in parts:
+            raise ValueError("A rule needs a FREQ")
+        weekdays = []
+        for day in filter(None, parts.get("BYDAY", "").split(",")):
+            if day not in WEEKDAYS:
+                raise ValueError(f"Unknown weekday: {day!r}")
+            weekdays.append(WEEKDAYS.index(day))
+        try:
+            return cls(
+                parts["FREQ"],
+                int(parts.get("INTERVAL", 1)),
+                weekdays,
+                int(parts["BYMONTHDAY"]) if "BYMONTHDAY" in parts else None,
+                int(parts["COUNT"]) if "COUNT" in parts else None,
+                to_iso_date(parts["UNTIL"]) if "UNTIL" in parts else None,
+            )
+        except ValueError as e:
+            raise ValueError(f"invalid rule {text!r}: {e}") from None
+
+    def __str__(self):
+        parts = [f"FREQ={self.freq}"]
+        if self.interval != 1:
+            parts.append(f"INTERVAL={self.interval}")
+        if self.weekdays:
+            parts.append("BYDAY=" + ",".join(WEEKDAYS[day] for day in self.weekdays))
+        if self.monthday is not None:
+            parts.append(f"BYMONTHDAY={self.monthday}")
+        if self.count is not None:
+            parts.append(f"COUNT={self.count}")
+        if self.until is not None:
+            parts.append(f"UNTIL={self.until}")
+        return ";".join(parts)
+
+    def describe(self):
+        """Return the preset name of the rule if it has one, else the rule"""
+        text = str(self)
+        for name, preset in PRESETS.items():
+            if preset == text:
+                return name.capitalize()
+        return text
+
+    def _candidates(self, start):
+        """Yield the rule's dates from start on, ignoring COUNT and UNTIL"""
+        step = self.interval
+        if self.freq == "DAILY":
+            for k in count():
+                yield start + datetime.timedelta(days=k * step)
+        elif self.freq == "WEEKLY" and not self.weekdays:
+            for k in count():
+                yield start + datetime.timedelta(weeks=k * step)
+        elif self.freq == "WEEKLY":
+            monday = start - datetime.timedelta(days=start.weekday())
+            for k in count():
+                week = monday + datetime.timedelta(weeks=k * step)
+                for day in self.weekdays:
+                    date = week + datetime.timedelta(days=day)
+                    if date >= start:
+                        yield date
+        elif self.freq == "MONTHLY":
+            day = self.monthday if self.monthday is not None else start.day
+            for k in count():
+                date = add_months(start, k * step, day)
+                if date >= start:
+                    yield date
+        else:
+            for k in count():
+                yield add_months(start, k * step * 12, start.day)
+
+    def occurrences(self, start, after=None, through=None):
+        """Yield the rule's 'YYYY-MM-DD' dates counted from start, lazily.
+        Only dates later than after and no later than through are yielded;
+        without a through date a rule with no COUNT or UNTIL never ends"""
+        start = datetime.date.fromisoformat(to_iso_date(start))
+        last = min(filter(None, (self.until, through and to_iso_date(through))), default=None)
+        after = after and to_iso_date(after)
+        for number, date in enumerate(self._candidates(start), 1):
+            if self.count is not None and number > self.count:
+                return
+            date = date.isoformat()
+            if last is not None and date > last:
+                return
+            if after is None or date > after:
+                yield date
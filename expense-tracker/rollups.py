@@ -0,0 +1,166 @@
+import numpy as np
+
+
+# Calendar periods the rollups support: numpy datetime unit and step per period
+PERIOD_UNITS = {
+    "day": ("D", 1),
+    "week": ("D", 7),
+    "month": ("M", 1),
+}
+
+# Periods in a year, the lag for year-over-year deltas. Days and weeks ignore
+# leap days and 53-week years, which is close enough for a trend line.
+PERIODS_PER_YEAR = {
+    "day": 365,
+    "week": 52,
+    "month": 12,
+}
+
+# A Monday, so that week starts line up with the keys Database.get_rollup returns
+MONDAY = np.datetime64("1970-01-05", "D")
+
+
+def period_start(period, date):
+    """Return the start of the period containing date as a numpy datetime64"""
+    unit, step = PERIOD_UNITS[period]
+    day = np.datetime64(date, "D")
+    if period == "week":
+        return day - (day - MONDAY).astype(np.int64) % 7
+    return day.astype(f"datetime64[{unit}]")
+
+
+def moving_average(values, window):
+    """Return the trailing moving average of values over window rows as floats.
+    The first window - 1 rows have no full window and are NaN"""
+    sums = np.cumsum(values, axis=0, dtype=np.float64)
+    averages = np.full(sums.shape, np.nan)
+    if len(sums) >= window:
+        averages[window - 1] = sums[window - 1]
+        averages[window:] = sums[window:] - sums[:-window]
+        averages[window - 1:] /= window
+    return averages
+
+
+def lagged_delta(values, lag):
+    """Return values minus the values lag rows earlier as floats.
+    The first lag rows have nothing to compare with and are NaN"""
+    deltas = np.full(np.shape(values), np.nan)
+    if len(values) > lag:
+        deltas[lag:] = values[lag:] - values[:-lag]
+    return deltas
+
+
+class Rollup:
+    """Totals in cents as a (period x label) matrix.
+
+    periods holds the start of every period in the range, empty ones
+    included, so rows are evenly spaced and the series methods below can
+    work on whole columns at once.
+    """
+
+    def __init__(self, period, periods, labels, totals):
+        self.period = period
+        self.periods = periods
+        self.labels = labels
+        self.totals = totals
+
+    def __len__(self):
+        return len(self.periods)
+
+    @classmethod
+    def from_rows(cls, period, rows, first=None, last=None):
+        """Build a rollup from Database.get_rollup rows.
+        first and last are the first and last periods to include; they
+        default to the range of the rows"""
+        unit, step = PERIOD_UNITS[period]
+        if rows:
+            keys, labels, amounts = zip(*rows)
+        else:
+            keys, labels, amounts = (), (), ()
+        keys = np.array(keys, dtype=f"datetime64[{unit}]")
+
+        if first is None:
+            first = keys.min() if len(keys) else None
+        if last is None:
+            last = keys.max() if len(keys) else None
+        if first is None or last is None:
+            return cls(period, np.array([], dtype=f"datetime64[{unit}]"), [],
+                       np.zeros((0, 0), dtype=np.int64))
+
+        periods = np.arange(first, last + step, step)
+        names = {}
+        codes = np.array([names.setdefault(label, len(names)) for label in labels],
+                         dtype=np.intp)
+        rows_index = (keys - first).astype(np.int64) // step
+
+        totals = np.zeros((len(periods), len(names)), dtype=np.int64)
+        inside = (rows_index >= 0) & (rows_index < len(periods))
+        np.add.at(totals, (rows_index[inside], codes[inside]),
+                  np.array(amounts, dtype=np.int64)[inside])
+        return cls(period, periods, list(names), totals)
+
+    def by_period(self):
+        """Return the total over all labels for each period"""
+        return self.totals.sum(axis=1)
+
+    def by_label(self):
+        """Return the total over all periods for each label"""
+        return self.totals.sum(axis=0)
+
+    def cumulative(self, values=None):
+        """Return running totals down the periods (of the matrix by default)"""
+        values = self.totals if values is None else values
+        return np.cumsum(values, axis=0)
+
+    def moving_average(self, window, values=None):
+        """Return the trailing moving average over window periods (see moving_average)"""
+        return moving_average(self.totals if values is None else values, window)
+
+    def year_over_year(self, values=None):
+        """Return the change from the same period a year earlier (see lagged_delta)"""
+        return lagged_delta(self.totals if values is None else values,
+                            PERIODS_PER_YEAR[self.period])
+
+
+def load_rollup(db, user_id, kind, period="month", start=None, end=None):
+    """Return a Rollup of a user's expenses or income per category or source"""
+    rows = db.get_rollup(user_id, kind, period, start, end)
+    first = period_start(period, start) if start is not None else None
+    last = (period_start(period, np.datetime64(end, "D") - 1)
+            if end is not None else None)
+    return Rollup.from_rows(period, rows, first, last)
+
+
+class CashFlow:
+    """Income, expenses, net and running balance per period, in cents"""
+
+    def __init__(self, period, periods, income, expenses):
+        self.period = period
+        self.periods = periods
+        self.income = income
+        self.expenses = expenses
+        self.net = income - expenses
+        self.balance = np.cumsum(self.net)
+
+    def __len__(self):
+        return len(self.periods)
+
+
+def cash_flow(db, user_id, period="month", start=None, end=None):
+    """Return a CashFlow for a user over the periods that have any data"""
+    income_rows = db.get_rollup(user_id, "income", period, start, end)
+    expense_rows = db.get_rollup(user_id, "expense", period, start, end)
+
+    # Line both series up on the same periods before subtracting them
+    unit, step = PERIOD_UNITS[period]
+    keys = np.array([row[0] for row in income_rows + expense_rows],
+                    dtype=f"datetime64[{unit}]")
+    if not len(keys):
+        empty = np.zeros(0, dtype=np.int64)
+        return CashFlow(period, np.array([], dtype=f"datetime64[{unit}]"), empty, empty)
+    first = keys.min()
+    last = keys.max()
+
+    income = Rollup.from_rows(period, income_rows, first, last)
+    expenses = Rollup.from_rows(period, expense_rows, first, last)
+    return CashFlow(period, income.periods, income.by_period(), expenses.by_period())
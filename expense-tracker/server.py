@@ -0,0 +1,568 @@
+"""Headless HTTP/JSON service for an expense tracker database.
+
+Usage: python server.py [--db PATH] [--host HOST] [--port PORT] [--readers N]
+                        [--group-commit-ms MS] [--group-commit-ops N]
+
+Every request authenticates with HTTP Basic auth against the users table.
+Amounts are integer cents. List endpoints return {"rows": [...], "next": C}
+and take the cursor C back as ?after=C for the next page; next is null on
+the last page. ?sort= orders a list by another indexed column (see
+database.SORT_KEYS), descending unless ?order=asc.
+
+    POST   /users                  {"username", "password"}   register
+    GET    /expenses               ?limit=&after=&sort=date|amount|category&order=
+    POST   /expenses               {"category", "amount", "description", "date"}
+    DELETE /expenses/<id>
+    GET    /income                 ?limit=&after=&sort=date|amount|source&order=
+    POST   /income                 {"amount", "source", "date"}
+    DELETE /income/<id>
+    POST   /expenses/delete        {"ids"}                      delete many in one transaction
+    PATCH  /expenses               {"ids", "category", "date"}  re-categorize and/or re-date many
+    POST   /income/delete          {"ids"}
+    PATCH  /income                 {"ids", "source", "date"}
+    GET    /transactions           ?limit=&after=&type=&start=&end=&month=&category=&min_amount=&max_amount=&order=asc|desc
+                                   or ?limit=&after=&sort=date|amount|category|type&type=&order=
+    GET    /search                 ?q=&type=&start=&end=&label=&min_amount=&max_amount=
+    GET    /totals/expenses        per category
+    GET    /totals/income          per source
+    GET    /rollup                 ?kind=expense|income&period=day|week|month&start=&end=
+    GET    /budgets                ?month=YYYY-MM               budget vs spent per category
+    GET    /recurring
+    POST   /recurring              {"type", "label", "amount", "rule", "start", "description"}
+    DELETE /recurring/<id>
+    POST   /recurring/materialize  {"through"}                  add the occurrences due by then
+    PUT    /budgets/<category>     {"amount"}
+    DELETE /budgets/<category>
+"""
+import argparse
+import asyncio
+import base64
+import binascii
+import datetime
+import functools
+import json
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from database import GROUP_COMMIT_OPS, Database, sort_key, transaction_key
+from dates import month_range
+
+# Threads serving reads. Each has its own SQLite connection, and WAL mode
+# lets them all read while the writer commits.
+READ_THREADS = 4
+
+# Requests waiting for a database thread before new ones are held back
+MAX_PENDING = 256
+
+MAX_PAGE_SIZE = 1000
+MAX_BODY = 64 * 1024
+MAX_HEADER = 16 * 1024
+
+# Field names for the row tuples each Database method returns
+EXPENSE_FIELDS = ("id", "category", "date", "amount", "description")
+INCOME_FIELDS = ("id", "amount", "date", "source")
+TRANSACTION_FIELDS = ("id", "label", "date", "amount", "description", "type")
+SEARCH_FIELDS = TRANSACTION_FIELDS + ("score",)
+RECURRING_FIELDS = ("id", "type", "label", "amount", "description", "rule", "start", "last_materialized")
+
+# Expense or income type of each list endpoint
+TABLE_KINDS = {"expenses": "expense", "income": "income"}
+
+# GET /transactions parameters that make it a Database.query() call;
+# category may be given more than once
+QUERY_PARAMS = ("type", "start", "end", "month", "category", "min_amount", "max_amount", "order")
+
+# The ones a sorted GET /transactions (?sort=) can be combined with
+SORTED_PARAMS = ("type", "order")
+
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 401: "Unauthorized",
+           404: "Not Found", 405: "Method Not Allowed", 409: "Conflict",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+# (method, compiled path pattern, handler, auth), in registration order
+ROUTES = []
+
+
+def route(method, pattern, auth=True):
+    """Register an async handler(server, request, user_id, *path_groups)
+    returning (status, body). Handlers registered with auth=False are
+    called without a user_id"""
+    def register(handler):
+        ROUTES.append((method, re.compile(pattern + "$"), handler, auth))
+        return handler
+    return register
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Request:
+    def __init__(self, method, target, headers, body):
+        self.method = method
+        parts = urlsplit(target)
+        self.path = parts.path
+        self.fields = parse_qs(parts.query)
+        self.query = {key: values[-1] for key, values in self.fields.items()}
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        try:
+            data = json.loads(self.body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "Body is not valid JSON")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "Body must be a JSON object")
+        return data
+
+    def values(self, name):
+        """Return every value given for a repeated query parameter"""
+        return self.fields.get(name, [])
+
+    def limit(self, default=100):
+        return min(int_param(self.query.get("limit", default), "limit"), MAX_PAGE_SIZE)
+
+    def cursor(self):
+        token = self.query.get("after")
+        return None if token is None else decode_cursor(token)
+
+    def sort(self):
+        """Return the (sort, descending) order asked for by ?sort= and ?order="""
+        order = self.query.get("order", "desc")
+        if order not in ("asc", "desc"):
+            raise HTTPError(400, "order must be asc or desc")
+        return self.query.get("sort", "date"), order == "desc"
+
+
+def int_param(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise HTTPError(400, f"{name} must be an integer")
+
+
+# Cursors are handed out as opaque tokens so clients do not depend on
+# which columns a page is keyed by
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(token):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode()))
+    except (ValueError, binascii.Error):
+        raise HTTPError(400, "Invalid after cursor")
+    if not isinstance(values, list):
+        raise HTTPError(400, "Invalid after cursor")
+    return tuple(values)
+
+
+def page(rows, fields, limit, cursor_of):
+    """Build a list response; a full page means there may be more rows"""
+    next_cursor = encode_cursor(cursor_of(rows[-1])) if len(rows) == limit else None
+    return {"rows": [dict(zip(fields, row)) for row in rows], "next": next_cursor}
+
+
+class Server:
+    """Serves the Database API over HTTP, reads on a thread pool and all
+    writes on one thread so they never wait on each other's locks"""
+
+    def __init__(self, db_name="expense_tracker.db", readers=READ_THREADS,
+                 group_commit_ms=None, group_commit_ops=GROUP_COMMIT_OPS):
+        self.db = Database(db_name)
+        if group_commit_ms:
+            self.db.enable_group_commit(group_commit_ops, group_commit_ms)
+        # Timer that flushes held-back writes once they are due
+        self.flush_timer = None
+        self.readers = ThreadPoolExecutor(readers, thread_name_prefix="reader")
+        self.writer = ThreadPoolExecutor(1, thread_name_prefix="writer")
+        self.pending = asyncio.Semaphore(MAX_PENDING)
+        # Authorization header -> user id, so known clients skip the users table
+        self.users = {}
+
+    async def read(self, method, *args):
+        """Run a Database method on the read pool"""
+        # Readers have their own connections, so writes group commit still
+        # holds back are committed first for clients to read their own writes
+        if self.db.pending_writes:
+            await self.write("flush")
+        return await self.run(self.readers, method, *args)
+
+    async def write(self, method, *args):
+        """Run a Database method on the writer thread"""
+        result = await self.run(self.writer, method, *args)
+        if self.db.pending_writes and self.flush_timer is None:
+            loop = asyncio.get_running_loop()
+            self.flush_timer = loop.call_later(
+                self.db.flush_delay() or 0, lambda: loop.create_task(self.flush_due()))
+        return result
+
+    async def flush_due(self):
+        """Commit the held-back writes whose delay ran out"""
+        self.flush_timer = None
+        if self.db.pending_writes:
+            await self.write("flush")
+
+    async def run(self, executor, method, *args):
+        async with self.pending:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                executor, functools.partial(getattr(self.db, method), *args))
+
+    async def authenticate(self, request):
+        header = request.headers.get("authorization", "")
+        user_id = self.users.get(header)
+        if user_id is not None:
+            return user_id
+        scheme, _, encoded = header.partition(" ")
+        if scheme.lower() != "basic":
+            raise HTTPError(401, "Basic authentication required")
+        try:
+            username, _, password = base64.b64decode(encoded).decode().partition(":")
+        except (ValueError, binascii.Error):
+            raise HTTPError(401, "Malformed credentials")
+        user_id = await self.read("validate_user", username, password)
+        if user_id is None:
+            raise HTTPError(401, "Invalid username or password")
+        self.users[header] = user_id
+        return user_id
+
+    async def dispatch(self, request):
+        allowed = False
+        for method, pattern, handler, auth in ROUTES:
+            match = pattern.match(request.path)
+            if match is None:
+                continue
+            allowed = True
+            if method != request.method:
+                continue
+            if not auth:
+                return await handler(self, request, *match.groups())
+            user_id = await self.authenticate(request)
+            return await handler(self, request, user_id, *match.groups())
+        if allowed:
+            raise HTTPError(405, f"{request.method} not allowed on {request.path}")
+        raise HTTPError(404, f"No such endpoint: {request.path}")
+
+    async def handle(self, reader, writer):
+        """Serve requests on one connection until the client closes it"""
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except HTTPError as e:
+                    await send(writer, e.status, {"error": str(e)}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                keep_alive = request.headers.get("connection", "").lower() != "close"
+                try:
+                    status, body = await self.dispatch(request)
+                except HTTPError as e:
+                    status, body = e.status, {"error": str(e)}
+                except (TypeError, ValueError) as e:
+                    # Database argument checks, e.g. an amount that is not cents
+                    status, body = 400, {"error": str(e)}
+                except Exception as e:
+                    status, body = 500, {"error": f"{type(e).__name__}: {e}"}
+                await send(writer, status, body, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        # Catch up on recurring transactions that came due while stopped
+        added = await self.write("materialize_recurring")
+        if added:
+            print(f"Added {added} recurring transactions", flush=True)
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"Serving on http://{host}:{port}", flush=True)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.readers.shutdown()
+        self.writer.shutdown()
+        self.db.close()
+
+
+async def read_request(reader):
+    """Read one request, or return None when the client closed the connection"""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise
+    except asyncio.LimitOverrunError:
+        raise HTTPError(413, "Request headers too large")
+
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, version = lines[0].split(" ")
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+    length = int_param(headers.get("content-length", 0), "Content-Length")
+    if length > MAX_BODY:
+        raise HTTPError(413, "Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return Request(method, target, headers, body)
+
+
+async def send(writer, status, body, keep_alive=True):
+    payload = json.dumps(body).encode()
+    head = [
+        f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+        "Content-Type: application/json",
+        f"Content-Length: {len(payload)}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    if status == 401:
+        head.append('WWW-Authenticate: Basic realm="expense-tracker"')
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + payload)
+    await writer.drain()
+
+
+def required(data, *names):
+    missing = [name for name in names if name not in data]
+    if missing:
+        raise HTTPError(400, f"Missing fields: {', '.join(missing)}")
+    return [data[name] for name in names]
+
+
+@route("POST", r"/users", auth=False)
+async def register_user(server, request):
+    username, password = required(request.json(), "username", "password")
+    if not await server.write("add_user", username, password):
+        raise HTTPError(409, "Username already exists")
+    return 201, {"username": username}
+
+
+@route("GET", r"/expenses")
+async def list_expenses(server, request, user_id):
+    limit = request.limit()
+    sort, descending = request.sort()
+    rows = await server.read("get_expenses_page", user_id, limit, request.cursor(), sort, descending)
+    return 200, page(rows, EXPENSE_FIELDS, limit, lambda row: list(sort_key("expense", sort, row)))
+
+
+@route("POST", r"/expenses")
+async def add_expense(server, request, user_id):
+    data = request.json()
+    category, amount = required(data, "category", "amount")
+    row = await server.write("add_expense", user_id, category, amount,
+                             data.get("description", ""), data.get("date"))
+    return 201, dict(zip(EXPENSE_FIELDS, row))
+
+
+@route("DELETE", r"/expenses/(\d+)")
+async def delete_expense(server, request, user_id, expense_id):
+    if not await server.write("delete_expense", int(expense_id), user_id):
+        raise HTTPError(404, "No such expense")
+    return 200, {"deleted": int(expense_id)}
+
+
+@route("GET", r"/income")
+async def list_income(server, request, user_id):
+    limit = request.limit()
+    sort, descending = request.sort()
+    rows = await server.read("get_income_page", user_id, limit, request.cursor(), sort, descending)
+    return 200, page(rows, INCOME_FIELDS, limit, lambda row: list(sort_key("income", sort, row)))
+
+
+@route("POST", r"/income")
+async def add_income(server, request, user_id):
+    data = request.json()
+    (amount,) = required(data, "amount")
+    row = await server.write("add_income", user_id, amount, data.get("source"), data.get("date"))
+    return 201, dict(zip(INCOME_FIELDS, row))
+
+
+@route("DELETE", r"/income/(\d+)")
+async def delete_income(server, request, user_id, income_id):
+    if not await server.write("delete_income", int(income_id), user_id):
+        raise HTTPError(404, "No such income")
+    return 200, {"deleted": int(income_id)}
+
+
+def id_list(data):
+    (ids,) = required(data, "ids")
+    if not isinstance(ids, list):
+        raise HTTPError(400, "ids must be a list of row ids")
+    return ids
+
+
+@route("POST", r"/(expenses|income)/delete")
+async def delete_many(server, request, user_id, table):
+    kind = TABLE_KINDS[table]
+    rows = await server.write("delete_many", kind, user_id, id_list(request.json()))
+    return 200, {"deleted": [row.id for row in rows]}
+
+
+@route("PATCH", r"/(expenses|income)")
+async def update_many(server, request, user_id, table):
+    kind = TABLE_KINDS[table]
+    data = request.json()
+    label = data.get("category" if kind == "expense" else "source")
+    updated = await server.write("update_many", kind, user_id, id_list(data), label, data.get("date"))
+    return 200, {"updated": updated}
+
+
+@route("GET", r"/transactions")
+async def list_transactions(server, request, user_id):
+    limit = request.limit()
+    if "sort" in request.query:
+        # Sorted pages come from the sort's ledger index, which only the
+        # type filter can be checked against
+        if any(name in request.query for name in QUERY_PARAMS if name not in SORTED_PARAMS):
+            raise HTTPError(400, "sort can only be combined with type and order")
+        sort, descending = request.sort()
+        rows = await server.read("get_transactions_page", user_id, limit, request.cursor(),
+                                 sort, descending, request.query.get("type"))
+        return 200, page(rows, TRANSACTION_FIELDS, limit,
+                         lambda row: list(sort_key("transaction", sort, row)))
+    if not any(name in request.query for name in QUERY_PARAMS):
+        rows = await server.read("get_transactions_page", user_id, limit, request.cursor())
+    else:
+        start, end = request.query.get("start"), request.query.get("end")
+        if "month" in request.query:
+            start, end = month_range(request.query["month"])
+        amounts = [int_param(request.query[name], name) if name in request.query else None
+                   for name in ("min_amount", "max_amount")]
+        rows = await server.read("query", user_id, request.query.get("type"), start, end,
+                                 request.values("category") or None, *amounts,
+                                 request.query.get("order", "desc"), limit, request.cursor())
+    return 200, page(rows, TRANSACTION_FIELDS, limit, lambda row: list(transaction_key(row)))
+
+
+@route("GET", r"/search")
+async def search(server, request, user_id):
+    limit = request.limit()
+    filters = {name: request.query[name] for name in ("type", "start", "end", "label")
+               if name in request.query}
+    for name in ("min_amount", "max_amount"):
+        if name in request.query:
+            filters[name] = int_param(request.query[name], name)
+    rows = await server.read("search_transactions", user_id, request.query.get("q", ""),
+                             filters, limit, request.cursor())
+    # zip() drops the trailing key column, which only the cursor needs
+    return 200, page(rows, SEARCH_FIELDS, limit, lambda row: [row.score, row.key])
+
+
+@route("GET", r"/totals/expenses")
+async def expense_totals(server, request, user_id):
+    rows = await server.read("get_expense_by_category", user_id)
+    return 200, {"rows": [{"category": label, "total": total} for label, total in rows]}
+
+
+@route("GET", r"/totals/income")
+async def income_totals(server, request, user_id):
+    rows = await server.read("get_income_by_source", user_id)
+    return 200, {"rows": [{"source": label, "total": total} for label, total in rows]}
+
+
+@route("GET", r"/rollup")
+async def rollup(server, request, user_id):
+    kind = request.query.get("kind", "expense")
+    period = request.query.get("period", "month")
+    if kind not in ("expense", "income") or period not in ("day", "week", "month"):
+        raise HTTPError(400, "kind must be expense or income, period day, week or month")
+    rows = await server.read("get_rollup", user_id, kind, period,
+                             request.query.get("start"), request.query.get("end"))
+    return 200, {"rows": [{"period": key, "label": label, "total": total}
+                          for key, label, total in rows]}
+
+
+@route("GET", r"/budgets")
+async def budget_status(server, request, user_id):
+    month = request.query.get("month") or datetime.date.today().strftime("%Y-%m")
+    rows = await server.read("budget_status", user_id, month)
+    return 200, {"month": month, "rows": [{"category": category, "budget": budget, "spent": spent}
+                                          for category, budget, spent in rows]}
+
+
+@route("PUT", r"/budgets/([^/]+)")
+async def set_budget(server, request, user_id, category):
+    (amount,) = required(request.json(), "amount")
+    await server.write("set_budget", user_id, unquote(category), amount)
+    return 200, {"category": unquote(category), "amount": amount}
+
+
+@route("DELETE", r"/budgets/([^/]+)")
+async def delete_budget(server, request, user_id, category):
+    if not await server.write("delete_budget", user_id, unquote(category)):
+        raise HTTPError(404, "No such budget")
+    return 200, {"deleted": unquote(category)}
+
+
+@route("GET", r"/recurring")
+async def list_recurring(server, request, user_id):
+    rows = await server.read("get_recurring", user_id)
+    return 200, {"rows": [dict(zip(RECURRING_FIELDS, row)) for row in rows]}
+
+
+@route("POST", r"/recurring")
+async def add_recurring(server, request, user_id):
+    data = request.json()
+    kind, label, amount, rule = required(data, "type", "label", "amount", "rule")
+    rule_id = await server.write("add_recurring", user_id, kind, label, amount, rule,
+                                 data.get("start"), data.get("description"))
+    return 201, {"id": rule_id}
+
+
+@route("DELETE", r"/recurring/(\d+)")
+async def delete_recurring(server, request, user_id, rule_id):
+    if not await server.write("delete_recurring", int(rule_id), user_id):
+        raise HTTPError(404, "No such recurring transaction")
+    return 200, {"deleted": int(rule_id)}
+
+
+@route("POST", r"/recurring/materialize")
+async def materialize_recurring(server, request, user_id):
+    added = await server.write("materialize_recurring", user_id, request.json().get("through"))
+    return 200, {"added": added}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default="expense_tracker.db", help="database file")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--readers", type=int, default=READ_THREADS,
+                        help="threads serving reads")
+    parser.add_argument("--group-commit-ms", type=float, default=None,
+                        help="commit expense and income writes together, waiting up to this long")
+    parser.add_argument("--group-commit-ops", type=int, default=GROUP_COMMIT_OPS,
+                        help="most writes committed together")
+    args = parser.parse_args()
+
+    async def run():
+        server = Server(args.db, args.readers, args.group_commit_ms, args.group_commit_ops)
+        try:
+            await server.serve(args.host, args.port)
+        finally:
+            server.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+import numpy as np
+
+from records import SnapshotRow
+
+
+# Day numbers count from here, like numpy's datetime64[D]
+EPOCH = np.datetime64("1970-01-01", "D")
+
+# Day number of a stored date that cannot be read (a NULL ledger day), the
+# int32 counterpart of NaT. It sorts before every real date
+NO_DAY = np.iinfo(np.int32).min
+
+KINDS = ("expense", "income")
+
+# Columns of the history view a snapshot can sort by
+SORT_COLUMNS = ("type", "category", "date", "amount", "description")
+
+
+class Dictionary:
+    """Maps repeated strings to small integer codes and back"""
+
+    def __init__(self):
+        self.names = []
+        self.codes = {}
+        self.ranks = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def encode(self, name):
+        code = self.codes.get(name)
+        if code is None:
+            code = self.codes[name] = len(self.names)
+            self.names.append(name)
+            self.ranks = None
+        return code
+
+    def rank_of(self):
+        """Return an array giving each code its position in name order,
+        so sorting codes by rank sorts them alphabetically"""
+        if self.ranks is None or len(self.ranks) != len(self.names):
+            order = sorted(range(len(self.names)), key=lambda code: (self.names[code] or "").lower())
+            self.ranks = np.empty(len(self.names), dtype=np.int64)
+            self.ranks[order] = np.arange(len(self.names))
+        return self.ranks
+
+
+class TransactionSnapshot:
+    """One user's transactions held as columns of NumPy arrays.
+
+    Amounts are int64 cents, dates are day numbers, and the type, label
+    (category or source) and description are integer codes. Filters, sorts
+    and totals run over whole columns at once and return or take index
+    arrays, so only the rows actually shown are turned back into tuples.
+
+    Rows are added at the end and removed by clearing their alive flag, so
+    positions never move and an index computed earlier stays valid. As long
+    as rows arrive in (date, ledger id) order, as load() reads them, position
+    order is history order and sorts need no tie-breaking keys of their own.
+    """
+
+    def __init__(self, user_id, capacity=1024):
+        self.user_id = user_id
+        self.size = 0
+        self.count = 0
+        # Whether positions are still in (date, ledger id) order, and the
+        # rank of every position in that order once they no longer are
+        self.ordered = True
+        self.last_key = None
+        self.ranks = None
+        self.labels = Dictionary()
+        self.descriptions = Dictionary()
+        # Stored text of the dates with NO_DAY, by position
+        self.unread_dates = {}
+        self.columns = {
+            "id": np.zeros(capacity, dtype=np.int64),
+            "kind": np.zeros(capacity, dtype=np.int8),
+            "day": np.zeros(capacity, dtype=np.int32),
+            "amount": np.zeros(capacity, dtype=np.int64),
+            "label": np.zeros(capacity, dtype=np.int32),
+            "description": np.zeros(capacity, dtype=np.int32),
+            "alive": np.zeros(capacity, dtype=bool),
+        }
+
+    def __len__(self):
+        return self.count
+
+    @classmethod
+    def load(cls, db, user_id, chunk_size=10000):
+        """Build a snapshot of a user's transactions, reading them in chunks"""
+        snapshot = cls(user_id)
+        # Days come from the ledger, which has already parsed every date
+        for rows in db.iter_transactions(user_id, chunk_size=chunk_size, days=True):
+            snapshot.extend([row[:-1] for row in rows], [row[-1] for row in rows])
+        return snapshot
+
+    def column(self, name):
+        """Return the filled part of a column"""
+        return self.columns[name][:self.size]
+
+    def extend(self, rows, days=None):
+        """Append rows shaped like Database.get_transactions rows. days are
+        their ledger day numbers, None for dates that cannot be read; without
+        them the dates are taken to be ISO, as the app stores new ones"""
+        if not rows:
+            return
+        needed = self.size + len(rows)
+        capacity = len(self.columns["id"])
+        if needed > capacity:
+            while capacity < needed:
+                capacity *= 2
+            for name, values in self.columns.items():
+                grown = np.zeros(capacity, dtype=values.dtype)
+                grown[:self.size] = values[:self.size]
+                self.columns[name] = grown
+
+        ids, labels, dates, amounts, descriptions, kinds = zip(*rows)
+        end = self.size + len(rows)
+        columns = self.columns
+        columns["id"][self.size:end] = ids
+        columns["kind"][self.size:end] = [KINDS.index(kind) for kind in kinds]
+        if days is None:
+            columns["day"][self.size:end] = (np.array(dates, dtype="datetime64[D]") - EPOCH).astype(np.int32)
+        else:
+            columns["day"][self.size:end] = [NO_DAY if day is None else day for day in days]
+            for offset, day in enumerate(days):
+                if day is None:
+                    self.unread_dates[self.size + offset] = dates[offset]
+        columns["amount"][self.size:end] = amounts
+        columns["label"][self.size:end] = [self.labels.encode(label) for label in labels]
+        # Income has no description column; show it the way get_transactions does
+        columns["description"][self.size:end] = [
+            self.descriptions.encode("Income" if kind == "income" else text)
+            for text, kind in zip(descriptions, kinds)
+        ]
+        columns["alive"][self.size:end] = True
+        if self.ordered:
+            keys = list(zip(columns["day"][self.size:end].tolist(),
+                            self.ledger_ids(slice(self.size, end)).tolist()))
+            if self.last_key is not None:
+                keys.insert(0, self.last_key)
+            self.ordered = all(a <= b for a, b in zip(keys, keys[1:]))
+            self.last_key = keys[-1]
+        self.ranks = None
+        self.size = end
+        self.count += len(rows)
+
+    def add(self, row):
+        """Add one row shaped like a Database.get_transactions row"""
+        self.extend([row])
+
+    def remove(self, kind, row_id):
+        """Remove a transaction and return True if it was in the snapshot"""
+        return self.remove_many(kind, [row_id]) > 0
+
+    def remove_many(self, kind, row_ids):
+        """Remove transactions of one kind in a single pass over the columns
+        and return how many of them were in the snapshot"""
+        if not len(row_ids):
+            return 0
+        found = np.flatnonzero(np.isin(self.column("id"), np.asarray(row_ids, dtype=np.int64))
+                               & (self.column("kind") == KINDS.index(kind))
+                               & self.column("alive"))
+        self.columns["alive"][found] = False
+        self.count -= len(found)
+        return len(found)
+
+    def select(self, kind=None, start=None, end=None, label=None, min_amount=None, max_amount=None):
+        """Return the positions of the live rows matching every given filter.
+        start is an inclusive and end an exclusive ISO date"""
+        mask = self.column("alive").copy()
+        if start is not None or end is not None:
+            # Like Database.query, a date range leaves out unreadable dates
+            mask &= self.column("day") != NO_DAY
+        if kind is not None:
+            mask &= self.column("kind") == KINDS.index(kind)
+        if start is not None:
+            mask &= self.column("day") >= (np.datetime64(start, "D") - EPOCH).astype(np.int32)
+        if end is not None:
+            mask &= self.column("day") < (np.datetime64(end, "D") - EPOCH).astype(np.int32)
+        if label is not None:
+            code = self.labels.codes.get(label)
+            if code is None:
+                return np.zeros(0, dtype=np.intp)
+            mask &= self.column("label") == code
+        if min_amount is not None:
+            mask &= self.column("amount") >= min_amount
+        if max_amount is not None:
+            mask &= self.column("amount") <= max_amount
+        return np.flatnonzero(mask)
+
+    def ledger_ids(self, positions):
+        """Return the ledger ids of the rows at positions (see database.ledger_id)"""
+        return self.columns["id"][positions] * 2 + self.columns["kind"][positions]
+
+    def tie_ranks(self, index):
+        """Return the (date, ledger id) rank of each position in index"""
+        if self.ordered:
+            return index
+        if self.ranks is None:
+            order = np.lexsort([self.ledger_ids(slice(0, self.size)), self.column("day")])
+            self.ranks = np.empty(self.size, dtype=np.int64)
+            self.ranks[order] = np.arange(self.size)
+        return self.ranks[index]
+
+    def sort(self, index, column="date", descending=False):
+        """Return index, as returned by select(), reordered by one of
+        SORT_COLUMNS. Ties are broken by date and ledger id in the same
+        direction, which for a descending date sort gives the order of
+        Database.get_transactions"""
+        ties = self.tie_ranks(index).astype(np.int64)
+        if column == "date":
+            # The tie order already is date order
+            if self.ordered:
+                return index[::-1] if descending else index
+            order = np.argsort(ties)
+            return index[order[::-1] if descending else order]
+
+        if column == "type":
+            primary = self.column("kind")
+        elif column == "category":
+            primary = self.labels.rank_of()[self.column("label")]
+        elif column == "description":
+            primary = self.descriptions.rank_of()[self.column("description")]
+        elif column == "amount":
+            primary = self.column("amount")
+        else:
+            raise ValueError(f"Cannot sort by {column!r}")
+
+        # One int64 key sorts several times faster than lexsort over two.
+        # Ranks are unique, so the key is too and the sort need not be stable.
+        primary = primary[index].astype(np.int64)
+        low = int(primary.min()) if len(primary) else 0
+        span = int(primary.max()) - low + 1 if len(primary) else 1
+        if span * max(self.size, 1) < 2 ** 62:
+            order = np.argsort((primary - low) * self.size + ties)
+        else:
+            order = np.lexsort([ties, primary])
+        return index[order[::-1] if descending else order]
+
+    def totals(self, index, by="kind"):
+        """Return the amount total of the indexed rows per type ('kind') or
+        per category/source ('label') as a dict of name -> cents"""
+        if by == "kind":
+            codes, names = self.column("kind")[index], KINDS
+        elif by == "label":
+            codes, names = self.column("label")[index], self.labels.names
+        else:
+            raise ValueError(f"Cannot total by {by!r}")
+        # bincount adds in float64, which is exact for sums below 2 ** 53 cents
+        sums = np.bincount(codes, weights=self.column("amount")[index], minlength=len(names))
+        return {name: int(total) for name, total in zip(names, np.rint(sums)) if total}
+
+    def page(self, index, after=None, limit=100):
+        """Return up to limit live rows of index after position after, as
+        SnapshotRow records carrying their position in index.
+        Rows removed since index was computed are skipped"""
+        start = 0 if after is None else after + 1
+        columns = self.columns
+        rows = []
+        while len(rows) < limit and start < len(index):
+            positions = index[start:start + limit - len(rows)]
+            for offset, row in enumerate(positions.tolist(), start):
+                if not columns["alive"][row]:
+                    continue
+                day = int(columns["day"][row])
+                date = self.unread_dates[row] if day == NO_DAY else str(EPOCH + day)
+                rows.append(SnapshotRow(int(columns["id"][row]),
+                             self.labels.names[columns["label"][row]],
+                             date,
+                             int(columns["amount"][row]),
+                             self.descriptions.names[columns["description"][row]],
+                             KINDS[columns["kind"][row]],
+                             offset))
+            start += len(positions)
+        return rows
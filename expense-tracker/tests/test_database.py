@@ -0,0 +1,300 @@
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import SORT_KEYS, Database, sort_key
+from migrations import create_base_tables
+from rollups import cash_flow, load_rollup
+
+
+class LegacyDateTest(unittest.TestCase):
+    """Dates that migration 8 could not read are kept as they were stored"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = Database(os.path.join(self.tmp.name, "test.db"))
+        self.db.add_user("alice", "secret")
+        self.user_id = self.db.validate_user("alice", "secret")
+        self.db.add_expense(self.user_id, "Food", 1250, "lunch", "2024-03-05")
+        self.db.add_income(self.user_id, 500000, "Salary", "2024-03-01")
+        # Written the way the app stored free-text dates before migration 8
+        for date in ("05/03/2024", "2024-02-30", "2024-3-5"):
+            self.db.conn.execute(
+                "INSERT INTO expenses (user_id, category, amount, description, date)"
+                " VALUES (?, 'Food', 700, 'legacy', ?)",
+                (self.user_id, date)
+            )
+            self.db.conn.execute(
+                "INSERT INTO income (user_id, amount, date, source) VALUES (?, 900, ?, 'Gift')",
+                (self.user_id, date)
+            )
+        self.db.conn.commit()
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+    def test_rollup_skips_unreadable_dates(self):
+        for period, key in (("day", "2024-03-05"), ("week", "2024-03-04"), ("month", "2024-03")):
+            rows = self.db.get_rollup(self.user_id, "expense", period)
+            self.assertEqual(rows, [(key, "Food", 1250)])
+
+    def test_rollup_arrays(self):
+        rollup = load_rollup(self.db, self.user_id, "expense", "month")
+        self.assertEqual(rollup.by_period().tolist(), [1250])
+        flow = cash_flow(self.db, self.user_id, "month")
+        self.assertEqual(flow.income.tolist(), [500000])
+        self.assertEqual(flow.expenses.tolist(), [1250])
+
+
+class TempDatabaseTest(unittest.TestCase):
+    """A fresh database in a temporary directory with one user, alice"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "test.db")
+        self.db = Database(self.path)
+        self.db.add_user("alice", "secret")
+        self.user_id = self.db.validate_user("alice", "secret")
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+
+class AggregatesTest(TempDatabaseTest):
+    """The trigger-maintained tables follow every change to the base tables"""
+
+    def setUp(self):
+        super().setUp()
+        self.expense = self.db.add_expense(self.user_id, "Food", 1250, "lunch", "2024-03-05")
+        self.db.add_expense(self.user_id, "Food", 800, "coffee", "2024-03-05")
+        self.income = self.db.add_income(self.user_id, 500000, "Salary", "2024-03-01")
+
+    def test_insert(self):
+        self.assertEqual(self.db.check_aggregates(), [])
+        self.assertEqual(self.db.get_totals(self.user_id), {"expense": (2, 2050), "income": (1, 500000)})
+
+    def test_update(self):
+        # Every column the totals are grouped or summed by changes at once
+        self.db.conn.execute(
+            "UPDATE expenses SET category = 'Rent', amount = 90000, date = '2024-04-01' WHERE id = ?",
+            (self.expense.id,)
+        )
+        self.db.conn.execute("UPDATE income SET source = 'Bonus', amount = 1000 WHERE id = ?",
+                             (self.income.id,))
+        self.db.conn.commit()
+        self.assertEqual(self.db.check_aggregates(), [])
+        self.assertEqual(self.db.get_expense_by_category(self.user_id), [("Food", 800), ("Rent", 90000)])
+
+    def test_delete(self):
+        self.assertTrue(self.db.delete_expense(self.expense.id, self.user_id))
+        self.assertTrue(self.db.delete_income(self.income.id, self.user_id))
+        self.assertEqual(self.db.check_aggregates(), [])
+        self.assertEqual(self.db.get_totals(self.user_id), {"expense": (1, 800), "income": (0, 0)})
+
+
+class BatchTest(TempDatabaseTest):
+    """Batch updates and deletes only touch the given user's rows"""
+
+    def setUp(self):
+        super().setUp()
+        self.expense = self.db.add_expense(self.user_id, "Food", 1250, "lunch", "2024-03-05")
+        self.db.add_expense(self.user_id, "Food", 800, "coffee", "2024-03-05")
+        self.income = self.db.add_income(self.user_id, 500000, "Salary", "2024-03-01")
+        self.db.add_user("bob", "hunter2")
+        self.other_id = self.db.validate_user("bob", "hunter2")
+        self.other = self.db.add_expense(self.other_id, "Food", 300, "tea", "2024-03-05")
+
+    def test_update_many(self):
+        ids = [self.expense.id, self.other.id]
+        self.assertEqual(self.db.update_many("expense", self.user_id, ids, label="Rent", date="2024-4-1"), 1)
+        self.assertEqual(self.db.check_aggregates(), [])
+        self.assertEqual(self.db.get_expenses(self.other_id), [self.other])
+        self.assertEqual(self.db.get_expenses(self.user_id)[0][1:3], ("Rent", "2024-04-01"))
+
+    def test_delete_many(self):
+        ids = [self.expense.id, self.other.id, self.expense.id + 1000]
+        self.assertEqual(self.db.delete_many("expense", self.user_id, ids), [self.expense])
+        self.assertEqual(self.db.delete_many("income", self.user_id, [self.income.id]), [self.income])
+        self.assertEqual(self.db.check_aggregates(), [])
+        self.assertEqual(self.db.get_expenses(self.other_id), [self.other])
+        self.assertEqual(self.db.get_totals(self.user_id), {"expense": (1, 800), "income": (0, 0)})
+
+
+class SortedPagesTest(TempDatabaseTest):
+    """Paging through a sorted list gives the rows of one full sort"""
+
+    def setUp(self):
+        super().setUp()
+        rng = random.Random(25)
+        # Few distinct values, so that rows tie on every column but the id
+        dates = ["2024-03-0%d" % day for day in range(1, 4)]
+        for _ in range(40):
+            self.db.add_expense(self.user_id, rng.choice(["Food", "Rent"]), rng.choice([500, 1250]),
+                                None, rng.choice(dates))
+            self.db.add_income(self.user_id, rng.choice([500, 1250]), rng.choice(["Salary", None]),
+                               rng.choice(dates))
+
+    def pages(self, get_page, kind, sort, descending):
+        rows, after = [], None
+        while True:
+            page = get_page(self.user_id, 7, after, sort, descending)
+            rows.extend(page)
+            if len(page) < 7:
+                return rows
+            after = sort_key(kind, sort, page[-1])
+
+    def test_pages_match_full_sort(self):
+        lists = {
+            "expense": (self.db.get_expenses_page, self.db.get_expenses),
+            "income": (self.db.get_income_page, self.db.get_income),
+            "transaction": (self.db.get_transactions_page, self.db.get_transactions),
+        }
+        for kind, (get_page, get_all) in lists.items():
+            rows = get_all(self.user_id)
+            for sort, (columns, key) in SORT_KEYS[kind].items():
+                for descending in (True, False):
+                    with self.subTest(kind=kind, sort=sort, descending=descending):
+                        expected = sorted(rows, key=key, reverse=descending)
+                        self.assertEqual(self.pages(get_page, kind, sort, descending), expected)
+
+
+class RecurringTest(TempDatabaseTest):
+    """Catching up on recurring transactions adds each date once"""
+
+    def setUp(self):
+        super().setUp()
+        self.db.add_recurring(self.user_id, "expense", "Rent", 90000, "monthly", "2024-01-31")
+        self.db.add_recurring(self.user_id, "income", "Salary", 500000, "biweekly", "2024-01-05")
+
+    def test_materialize_is_idempotent(self):
+        self.assertEqual(self.db.materialize_recurring(self.user_id, "2024-03-31"), 3 + 7)
+        self.assertEqual(self.db.materialize_recurring(self.user_id, "2024-03-31"), 0)
+        self.assertEqual([row.date for row in self.db.get_expenses(self.user_id)],
+                         ["2024-03-31", "2024-02-29", "2024-01-31"])
+        # Catching up further only adds the dates after the last run
+        self.assertEqual(self.db.materialize_recurring(self.user_id, "2024-04-30"), 1 + 2)
+        self.assertEqual(self.db.get_totals(self.user_id), {"expense": (4, 360000), "income": (9, 4500000)})
+        self.assertEqual(self.db.check_aggregates(), [])
+
+
+class GroupCommitTest(TempDatabaseTest):
+    """Writes held back by group commit are read back at once and reach
+    other connections when flushed"""
+
+    def setUp(self):
+        super().setUp()
+        self.db.enable_group_commit(max_ops=3, max_delay_ms=60000)
+        self.other = sqlite3.connect(self.path)
+
+    def tearDown(self):
+        self.other.close()
+        super().tearDown()
+
+    def count_elsewhere(self):
+        return self.other.execute("SELECT COUNT(*) FROM expenses").fetchone()[0]
+
+    def test_flush(self):
+        first = self.db.add_expense(self.user_id, "Food", 1250, "lunch", "2024-03-05")
+        self.db.add_expense(self.user_id, "Food", 800, "coffee", "2024-03-05")
+        self.assertEqual(self.db.pending_writes, 2)
+        # Read your writes on the writing connection, nothing elsewhere yet
+        self.assertEqual(len(self.db.get_expenses(self.user_id)), 2)
+        self.assertEqual(self.db.get_totals(self.user_id)["expense"], (2, 2050))
+        self.assertEqual(self.count_elsewhere(), 0)
+        self.db.flush()
+        self.assertEqual(self.db.pending_writes, 0)
+        self.assertEqual(self.count_elsewhere(), 2)
+
+        self.assertTrue(self.db.delete_expense(first.id, self.user_id))
+        self.assertEqual(self.count_elsewhere(), 2)
+        self.db.flush()
+        self.assertEqual(self.count_elsewhere(), 1)
+
+    def test_group_full(self):
+        for _ in range(3):
+            self.db.add_expense(self.user_id, "Food", 100, None, "2024-03-05")
+        self.assertEqual(self.db.pending_writes, 0)
+        self.assertEqual(self.count_elsewhere(), 3)
+
+    def test_ungrouped_write_commits_held_back_writes(self):
+        expense = self.db.add_expense(self.user_id, "Food", 100, None, "2024-03-05")
+        self.db.update_many("expense", self.user_id, [expense.id], label="Rent")
+        self.assertEqual(self.db.pending_writes, 0)
+        self.assertEqual(self.other.execute("SELECT category FROM expenses").fetchall(), [("Rent",)])
+
+
+class DateInputTest(TempDatabaseTest):
+    """Dates are stored as YYYY-MM-DD and anything unreadable is refused"""
+
+    def test_accepted(self):
+        for date in ("2024-3-5", "2024-03-05 10:30", "2024-03-05T10:30:15", "2024-03-05 10:30:15.250"):
+            with self.subTest(date=date):
+                self.assertEqual(self.db.add_expense(self.user_id, "Food", 100, None, date).date, "2024-03-05")
+
+    def test_refused(self):
+        for date in ("05/03/2024", "2024-02-30", "2024-03-05 lunch", "2024-03-05T", "2024-03-05 10"):
+            with self.subTest(date=date):
+                with self.assertRaises(ValueError):
+                    self.db.add_expense(self.user_id, "Food", 100, None, date)
+        self.assertEqual(self.db.get_expenses(self.user_id), [])
+
+
+class LegacyUpgradeTest(unittest.TestCase):
+    """A database written by the first release is upgraded in place"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "legacy.db")
+        # The schema and values as the first release stored them: amounts
+        # as REAL and dates as they were typed
+        conn = sqlite3.connect(self.path)
+        create_base_tables(conn.cursor())
+        conn.execute("INSERT INTO users (username, password) VALUES ('alice', 'secret')")
+        conn.executemany(
+            "INSERT INTO expenses (user_id, category, date, amount, description)"
+            " VALUES (1, 'Food', ?, ?, 'legacy')",
+            [("2024-1-5", 12.5), ("2024-01-05 10:30", 0.285), ("05/03/2024", 19.99)]
+        )
+        conn.executemany(
+            "INSERT INTO income (user_id, amount, date, source) VALUES (1, ?, ?, 'Salary')",
+            [(1500.1, "2024-2-1"), (0.1, "2024-02-01")]
+        )
+        conn.commit()
+        conn.close()
+        self.db = Database(self.path)
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+    def test_amounts_become_cents(self):
+        rows = self.db.conn.execute("SELECT amount, typeof(amount) FROM expenses ORDER BY id").fetchall()
+        # 0.285 is rounded from its decimal repr, not its binary value
+        self.assertEqual(rows, [(1250, "integer"), (29, "integer"), (1999, "integer")])
+        rows = self.db.conn.execute("SELECT amount FROM income ORDER BY id").fetchall()
+        self.assertEqual(rows, [(150010,), (10,)])
+        self.assertEqual(self.db.get_totals(1), {"expense": (3, 3278), "income": (2, 150020)})
+        self.assertEqual(self.db.check_aggregates(), [])
+
+    def test_dates_are_normalized(self):
+        rows = self.db.conn.execute("SELECT date FROM expenses ORDER BY id").fetchall()
+        # A date that cannot be read is kept as it was typed
+        self.assertEqual(rows, [("2024-01-05",), ("2024-01-05",), ("05/03/2024",)])
+        rows = self.db.conn.execute("SELECT date FROM income ORDER BY id").fetchall()
+        self.assertEqual(rows, [("2024-02-01",), ("2024-02-01",)])
+        days = self.db.conn.execute("SELECT date, day IS NOT NULL FROM ledger ORDER BY id").fetchall()
+        self.assertEqual(sorted(days), [("05/03/2024", 0), ("2024-01-05", 1), ("2024-01-05", 1),
+                                        ("2024-02-01", 1), ("2024-02-01", 1)])
+        self.assertEqual(self.db.get_rollup(1, "expense", "day"), [("2024-01-05", "Food", 1279)])
+        self.assertEqual(self.db.check_aggregates(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
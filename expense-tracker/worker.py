@@ -0,0 +1,158 @@
+import os
+import queue
+import sys
+import threading
+from concurrent.futures import Future
+
+from database import Database
+from instrumentation import Instrumentation
+
+
+# Set to a number of milliseconds to hold back expense and income writes for
+# up to that long and commit them together (see Database.enable_group_commit)
+GROUP_COMMIT_ENV = "EXPENSE_TRACKER_GROUP_COMMIT_MS"
+
+# How often the Tk thread checks for finished requests while any are pending.
+# One frame at 60 fps, so results show up without a visible delay.
+POLL_MS = 16
+
+
+class DatabaseWorker:
+    """Runs Database calls on a dedicated thread that owns the connection.
+
+    submit() queues a request and returns a concurrent.futures.Future. When a
+    callback is given it is invoked on the Tk thread through root.after once
+    the request finishes, so widgets are never touched from the worker thread.
+    Requests can carry a tag, and cancel(tag) drops the ones that have not
+    started yet, e.g. page loads for a tab the user already left.
+    """
+
+    def __init__(self, root, db_name="expense_tracker.db"):
+        self.root = root
+        self.requests = queue.Queue()
+        self.watched = []
+        self.tagged = {}
+        self.polling = False
+        self.thread = threading.Thread(target=self._run, args=(db_name,),
+                                       name="DatabaseWorker", daemon=True)
+        self.thread.start()
+
+    def submit(self, func, *args, callback=None, errback=None, tag=None):
+        """Queue a call and return its Future.
+
+        func is the name of a Database method, or a callable that is passed
+        the Database as its first argument.
+        """
+        future = Future()
+        self.requests.put((future, func, args))
+        if tag is not None:
+            self.tagged.setdefault(tag, []).append(future)
+        if callback is not None or errback is not None:
+            self.watched.append((future, callback, errback))
+            if not self.polling:
+                self.polling = True
+                self.root.after(POLL_MS, self._poll)
+        return future
+
+    def cancel(self, tag):
+        """Cancel every queued request with this tag that has not started"""
+        for future in self.tagged.pop(tag, ()):
+            future.cancel()
+
+    def cancel_all(self):
+        """Cancel every queued request and forget their callbacks"""
+        for tag in list(self.tagged):
+            self.cancel(tag)
+        self.watched = []
+
+    def close(self):
+        """Finish the requests already queued and close the connection"""
+        self.cancel_all()
+        self.requests.put(None)
+        self.thread.join(timeout=5)
+
+    def _run(self, db_name):
+        # The connection is created here so it belongs to the worker thread
+        try:
+            db = Database(db_name)
+            # Timing and slow-query logging when asked for in the environment
+            instruments = Instrumentation.from_environment()
+            if instruments is not None:
+                instruments.instrument(db)
+            delay = os.environ.get(GROUP_COMMIT_ENV)
+            if delay:
+                db.enable_group_commit(max_delay_ms=float(delay))
+            startup_error = None
+        except Exception as e:
+            db = None
+            startup_error = e
+
+        while True:
+            # Wait no longer than the writes group commit holds back may
+            # wait, and flush them when nothing else came in by then
+            delay = db.flush_delay() if db is not None else None
+            try:
+                request = self.requests.get(timeout=delay)
+            except queue.Empty:
+                try:
+                    db.flush()
+                except Exception as e:
+                    print(f"Could not commit held-back writes: {e}", file=sys.stderr)
+                continue
+            if request is None:
+                break
+            future, func, args = request
+            if not future.set_running_or_notify_cancel():
+                continue
+            if startup_error is not None:
+                future.set_exception(startup_error)
+                continue
+            try:
+                if callable(func):
+                    result = func(db, *args)
+                else:
+                    result = getattr(db, func)(*args)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+        if db is not None:
+            db.close()
+
+    def _poll(self):
+        # Resolve finished requests in submission order; the worker handles
+        # requests first in, first out, so callbacks run in that order too
+        watched, self.watched = self.watched, []
+        remaining = []
+        for index, (future, callback, errback) in enumerate(watched):
+            if not future.done():
+                remaining = watched[index:]
+                break
+            if future.cancelled():
+                continue
+            error = future.exception()
+            try:
+                if error is None:
+                    if callback is not None:
+                        callback(future.result())
+                elif errback is not None:
+                    errback(error)
+                else:
+                    raise error
+            except Exception:
+                # Report like any other Tk callback error and keep polling
+                self.root.report_callback_exception(*sys.exc_info())
+        self.watched = remaining + self.watched
+
+        for tag, futures in list(self.tagged.items()):
+            futures = [future for future in futures if not future.done()]
+            if futures:
+                self.tagged[tag] = futures
+            else:
+                del self.tagged[tag]
+
+        if self.watched:
+            self.root.after(POLL_MS, self._poll)
+        else:
+            self.polling = False